@@ -0,0 +1,283 @@
+"""
+Load test of the API endpoints, driven in-process through an ASGI client.
+
+Seeds a temporary SQLite database and static directory, then sends requests
+to the real FastAPI app with a fixed concurrency and reports p50/p95/p99
+latency and requests per second for every endpoint as JSON.
+
+Usage (from the backend directory):
+    python -m benchmarks.bench_api [--users N] [--products N]
+        [--records-per-user N] [--requests N] [--concurrency N]
+        [--output results.json] [--baseline previous.json]
+"""
+
+import argparse
+import asyncio
+import contextlib
+import hashlib
+import io
+import json
+import os
+import platform
+import shutil
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+from datetime import datetime, timedelta, timezone
+
+# The benchmark runs against its own database and static directory
+BACKEND_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+WORK_DIR = tempfile.mkdtemp(prefix="bench_api_")
+os.makedirs(os.path.join(WORK_DIR, "static"))
+os.chdir(WORK_DIR)
+sys.path.insert(0, BACKEND_DIR)
+os.environ["DATABASE_URL"] = f"sqlite+aiosqlite:///{WORK_DIR}/bench_api.db"
+os.environ.setdefault("SECRET_KEY", "benchmark")
+os.environ.setdefault("ALGORITHM", "HS256")
+
+import httpx
+from PIL import Image
+from db import AsyncSessionLocal
+from models.product import Product
+from models.record import Record
+from models.record_product import RecordProduct
+from models.user import User
+from controllers.daily_total_controller import rebuild_daily_totals
+from controllers.user_controller import bcrypt_context
+from main import app
+
+PASSWORD = "Benchmark1!"
+
+
+def create_image() -> str:
+    """Writes a test photo to the static directory and returns its path."""
+    image = Image.effect_mandelbrot((1600, 1200), (-2, -1.5, 1, 1.5), 100)
+    image = image.convert("RGB")
+    buffer = io.BytesIO()
+    image.save(buffer, format="JPEG", quality=85)
+    content = buffer.getvalue()
+
+    path = os.path.join("static", f"{hashlib.sha256(content).hexdigest()}.jpg")
+    with open(path, "wb") as file:
+        file.write(content)
+    return path
+
+
+async def seed(users: int, products: int, records_per_user: int, days: int) -> str:
+    """Fills the database and returns the path of the product image."""
+    image_url = create_image()
+    hashed_password = bcrypt_context.hash(PASSWORD)
+    now = datetime.now(timezone.utc).replace(tzinfo=None)
+
+    async with AsyncSessionLocal() as session:
+        session.add_all(
+            User(
+                username=f"bench{i}",
+                email=f"bench{i}@example.com",
+                hashed_password=hashed_password,
+                weight=70,
+                height=175,
+                target_weight=65,
+                time_frame=90,
+            )
+            for i in range(users)
+        )
+        session.add_all(
+            Product(
+                name=f"Product {i}",
+                category=f"Category {i % 20}",
+                calories_per_100g=50 + i % 500,
+                image_url=image_url,
+            )
+            for i in range(products)
+        )
+        await session.flush()
+
+        for user_id in range(1, users + 1):
+            session.add_all(
+                Record(
+                    user_id=user_id,
+                    created=now - timedelta(days=i % days, minutes=i),
+                    products=[
+                        RecordProduct(product_id=1 + i % products, weight=100 + i % 200)
+                    ],
+                )
+                for i in range(records_per_user)
+            )
+        await session.flush()
+        await rebuild_daily_totals(session)
+        await session.commit()
+
+    return image_url
+
+
+def summarize(latencies: list, elapsed: float, errors: int) -> dict:
+    """Latency percentiles in milliseconds and throughput of one endpoint."""
+    cuts = statistics.quantiles(latencies, n=100, method="inclusive")
+    return {
+        "requests": len(latencies),
+        "errors": errors,
+        "rps": round(len(latencies) / elapsed, 1),
+        "p50_ms": round(cuts[49] * 1000, 3),
+        "p95_ms": round(cuts[94] * 1000, 3),
+        "p99_ms": round(cuts[98] * 1000, 3),
+        "max_ms": round(max(latencies) * 1000, 3),
+    }
+
+
+async def run_endpoint(
+    client: httpx.AsyncClient, make_request, requests: int, concurrency: int
+) -> dict:
+    """Sends `requests` requests, at most `concurrency` at a time."""
+    latencies = []
+    errors = 0
+    counter = iter(range(requests))
+
+    async def worker():
+        nonlocal errors
+        for i in counter:
+            started = time.perf_counter()
+            response = await make_request(client, i)
+            latencies.append(time.perf_counter() - started)
+            if response.status_code >= 400:
+                errors += 1
+
+    started = time.perf_counter()
+    await asyncio.gather(*(worker() for _ in range(concurrency)))
+    return summarize(latencies, time.perf_counter() - started, errors)
+
+
+async def login(client: httpx.AsyncClient, username: str) -> httpx.Response:
+    return await client.post(
+        "/api/v1/auth/token", data={"username": username, "password": PASSWORD}
+    )
+
+
+def get_git_commit() -> str:
+    try:
+        return subprocess.run(
+            ["git", "rev-parse", "--short", "HEAD"],
+            cwd=BACKEND_DIR,
+            capture_output=True,
+            text=True,
+            check=True,
+        ).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return ""
+
+
+async def main(args) -> dict:
+    async with app.router.lifespan_context(app):
+        image_url = await seed(
+            args.users, args.products, args.records_per_user, args.days
+        )
+        image_name = image_url.split("/")[-1]
+        today = datetime.now(timezone.utc).date().isoformat()
+
+        transport = httpx.ASGITransport(app=app)
+        async with httpx.AsyncClient(
+            transport=transport, base_url="http://bench"
+        ) as client:
+            tokens = []
+            for i in range(args.users):
+                response = await login(client, f"bench{i}")
+                tokens.append(response.json()["access_token"])
+
+            def auth(i: int) -> dict:
+                return {"Authorization": f"Bearer {tokens[i % len(tokens)]}"}
+
+            endpoints = {
+                "login": lambda c, i: login(c, f"bench{i % args.users}"),
+                "product_list": lambda c, i: c.get(
+                    "/api/v1/products/",
+                    params={"limit": args.page_size},
+                    headers={"Accept-Encoding": "gzip, br"},
+                ),
+                "record_create": lambda c, i: c.post(
+                    "/api/v1/records/",
+                    json={"product_id": 1 + i % args.products, "weight": 150},
+                    headers=auth(i),
+                ),
+                "records_by_date": lambda c, i: c.get(
+                    f"/api/v1/records/{today}",
+                    headers={**auth(i), "Accept-Encoding": "gzip, br"},
+                ),
+                "image_fetch": lambda c, i: c.get(
+                    f"/api/v1/files/image/{image_name}",
+                    params={"w": 256},
+                    headers={"Accept": "image/webp"},
+                ),
+            }
+
+            results = {}
+            for name, make_request in endpoints.items():
+                # Logins are bound by bcrypt, so fewer of them are sent
+                requests = (
+                    max(2, args.requests // 10) if name == "login" else args.requests
+                )
+                results[name] = await run_endpoint(
+                    client, make_request, requests, args.concurrency
+                )
+                print(f"{name:<16} {json.dumps(results[name])}", file=sys.stderr)
+
+    return {
+        "created": datetime.now(timezone.utc).isoformat(timespec="seconds"),
+        "git_commit": get_git_commit(),
+        "python": platform.python_version(),
+        "platform": platform.platform(),
+        "config": {
+            "users": args.users,
+            "products": args.products,
+            "records_per_user": args.records_per_user,
+            "days": args.days,
+            "requests": args.requests,
+            "concurrency": args.concurrency,
+            "page_size": args.page_size,
+        },
+        "endpoints": results,
+    }
+
+
+def compare(results: dict, baseline: dict) -> None:
+    """Prints the change of p95 latency and throughput against an earlier run."""
+    print("endpoint          p95 change   rps change", file=sys.stderr)
+    for name, current in results["endpoints"].items():
+        previous = baseline.get("endpoints", {}).get(name)
+        if not previous:
+            continue
+        p95 = current["p95_ms"] / previous["p95_ms"] - 1
+        rps = current["rps"] / previous["rps"] - 1
+        print(f"{name:<16} {p95:+11.1%} {rps:+12.1%}", file=sys.stderr)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--users", type=int, default=10)
+    parser.add_argument("--products", type=int, default=1000)
+    parser.add_argument("--records-per-user", type=int, default=200)
+    parser.add_argument("--days", type=int, default=30)
+    parser.add_argument("--requests", type=int, default=500)
+    parser.add_argument("--concurrency", type=int, default=10)
+    parser.add_argument("--page-size", type=int, default=100)
+    parser.add_argument("--output", help="Write the results to this file")
+    parser.add_argument("--baseline", help="Results of an earlier run to compare to")
+    args = parser.parse_args()
+
+    try:
+        # The app logs with print, which would mix with the JSON on stdout
+        with contextlib.redirect_stdout(sys.stderr):
+            results = asyncio.run(main(args))
+    finally:
+        shutil.rmtree(WORK_DIR, ignore_errors=True)
+    output = json.dumps(results, indent=2)
+    if args.output:
+        with open(args.output, "w") as file:
+            file.write(output + "\n")
+    else:
+        print(output)
+
+    if args.baseline:
+        with open(args.baseline) as file:
+            compare(results, json.load(file))
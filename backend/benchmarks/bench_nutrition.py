@@ -0,0 +1,111 @@
+"""
+Micro-benchmark of the nutrition engine.
+
+Computes the nutrient totals per day of a synthetic diary and the nutrients of
+synthetic dishes (a tenth of them nested in other dishes) once with plain
+Python loops over the portions and once with the NumPy engine, and prints
+the times and the largest difference between the results.
+
+Usage (from the backend directory):
+    python -m benchmarks.bench_nutrition [--days N] [--entries-per-day N]
+        [--products N] [--dishes N] [--ingredients N]
+"""
+
+import argparse
+import time
+import numpy as np
+from nutrition import NUTRIENTS, dish_nutrients, group_totals
+
+
+def python_day_totals(days, weights, per_100g, day_count):
+    totals = [[0.0] * len(NUTRIENTS) for _ in range(day_count)]
+    for day, weight, values in zip(days, weights, per_100g):
+        for column, value in enumerate(values):
+            totals[day][column] += weight * value / 100
+    return totals
+
+
+def python_dish_nutrients(per_100g, dish_products, ingredients):
+    per_100g = [list(values) for values in per_100g]
+    # Dishes are listed after the dishes they contain
+    for dish, product in enumerate(dish_products):
+        totals = [0.0] * len(NUTRIENTS)
+        total_weight = 0
+        for ingredient_product, weight in ingredients[dish]:
+            total_weight += weight
+            for column, value in enumerate(per_100g[ingredient_product]):
+                totals[column] += weight * value / 100
+        per_100g[product] = [value / total_weight * 100 for value in totals]
+    return per_100g
+
+
+def measure(name: str, python_run, numpy_run) -> None:
+    started = time.perf_counter()
+    expected = np.array(python_run())
+    python_seconds = time.perf_counter() - started
+
+    started = time.perf_counter()
+    actual = numpy_run()
+    numpy_seconds = time.perf_counter() - started
+
+    print(name)
+    print(f"  python loops   {python_seconds * 1000:9.2f} ms")
+    print(f"  numpy          {numpy_seconds * 1000:9.2f} ms")
+    print(f"  speed-up       {python_seconds / numpy_seconds:9.1f}x")
+    print(f"  max difference {np.abs(expected - actual).max():9.2e}")
+
+
+def main(args) -> None:
+    rng = np.random.default_rng(42)
+    per_100g = rng.uniform(0, 100, (args.products, len(NUTRIENTS)))
+    per_100g[:, 0] *= 9
+
+    entries = args.days * args.entries_per_day
+    days = np.repeat(np.arange(args.days), args.entries_per_day)
+    weights = rng.integers(10, 500, entries).astype(float)
+    portions = per_100g[rng.integers(0, args.products, entries)]
+    measure(
+        f"Day totals ({args.days} days, {entries} entries)",
+        lambda: python_day_totals(days, weights, portions, args.days),
+        lambda: group_totals(days, weights, portions, args.days),
+    )
+
+    # The last products are dishes; a tenth of them contain an earlier dish
+    dish_products = np.arange(args.products - args.dishes, args.products)
+    plain_products = args.products - args.dishes
+    ingredients = []
+    for dish in range(args.dishes):
+        products = list(rng.integers(0, plain_products, args.ingredients))
+        if dish % 10 == 9:
+            products[0] = dish_products[dish - 1]
+        ingredients.append(
+            [(int(product), int(rng.integers(10, 300))) for product in products]
+        )
+    ingredient_dishes = np.repeat(np.arange(args.dishes), args.ingredients)
+    ingredient_products = np.array(
+        [product for dish in ingredients for product, _ in dish]
+    )
+    ingredient_weights = np.array(
+        [weight for dish in ingredients for _, weight in dish], dtype=float
+    )
+    measure(
+        f"Dishes ({args.dishes} dishes, {args.ingredients} ingredients each)",
+        lambda: python_dish_nutrients(per_100g, dish_products, ingredients),
+        lambda: dish_nutrients(
+            per_100g,
+            dish_products,
+            ingredient_dishes,
+            ingredient_products,
+            ingredient_weights,
+        )[0],
+    )
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--days", type=int, default=365)
+    parser.add_argument("--entries-per-day", type=int, default=20)
+    parser.add_argument("--products", type=int, default=50000)
+    parser.add_argument("--dishes", type=int, default=10000)
+    parser.add_argument("--ingredients", type=int, default=8)
+    main(parser.parse_args())
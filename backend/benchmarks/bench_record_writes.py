@@ -0,0 +1,103 @@
+"""
+Micro-benchmark of the record write path.
+
+Compares the previous pattern (commit, refresh, second commit) with the
+current single-transaction `create_record` on a temporary SQLite file.
+
+Usage (from the backend directory):
+    python -m benchmarks.bench_record_writes [--records N]
+"""
+
+import argparse
+import asyncio
+import os
+import tempfile
+import time
+
+# The benchmark always uses its own database
+os.environ["DATABASE_URL"] = (
+    f"sqlite+aiosqlite:///{tempfile.mkdtemp()}/bench_record_writes.db"
+)
+os.environ.setdefault("SECRET_KEY", "benchmark")
+os.environ.setdefault("ALGORITHM", "HS256")
+
+from db import AsyncSessionLocal, init_db
+from models.product import Product
+from models.record import Record
+from models.record_product import RecordProduct
+from models.user import User
+from schemas.record import RecordCreate
+from controllers.daily_total_controller import apply_daily_total, calories_for
+from controllers.record_controller import create_record
+
+
+async def create_record_two_commits(session, user: User, product_id: int, weight: int):
+    """The record write path before it was reduced to one transaction."""
+    product = await session.get(Product, product_id)
+    record = Record(user_id=user.id)
+    session.add(record)
+    await session.commit()
+    await session.refresh(record)
+    session.add(
+        RecordProduct(records_id=record.id, product_id=product.id, weight=weight)
+    )
+    await apply_daily_total(
+        session,
+        user,
+        record.created,
+        calories_for(weight, product.calories_per_100g),
+        weight,
+        1,
+    )
+    await session.commit()
+    return record
+
+
+async def measure(name: str, records: int, write) -> float:
+    async with AsyncSessionLocal() as session:
+        user = await session.get(User, 1)
+        started = time.perf_counter()
+        for i in range(records):
+            await write(session, user, 1 + i % 10, 100)
+        elapsed = time.perf_counter() - started
+    print(f"{name:<28} {records / elapsed:8.0f} records/s  ({elapsed:.2f} s)")
+    return records / elapsed
+
+
+async def main(records: int) -> None:
+    await init_db()
+    async with AsyncSessionLocal() as session:
+        session.add(
+            User(
+                username="bench",
+                email="bench@example.com",
+                hashed_password="-",
+                weight=70,
+                height=175,
+                target_weight=65,
+            )
+        )
+        session.add_all(
+            Product(name=f"Product {i}", category="Bench", calories_per_100g=100 + i)
+            for i in range(10)
+        )
+        await session.commit()
+
+    before = await measure(
+        "commit + refresh + commit", records, create_record_two_commits
+    )
+    after = await measure(
+        "single transaction",
+        records,
+        lambda session, user, product_id, weight: create_record(
+            RecordCreate(product_id=product_id, weight=weight), user, session
+        ),
+    )
+    print(f"speed-up: {after / before:.2f}x")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--records", type=int, default=500)
+    args = parser.parse_args()
+    asyncio.run(main(args.records))
@@ -0,0 +1,131 @@
+"""
+Micro-benchmark of the hot list responses.
+
+Serializes the payloads of `get_all_products_route` and
+`get_records_by_date_endpoint` the way FastAPI did before (response model
+validation, `jsonable_encoder`, `JSONResponse`) and the way they are sent now
+(`ORJSONResponse` without validation), and prints the body sizes with the
+compression the middleware negotiates.
+
+Usage (from the backend directory):
+    python -m benchmarks.bench_responses [--products N] [--records N] [--repeat N]
+"""
+
+import argparse
+import asyncio
+import os
+import tempfile
+import time
+import zlib
+
+# The benchmark always uses its own database
+os.environ["DATABASE_URL"] = (
+    f"sqlite+aiosqlite:///{tempfile.mkdtemp()}/bench_responses.db"
+)
+os.environ.setdefault("SECRET_KEY", "benchmark")
+os.environ.setdefault("ALGORITHM", "HS256")
+
+import brotli
+from fastapi.responses import JSONResponse, ORJSONResponse
+from fastapi.routing import serialize_response
+from db import AsyncSessionLocal, init_db
+from models.product import Product
+from models.record import Record
+from models.record_product import RecordProduct
+from models.user import User
+from controllers.product_controller import get_all_products
+from controllers.record_controller import get_records_by_date
+from main import app
+from routes.product_routes import get_all_products_route
+from routes.record_router import get_records_by_date_endpoint
+
+
+def get_response_field(endpoint):
+    """Returns the response model field FastAPI validates the endpoint with."""
+    route = next(
+        route for route in app.routes if getattr(route, "endpoint", None) is endpoint
+    )
+    return route.response_field
+
+
+async def measure(name: str, payload: list, endpoint, repeat: int) -> None:
+    field = get_response_field(endpoint)
+
+    started = time.perf_counter()
+    for _ in range(repeat):
+        content = await serialize_response(
+            field=field, response_content=payload, is_coroutine=True
+        )
+        before_body = JSONResponse(content).body
+    before = (time.perf_counter() - started) / repeat
+
+    started = time.perf_counter()
+    for _ in range(repeat):
+        after_body = ORJSONResponse(payload).body
+    after = (time.perf_counter() - started) / repeat
+
+    gzip = zlib.compressobj(6, zlib.DEFLATED, 31)
+    gzip_size = len(gzip.compress(after_body) + gzip.flush())
+    brotli_size = len(brotli.compress(after_body, quality=4))
+
+    print(f"{name} ({len(payload)} rows)")
+    print(f"  validate + json.dumps   {before * 1000:8.2f} ms  {len(before_body):9d} B")
+    print(f"  orjson, no validation   {after * 1000:8.2f} ms  {len(after_body):9d} B")
+    print(f"  gzip                                {gzip_size:9d} B")
+    print(f"  brotli                              {brotli_size:9d} B")
+    print(f"  serialization speed-up: {before / after:.1f}x")
+
+
+async def main(products: int, records: int, repeat: int) -> None:
+    await init_db()
+    async with AsyncSessionLocal() as session:
+        user = User(
+            username="bench",
+            email="bench@example.com",
+            hashed_password="-",
+            weight=70,
+            height=175,
+            target_weight=65,
+        )
+        session.add(user)
+        session.add_all(
+            Product(
+                name=f"Product {i}",
+                category=f"Category {i % 20}",
+                calories_per_100g=50 + i % 500,
+                image_url=f"static/product-{i}.jpg",
+            )
+            for i in range(products)
+        )
+        await session.flush()
+        session.add_all(
+            Record(
+                user_id=user.id,
+                products=[RecordProduct(product_id=1 + i % products, weight=150)],
+            )
+            for i in range(records)
+        )
+        await session.commit()
+
+        today = time.strftime("%Y-%m-%d", time.gmtime())
+        await measure(
+            "GET /api/v1/products/",
+            await get_all_products(session),
+            get_all_products_route,
+            repeat,
+        )
+        await measure(
+            f"GET /api/v1/records/{today}",
+            await get_records_by_date(today, session, user.id),
+            get_records_by_date_endpoint,
+            repeat,
+        )
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--products", type=int, default=2000)
+    parser.add_argument("--records", type=int, default=50)
+    parser.add_argument("--repeat", type=int, default=20)
+    args = parser.parse_args()
+    asyncio.run(main(args.products, args.records, args.repeat))
@@ -0,0 +1,80 @@
+"""
+Imports products in bulk from a CSV or JSONL nutrition dump.
+
+Rows need `name`, `category` and `calories_per_100g`, and may have the grams
+of `protein_per_100g`, `fat_per_100g`, `carbohydrates_per_100g` and
+`fibre_per_100g`. Products are matched by their normalized name: new names
+are inserted, existing ones updated. Rejected rows are written to a JSONL file
+with the reason.
+
+Usage (from the backend directory):
+    python -m commands.import_products FILE [--format csv|jsonl]
+        [--batch-size N] [--rejects rejects.jsonl]
+"""
+
+import argparse
+import asyncio
+import sys
+import orjson
+from dotenv import load_dotenv
+
+# Loading environment variables from .env
+load_dotenv()
+
+from db import AsyncSessionLocal, init_db
+from controllers.product_import_controller import (
+    IMPORT_BATCH_SIZE,
+    ImportStats,
+    detect_format,
+    import_products,
+    read_rows,
+)
+
+
+def print_progress(stats: ImportStats) -> None:
+    progress = stats.as_dict()
+    print(
+        f"{progress['read']} rows read: {progress['inserted']} inserted, "
+        f"{progress['updated']} updated, {progress['rejected']} rejected "
+        f"({progress['rows_per_second']} rows/s)",
+        file=sys.stderr,
+    )
+
+
+async def main(args) -> None:
+    await init_db()
+    import_format = args.format or detect_format(args.file)
+    rejects_path = args.rejects or f"{args.file}.rejects.jsonl"
+
+    with open(args.file, "rb") as file, open(rejects_path, "wb") as rejects:
+
+        def write_reject(line_number: int, row: object, error: str) -> None:
+            rejects.write(
+                orjson.dumps({"line": line_number, "error": error, "row": row}) + b"\n"
+            )
+
+        async with AsyncSessionLocal() as session:
+            stats = await import_products(
+                session,
+                read_rows(file, import_format),
+                batch_size=args.batch_size,
+                on_reject=write_reject,
+                on_progress=print_progress,
+            )
+
+    print(orjson.dumps(stats.as_dict()).decode())
+    if stats.rejected:
+        print(f"Rejected rows were written to {rejects_path}", file=sys.stderr)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("file", help="CSV or JSONL file to import")
+    parser.add_argument(
+        "--format", choices=("csv", "jsonl"), help="Guessed from the file name"
+    )
+    parser.add_argument("--batch-size", type=int, default=IMPORT_BATCH_SIZE)
+    parser.add_argument(
+        "--rejects", help="Rejected rows file, FILE.rejects.jsonl by default"
+    )
+    asyncio.run(main(parser.parse_args()))
@@ -0,0 +1,32 @@
+"""
+Deletes the delta sync tombstones older than TOMBSTONE_RETENTION_DAYS.
+
+Clients whose sync cursor is older than that are told to sync again from
+scratch, so the purge can run at any time, e.g. daily from cron.
+
+Usage (from the backend directory):
+    python -m commands.purge_tombstones
+"""
+
+import argparse
+import asyncio
+from dotenv import load_dotenv
+
+# Loading environment variables from .env
+load_dotenv()
+
+from db import AsyncSessionLocal, init_db
+from controllers.sync_controller import purge_tombstones
+
+
+async def main() -> None:
+    await init_db()
+    async with AsyncSessionLocal() as session:
+        deleted = await purge_tombstones(session)
+    print(f"Deleted {deleted} tombstones.")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.parse_args()
+    asyncio.run(main())
@@ -0,0 +1,38 @@
+"""
+Rebuilds the per-user daily totals from the existing records.
+
+Usage (from the backend directory):
+    python -m commands.rebuild_daily_totals [--user-id ID]
+"""
+
+import argparse
+import asyncio
+from dotenv import load_dotenv
+
+# Loading environment variables from .env
+load_dotenv()
+
+from db import AsyncSessionLocal, init_db
+from models.user import User
+from controllers.daily_total_controller import rebuild_daily_totals
+
+
+async def main(user_id: int = None) -> None:
+    await init_db()
+    async with AsyncSessionLocal() as session:
+        user = None
+        if user_id is not None:
+            user = await session.get(User, user_id)
+            if not user:
+                raise SystemExit(f"User {user_id} not found")
+
+        written = await rebuild_daily_totals(session, user)
+        await session.commit()
+    print(f"Rebuilt {written} daily totals.")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--user-id", type=int, help="Rebuild only this user")
+    args = parser.parse_args()
+    asyncio.run(main(args.user_id))
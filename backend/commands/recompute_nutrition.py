@@ -0,0 +1,34 @@
+"""
+Recomputes the nutrients of every dish from its ingredients.
+
+Usage (from the backend directory):
+    python -m commands.recompute_nutrition
+"""
+
+import argparse
+import asyncio
+from dotenv import load_dotenv
+
+# Loading environment variables from .env
+load_dotenv()
+
+from db import AsyncSessionLocal, init_db
+from controllers.nutrition_controller import recompute_dish_nutrition
+
+
+async def main() -> None:
+    await init_db()
+    async with AsyncSessionLocal() as session:
+        result = await recompute_dish_nutrition(session)
+    print(f"Recomputed {result['dishes']} dishes, {result['updated']} changed.")
+    if result["skipped"]:
+        print(
+            "Skipped dishes with a deleted product or ingredient: "
+            f"{', '.join(map(str, result['skipped']))}"
+        )
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.parse_args()
+    asyncio.run(main())
@@ -0,0 +1,198 @@
+from datetime import date, datetime
+from typing import Dict, Iterable, Optional, Tuple
+from zoneinfo import ZoneInfo
+from sqlalchemy import delete, func
+from sqlalchemy.dialects.postgresql import insert as postgresql_insert
+from sqlalchemy.dialects.sqlite import insert as sqlite_insert
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy.future import select
+from models.daily_total import DailyTotal
+from models.product import Product
+from models.record import Record
+from models.record_product import RecordProduct
+from models.user import User
+from periods import get_local_day, local_day_expression
+
+
+def calories_for(weight: int, calories_per_100g: float) -> float:
+    """Calories of `weight` grams of a product."""
+    return weight * calories_per_100g / 100
+
+
+async def get_calories_per_100g(
+    session: AsyncSession, product_ids: Iterable[int]
+) -> Dict[int, float]:
+    """
+    Reads the calories per 100g of products from the database.
+
+    Daily totals are rebuilt from these values, so record writes use them as
+    well, rather than cached products that another worker may have changed.
+
+    :return: Calories per 100g keyed by product ID. Unknown IDs are missing.
+    """
+    result = await session.execute(
+        select(Product.id, Product.calories_per_100g).where(
+            Product.id.in_(set(product_ids))
+        )
+    )
+    return dict(result.all())
+
+
+async def apply_daily_totals(
+    session: AsyncSession,
+    deltas: Iterable[Tuple[int, date, float, int, int]],
+) -> None:
+    """
+    Adds deltas to the daily totals within the current transaction.
+
+    :param deltas: (user_id, day, calories, grams, entries) tuples.
+    """
+    rows = [
+        {
+            "user_id": user_id,
+            "day": day,
+            "calories": calories,
+            "grams": grams,
+            "entries": entries,
+        }
+        for user_id, day, calories, grams, entries in deltas
+    ]
+    if not rows:
+        return
+
+    # Upsert, so that concurrent writes to the same day add up instead of conflicting
+    insert = (
+        postgresql_insert
+        if session.bind.dialect.name == "postgresql"
+        else sqlite_insert
+    )
+    statement = insert(DailyTotal)
+    statement = statement.on_conflict_do_update(
+        index_elements=[DailyTotal.user_id, DailyTotal.day],
+        set_={
+            "calories": DailyTotal.calories + statement.excluded.calories,
+            "grams": DailyTotal.grams + statement.excluded.grams,
+            "entries": DailyTotal.entries + statement.excluded.entries,
+        },
+    )
+    await session.execute(statement, rows)
+
+    # Days whose last entry was removed are dropped
+    if any(row["entries"] < 0 for row in rows):
+        await session.execute(
+            delete(DailyTotal).where(
+                DailyTotal.user_id.in_({row["user_id"] for row in rows}),
+                DailyTotal.entries <= 0,
+            )
+        )
+
+
+async def apply_daily_total(
+    session: AsyncSession,
+    user: User,
+    created: datetime,
+    calories: float,
+    grams: int,
+    entries: int,
+) -> None:
+    """
+    Adds a delta to the total of the user's day that `created` falls on.
+    """
+    day = get_local_day(created, ZoneInfo(user.timezone))
+    await apply_daily_totals(session, [(user.id, day, calories, grams, entries)])
+
+
+async def adjust_daily_totals_for_product(
+    session: AsyncSession, product_id: int, calories_delta_per_100g: float
+) -> None:
+    """
+    Updates the daily totals after a product's calories per 100g changed.
+
+    Only the days on which the product was logged are touched.
+    """
+    result = await session.stream(
+        select(User.id, User.timezone, Record.created, RecordProduct.weight)
+        .join(Record, Record.user_id == User.id)
+        .join(RecordProduct, RecordProduct.records_id == Record.id)
+        .where(RecordProduct.product_id == product_id)
+    )
+
+    grams_by_day: Dict[Tuple[int, date], int] = {}
+    async for user_id, user_timezone, created, weight in result:
+        key = (user_id, get_local_day(created, ZoneInfo(user_timezone)))
+        grams_by_day[key] = grams_by_day.get(key, 0) + weight
+
+    await apply_daily_totals(
+        session,
+        (
+            (user_id, day, calories_for(grams, calories_delta_per_100g), 0, 0)
+            for (user_id, day), grams in grams_by_day.items()
+        ),
+    )
+
+
+async def rebuild_daily_totals(
+    session: AsyncSession, user: Optional[User] = None
+) -> int:
+    """
+    Recomputes the daily totals from the records of one user or of every user.
+
+    The caller is responsible for committing the session.
+
+    :return: Number of daily total rows written.
+    """
+    if user:
+        users = [user]
+    else:
+        users = (await session.execute(select(User))).scalars().all()
+
+    written = 0
+    for current_user in users:
+        await session.execute(
+            delete(DailyTotal).where(DailyTotal.user_id == current_user.id)
+        )
+
+        first, last = (
+            await session.execute(
+                select(func.min(Record.created), func.max(Record.created)).where(
+                    Record.user_id == current_user.id
+                )
+            )
+        ).one()
+        if first is None:
+            continue
+
+        day = local_day_expression(
+            session.bind.dialect.name,
+            Record.created,
+            ZoneInfo(current_user.timezone),
+            first,
+            last,
+        ).label("day")
+        result = await session.execute(
+            select(
+                day,
+                func.sum(RecordProduct.weight * Product.calories_per_100g / 100.0),
+                func.sum(RecordProduct.weight),
+                func.count(),
+            )
+            .select_from(Record)
+            .join(RecordProduct, RecordProduct.records_id == Record.id)
+            .join(Product, Product.id == RecordProduct.product_id)
+            .where(Record.user_id == current_user.id)
+            .group_by(day)
+        )
+        rows = [
+            (
+                current_user.id,
+                row_day if isinstance(row_day, date) else date.fromisoformat(row_day),
+                calories,
+                grams,
+                entries,
+            )
+            for row_day, calories, grams, entries in result.all()
+        ]
+        await apply_daily_totals(session, rows)
+        written += len(rows)
+
+    return written
@@ -0,0 +1,132 @@
+from typing import Dict, List, Optional
+import numpy as np
+from fastapi import HTTPException, UploadFile
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy.future import select
+from sqlalchemy.orm import selectinload
+from models.dish import Dish
+from models.dish_ingredient import DishIngredient
+from models.product import Product
+from schemas.dish import DishIngredientCreate
+from controllers.file_controller import save_file
+from nutrition import NUTRIENT_COLUMNS, nutrient_totals
+from controllers.product_controller import (
+    bump_catalog_version,
+    get_products_by_ids,
+    index_product,
+    publish_product_change,
+)
+
+
+def dish_to_dict(dish: Dish, product: Product) -> dict:
+    """
+    Combines a dish with the product it is logged under.
+    """
+    return {
+        "id": dish.id,
+        "product_id": product.id,
+        "name": product.name,
+        "category": product.category,
+        "calories_per_100g": product.calories_per_100g,
+        "protein_per_100g": product.protein_per_100g,
+        "fat_per_100g": product.fat_per_100g,
+        "carbohydrates_per_100g": product.carbohydrates_per_100g,
+        "fibre_per_100g": product.fibre_per_100g,
+        "image_url": product.image_url,
+        "total_weight": dish.total_weight,
+        "total_calories": dish.total_calories,
+        "ingredients": dish.ingredients,
+    }
+
+
+# Asynchronous function to create a dish
+async def create_dish(
+    session: AsyncSession,
+    name: str,
+    category: str,
+    ingredients: List[DishIngredientCreate],
+    file: Optional[UploadFile] = None,
+) -> dict:
+    """
+    Creates a dish and the product it is logged under in one transaction.
+
+    Nutrients per 100g are computed from the ingredients with one matrix
+    product. The same ingredient listed more than once is stored with the
+    weights added up.
+    """
+    if not ingredients:
+        raise HTTPException(status_code=400, detail="A dish needs ingredients")
+
+    weights: Dict[int, int] = {}
+    for ingredient in ingredients:
+        weights[ingredient.product_id] = (
+            weights.get(ingredient.product_id, 0) + ingredient.weight
+        )
+
+    products = await get_products_by_ids(session, list(weights))
+    missing = sorted(set(weights) - set(products))
+    if missing:
+        raise HTTPException(
+            status_code=404,
+            detail=f"Products not found: {', '.join(map(str, missing))}",
+        )
+
+    total_weight = sum(weights.values())
+    totals = nutrient_totals(
+        np.array(list(weights.values()), dtype=float),
+        np.array(
+            [
+                [getattr(products[product_id], column) for column in NUTRIENT_COLUMNS]
+                for product_id in weights
+            ],
+            dtype=float,
+        ),
+    )
+    per_100g = totals / total_weight * 100
+
+    image_url = None
+    if file:
+        image_url = await save_file(file)
+
+    product = Product(
+        name=name.title(),
+        category=category.title(),
+        calories_per_100g=round(per_100g[0]),
+        image_url=image_url,
+        **{
+            column: round(float(value), 2)
+            for column, value in zip(NUTRIENT_COLUMNS[1:], per_100g[1:])
+        },
+    )
+    session.add(product)
+    await session.flush()
+
+    dish = Dish(
+        product_id=product.id,
+        total_weight=total_weight,
+        total_calories=float(totals[0]),
+        ingredients=[
+            DishIngredient(product_id=product_id, weight=weight)
+            for product_id, weight in weights.items()
+        ],
+    )
+    session.add(dish)
+    publish_product_change(session, product.id)
+    await session.commit()
+    bump_catalog_version()
+    index_product(product)
+
+    return dish_to_dict(dish, product)
+
+
+# Asynchronous function to get a dish by ID
+async def get_dish_by_id(session: AsyncSession, dish_id: int) -> Optional[dict]:
+    """Get a dish with its ingredients by its ID."""
+    result = await session.execute(
+        select(Dish, Product)
+        .join(Product, Product.id == Dish.product_id)
+        .options(selectinload(Dish.ingredients))
+        .where(Dish.id == dish_id)
+    )
+    row = result.one_or_none()
+    return dish_to_dict(*row) if row else None
@@ -1,11 +1,128 @@
+import asyncio
+import hashlib
 import os
+import threading
+import time
+import uuid
+from datetime import datetime, timedelta, timezone
 import aiofiles
 import aiofiles.os
+from typing import Optional
 from fastapi import UploadFile, HTTPException
+from sqlalchemy import delete, func
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlmodel import select
+from db import AsyncSessionLocal
+from models.product import Product
+from models.released_file import ReleasedFile
+from controllers.image_controller import delete_variants, schedule_variants
 
 # Constant for the path to the file storage directory
 STATIC_DIR = "static"
 
+# Size of the chunks uploads are copied in
+UPLOAD_CHUNK_SIZE = int(os.getenv("UPLOAD_CHUNK_SIZE", str(1024 * 1024)))
+
+# Largest accepted upload in bytes
+MAX_UPLOAD_SIZE = int(os.getenv("MAX_UPLOAD_SIZE", str(10 * 1024 * 1024)))
+
+# Leading bytes of the accepted image formats and the extension they are
+# stored with, which also decides the Content-Type they are served with
+IMAGE_SIGNATURES = (
+    (b"\xff\xd8\xff", ".jpg"),
+    (b"\x89PNG\r\n\x1a\n", ".png"),
+    (b"GIF87a", ".gif"),
+    (b"GIF89a", ".gif"),
+    (b"BM", ".bmp"),
+)
+
+# Major brands of the accepted ISO media files; other brands are videos
+IMAGE_FTYP_BRANDS = {
+    b"avif": ".avif",
+    b"heic": ".heic",
+    b"heix": ".heic",
+    b"mif1": ".heif",
+}
+
+# A released file is deleted once it has been neither released nor stored
+# again for this long, so uploads reusing it can commit their reference first
+FILE_RELEASE_GRACE = timedelta(
+    seconds=float(os.getenv("FILE_RELEASE_GRACE_SECONDS", "600"))
+)
+
+# Seconds between two sweeps of the released files
+FILE_SWEEP_INTERVAL = float(os.getenv("FILE_SWEEP_INTERVAL", "60"))
+
+# Serializes blob creation and removal within the process
+_blob_lock = asyncio.Lock()
+
+_sweeper_task: Optional[asyncio.Task] = None
+
+
+class UploadMetrics:
+    """Counters for stored uploads and the time spent writing them."""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.uploads = 0
+        self.deduplicated = 0
+        self.rejected = 0
+        self.bytes = 0
+        self.seconds = 0.0
+
+    def record(self, size: int, seconds: float, deduplicated: bool) -> None:
+        with self._lock:
+            self.uploads += 1
+            self.deduplicated += deduplicated
+            self.bytes += size
+            self.seconds += seconds
+
+    def record_rejection(self) -> None:
+        with self._lock:
+            self.rejected += 1
+
+    def stats(self) -> dict:
+        """Returns the counters and the average throughput."""
+        with self._lock:
+            return {
+                "chunk_size": UPLOAD_CHUNK_SIZE,
+                "max_upload_size": MAX_UPLOAD_SIZE,
+                "uploads": self.uploads,
+                "deduplicated": self.deduplicated,
+                "rejected": self.rejected,
+                "bytes": self.bytes,
+                "seconds": round(self.seconds, 4),
+                "bytes_per_second": (
+                    round(self.bytes / self.seconds) if self.seconds else None
+                ),
+            }
+
+
+upload_metrics = UploadMetrics()
+
+
+def sniff_image_extension(header: bytes) -> Optional[str]:
+    """
+    Detects the image format from the leading bytes of a file.
+
+    :return: Extension of the format, or None if it is not an accepted image.
+    """
+    for signature, extension in IMAGE_SIGNATURES:
+        if header.startswith(signature):
+            return extension
+    # WebP is a RIFF container, AVIF and HEIC are ISO media files
+    if header[:4] == b"RIFF" and header[8:12] == b"WEBP":
+        return ".webp"
+    if header[4:8] == b"ftyp":
+        return IMAGE_FTYP_BRANDS.get(header[8:12])
+    return None
+
+
+def reject_upload(status_code: int, detail: str) -> None:
+    """Counts a rejected upload and raises the matching HTTP error."""
+    upload_metrics.record_rejection()
+    raise HTTPException(status_code=status_code, detail=detail)
+
 
 async def ensure_static_dir_exists() -> None:
     """
@@ -18,73 +135,207 @@ async def ensure_static_dir_exists() -> None:
 async def save_file(file: UploadFile) -> str:
     """
     Saves the file in the static directory and returns the path to the file.
+
+    The file is named after the SHA-256 digest of its content, with the
+    extension of its detected format, so identical uploads are stored once and
+    a stored file never changes. The upload is
+    written to a temporary file while hashing and renamed into place, so
+    concurrent uploads never see each other's partial writes.
+
+    :raises HTTPException: 413 if the file is larger than `MAX_UPLOAD_SIZE`,
+        415 if it is not an image.
     """
+    started = time.perf_counter()
+    if file.size is not None and file.size > MAX_UPLOAD_SIZE:
+        reject_upload(413, "File is too large.")
+
+    # The format is checked before anything is written. The name of the
+    # uploaded file is ignored, so the stored file is served as what it is.
+    chunk = await file.read(UPLOAD_CHUNK_SIZE)
+    extension = sniff_image_extension(chunk[:16])
+    if extension is None:
+        reject_upload(415, "Only image files can be uploaded.")
+
     # Checking the directory exists
     await ensure_static_dir_exists()
 
-    # Get the file extension
-    file_extension = os.path.splitext(file.filename)[-1]
-    # Generate a new file name
-    new_filename = f"{file.filename.split('.')[0]}{file_extension}"
-    # Path to save
-    file_path = os.path.join(STATIC_DIR, new_filename)
+    digest = hashlib.sha256()
+    size = 0
+    temporary_path = os.path.join(STATIC_DIR, f".upload-{uuid.uuid4().hex}")
+
+    try:
+        # Save file asynchronously in large chunks, hashing it on the way
+        async with aiofiles.open(temporary_path, "wb") as buffer:
+            while chunk:
+                size += len(chunk)
+                if size > MAX_UPLOAD_SIZE:
+                    reject_upload(413, "File is too large.")
+                digest.update(chunk)
+                await buffer.write(chunk)
+                chunk = await file.read(UPLOAD_CHUNK_SIZE)
+
+        file_name = f"{digest.hexdigest()}{extension}"
+        file_path = os.path.join(STATIC_DIR, file_name)
+
+        async with _blob_lock:
+            try:
+                # Same content is already stored. Touching it tells the sweep
+                # that a reference to it is about to be committed.
+                await asyncio.get_running_loop().run_in_executor(
+                    None, os.utime, file_path
+                )
+            except FileNotFoundError:
+                await aiofiles.os.replace(temporary_path, file_path)
+            else:
+                await aiofiles.os.remove(temporary_path)
+                upload_metrics.record(size, time.perf_counter() - started, True)
+                return file_path
+    except BaseException:
+        if await aiofiles.os.path.exists(temporary_path):
+            await aiofiles.os.remove(temporary_path)
+        raise
+
+    upload_metrics.record(size, time.perf_counter() - started, False)
 
-    # Save file asynchronously
-    async with aiofiles.open(file_path, "wb") as buffer:
-        while chunk := await file.read(1024):  # Reading the file by chunk
-            await buffer.write(chunk)
+    # Resized variants are generated in the background
+    schedule_variants(file_path)
 
     return file_path
 
 
-async def get_file_path(file_name: str) -> str:
+async def count_file_references(session: AsyncSession, image_url: str) -> int:
+    """Returns the number of products using the file."""
+    result = await session.execute(
+        select(func.count()).where(Product.image_url == image_url)
+    )
+    return result.scalar_one()
+
+
+async def release_file(session: AsyncSession, image_url: Optional[str]) -> None:
     """
-    Returns the path to a file in the static directory.
+    Marks a file as possibly unused, within the session's transaction.
+
+    Call it with the change that drops a reference to the file. The file is
+    deleted by `sweep_released_files` once no product refers to it anymore.
 
-    :param file_name: File name.
-    :return: Path to file.
+    :param image_url: Path of the file that was referenced.
     """
-    # Creating path to a file
-    file_path = os.path.join(STATIC_DIR, file_name)
+    if image_url:
+        session.add(ReleasedFile(path=image_url))
 
-    # Asynchronous check for file existence
-    if not await aiofiles.os.path.exists(file_path):
-        raise HTTPException(status_code=404, detail="File not found.")
 
-    return file_path
+def remove_stale_file(file_path: str, cutoff: float) -> bool:
+    """
+    Deletes a file unless it was stored again since `cutoff` (a timestamp).
+
+    The file is moved away before its modification time is checked, so an
+    upload either touched it before and it is put back, or finds it missing
+    and stores it anew.
+
+    :return: False if the file was kept.
+    """
+    trash_path = os.path.join(STATIC_DIR, f".deleted-{uuid.uuid4().hex}")
+    try:
+        os.rename(file_path, trash_path)
+    except FileNotFoundError:
+        return True
+    if os.stat(trash_path).st_mtime >= cutoff:
+        os.replace(trash_path, file_path)
+        return False
+    os.remove(trash_path)
+    return True
 
 
-async def update_file(file: UploadFile, old_file_name: str) -> str:
+async def sweep_released_files(
+    session: AsyncSession, grace: timedelta = FILE_RELEASE_GRACE
+) -> int:
     """
-    Updates a file by deleting the old file (if it exists) and uploading a new file.
+    Deletes the files released longer than `grace` ago that no product refers
+    to and that were not stored again within `grace`.
+
+    Safe to run from several workers at once.
 
-    :param file: The new file to upload.
-    :param old_file_name: The name of the old file to delete.
-    :return: The path to the newly uploaded file.
+    :return: Number of files checked.
     """
-    old_file_path = os.path.join(STATIC_DIR, old_file_name)
+    cutoff = datetime.now(timezone.utc) - grace
+    result = await session.execute(
+        select(ReleasedFile.id, ReleasedFile.path).where(ReleasedFile.released < cutoff)
+    )
+    rows = result.all()
+    if not rows:
+        return 0
+
+    loop = asyncio.get_running_loop()
+    done = set()
+    for image_url in {row.path for row in rows}:
+        if await count_file_references(session, image_url):
+            done.add(image_url)
+            continue
+        file_name = image_url.split("/")[-1]
+        file_path = os.path.join(STATIC_DIR, file_name)
+        async with _blob_lock:
+            removed = await loop.run_in_executor(
+                None, remove_stale_file, file_path, cutoff.timestamp()
+            )
+        if removed:
+            await delete_variants(file_name)
+            done.add(image_url)
 
-    # Delete the old file if it exists
-    if await aiofiles.os.path.exists(old_file_path):
-        await aiofiles.os.remove(old_file_path)
+    # Files reused by a pending upload are checked again by a later sweep
+    await session.execute(
+        delete(ReleasedFile).where(
+            ReleasedFile.id.in_([row.id for row in rows if row.path in done])
+        )
+    )
+    await session.commit()
+    return len(done)
 
-    # Save a new file using the save_file function
-    return await save_file(file)
 
+async def run_file_sweeper() -> None:
+    """Sweeps the released files every `FILE_SWEEP_INTERVAL` seconds."""
+    while True:
+        await asyncio.sleep(FILE_SWEEP_INTERVAL)
+        try:
+            async with AsyncSessionLocal() as session:
+                await sweep_released_files(session)
+        except Exception as e:
+            print(f"Error sweeping released files: {e}")
 
-async def delete_file(file_name: str) -> None:
+
+def start_file_sweeper() -> None:
+    global _sweeper_task
+    _sweeper_task = asyncio.create_task(run_file_sweeper())
+
+
+async def stop_file_sweeper() -> None:
+    global _sweeper_task
+    if _sweeper_task:
+        _sweeper_task.cancel()
+        try:
+            await _sweeper_task
+        except asyncio.CancelledError:
+            pass
+        _sweeper_task = None
+
+
+async def delete_file(session: AsyncSession, file_name: str) -> None:
     """
     Deletes a file from the static directory.
 
     :param file_name: Name of the file to delete.
-    :raises HTTPException: If the file does not exist.
+    :raises HTTPException: If the file does not exist or is used by a product.
     """
     # Creating path to a file
     file_path = os.path.join(STATIC_DIR, file_name)
 
-    # Checking the existence of a file
-    if not await aiofiles.os.path.exists(file_path):
-        raise HTTPException(status_code=404, detail="File not found.")
+    async with _blob_lock:
+        # Checking the existence of a file; directories are not files
+        if not await aiofiles.os.path.isfile(file_path):
+            raise HTTPException(status_code=404, detail="File not found.")
+
+        if await count_file_references(session, file_path):
+            raise HTTPException(status_code=409, detail="File is used by a product.")
 
-    # Delete file asynchronously
-    await aiofiles.os.remove(file_path)
+        # Delete file asynchronously
+        await aiofiles.os.remove(file_path)
+        await delete_variants(file_name)
@@ -0,0 +1,138 @@
+import asyncio
+import glob
+import os
+from concurrent.futures import ProcessPoolExecutor
+from typing import Dict, Optional
+import aiofiles.os
+from PIL import Image, ImageOps
+
+# Directory with resized copies of the uploaded images
+VARIANTS_DIR = os.path.join("static", "variants")
+
+# Widths of the generated variants in pixels
+VARIANT_WIDTHS = (64, 256, 1024)
+
+# Formats of the generated variants
+VARIANT_FORMATS = ("webp", "jpeg")
+
+# Extensions of the files that can be resized
+RESIZABLE_EXTENSIONS = (".jpg", ".jpeg", ".png", ".webp", ".gif", ".bmp")
+
+_executor: Optional[ProcessPoolExecutor] = None
+_pending: Dict[str, asyncio.Future] = {}
+_background_tasks = set()
+
+
+def get_executor() -> ProcessPoolExecutor:
+    """Returns the process pool for image resizing, creating it on first use."""
+    global _executor
+    if _executor is None:
+        _executor = ProcessPoolExecutor(
+            max_workers=int(os.getenv("IMAGE_WORKERS", "2"))
+        )
+    return _executor
+
+
+def shutdown_executor() -> None:
+    """Stops the image resizing processes."""
+    global _executor
+    if _executor is not None:
+        _executor.shutdown(wait=False, cancel_futures=True)
+        _executor = None
+
+
+def is_resizable(file_name: str) -> bool:
+    """Checks whether variants can be generated for the file."""
+    return file_name.lower().endswith(RESIZABLE_EXTENSIONS)
+
+
+def pick_variant_width(width: int) -> int:
+    """Returns the smallest variant width not below the requested one."""
+    return next((w for w in VARIANT_WIDTHS if w >= width), VARIANT_WIDTHS[-1])
+
+
+def get_variant_path(file_name: str, width: int, image_format: str) -> str:
+    """Returns where the variant of an image is stored."""
+    return os.path.join(VARIANTS_DIR, f"{file_name}.{width}.{image_format}")
+
+
+def render_variant(source: str, target: str, width: int, image_format: str) -> None:
+    """
+    Writes a copy of the image scaled down to `width` pixels.
+
+    Runs in a worker process. The copy is written to a temporary file first, so
+    readers never see a partially written variant.
+    """
+    with Image.open(source) as original:
+        image = ImageOps.exif_transpose(original)
+        if image.width > width:
+            height = max(1, round(image.height * width / image.width))
+            image = image.resize((width, height), Image.Resampling.LANCZOS)
+        if image_format == "jpeg" and image.mode not in ("RGB", "L"):
+            image = image.convert("RGB")
+
+        os.makedirs(os.path.dirname(target), exist_ok=True)
+        temporary_path = f"{target}.{os.getpid()}.tmp"
+        image.save(temporary_path, format=image_format.upper(), quality=80)
+        os.replace(temporary_path, target)
+
+
+async def ensure_variant(
+    file_path: str, width: int, image_format: str
+) -> Optional[str]:
+    """
+    Returns the path of an image variant, generating it if it does not exist.
+
+    Concurrent requests for the same missing variant share one generation.
+
+    :return: Path to the variant, or None if the file can't be resized.
+    """
+    target = get_variant_path(os.path.basename(file_path), width, image_format)
+    if await aiofiles.os.path.exists(target):
+        return target
+
+    if target not in _pending:
+        loop = asyncio.get_running_loop()
+        _pending[target] = loop.run_in_executor(
+            get_executor(), render_variant, file_path, target, width, image_format
+        )
+    try:
+        await asyncio.shield(_pending[target])
+    except Exception as e:
+        print(f"Error generating image variant {target}: {e}")
+        return None
+    finally:
+        _pending.pop(target, None)
+    return target
+
+
+async def generate_variants(file_path: str) -> None:
+    """Generates every variant of an image."""
+    await asyncio.gather(
+        *(
+            ensure_variant(file_path, width, image_format)
+            for width in VARIANT_WIDTHS
+            for image_format in VARIANT_FORMATS
+        )
+    )
+
+
+def schedule_variants(file_path: str) -> None:
+    """
+    Starts generating the variants of an uploaded image in the background.
+
+    Variants that are requested before they are ready are generated on demand.
+    """
+    if not is_resizable(file_path):
+        return
+    task = asyncio.create_task(generate_variants(file_path))
+    _background_tasks.add(task)
+    task.add_done_callback(_background_tasks.discard)
+
+
+async def delete_variants(file_name: str) -> None:
+    """Deletes every variant of an image."""
+    pattern = os.path.join(VARIANTS_DIR, f"{glob.escape(file_name)}.*")
+    loop = asyncio.get_running_loop()
+    for path in await loop.run_in_executor(None, glob.glob, pattern):
+        await loop.run_in_executor(None, os.remove, path)
@@ -0,0 +1,235 @@
+from datetime import date, datetime, timedelta, timezone
+from typing import List, Tuple
+from zoneinfo import ZoneInfo
+import numpy as np
+from fastapi import HTTPException
+from sqlalchemy import update
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy.future import select
+from models.dish import Dish
+from models.dish_ingredient import DishIngredient
+from models.product import Product
+from models.record import Record
+from models.record_product import RecordProduct
+from models.user import User
+from invalidation_bus import invalidation_bus
+from nutrition import NUTRIENT_COLUMNS, dish_nutrients, group_totals, to_dict
+from periods import GRANULARITIES, get_day_bounds, get_period_start
+from controllers.daily_total_controller import adjust_daily_totals_for_product
+from controllers.summary_controller import MAX_SUMMARY_DAYS
+
+
+async def get_nutrition_report(
+    date_from: date,
+    date_to: date,
+    granularity: str,
+    session: AsyncSession,
+    user: User,
+) -> List[dict]:
+    """
+    Computes calories, protein, fat, carbohydrates and fibre per day, week or
+    month from the logged products.
+
+    The entries of the range are loaded with one query into a weight vector
+    and a nutrients-per-100g matrix. Entries are assigned to local days by a
+    binary search over the day boundaries, and the totals per period are
+    weighted sums over those arrays. Periods without records are omitted.
+    """
+    if granularity not in GRANULARITIES:
+        raise HTTPException(
+            status_code=400,
+            detail=f"Granularity must be one of: {', '.join(GRANULARITIES)}",
+        )
+    if date_to < date_from:
+        raise HTTPException(status_code=400, detail="'to' must not be before 'from'")
+    if (date_to - date_from).days >= MAX_SUMMARY_DAYS:
+        raise HTTPException(
+            status_code=400, detail=f"Range must not exceed {MAX_SUMMARY_DAYS} days"
+        )
+
+    tz = ZoneInfo(user.timezone)
+    days = [
+        date_from + timedelta(days=offset)
+        for offset in range((date_to - date_from).days + 1)
+    ]
+    day_starts = [get_day_bounds(day, tz)[0] for day in days]
+    _, end = get_day_bounds(date_to, tz)
+
+    result = await session.execute(
+        select(
+            Record.created,
+            RecordProduct.weight,
+            *(getattr(Product, column) for column in NUTRIENT_COLUMNS),
+        )
+        .join(RecordProduct, RecordProduct.records_id == Record.id)
+        .join(Product, Product.id == RecordProduct.product_id)
+        .where(Record.user_id == user.id)
+        .where(Record.created >= day_starts[0], Record.created < end)
+    )
+    rows = result.all()
+    if not rows:
+        return []
+
+    columns = list(zip(*rows))
+    created = np.array(columns[0], dtype="datetime64[us]")
+    weights = np.array(columns[1], dtype=float)
+    per_100g = np.array(columns[2:], dtype=float).T
+
+    periods = sorted({get_period_start(day, granularity) for day in days})
+    period_index = {period: index for index, period in enumerate(periods)}
+    period_of_day = np.array(
+        [period_index[get_period_start(day, granularity)] for day in days]
+    )
+    day_of_entry = (
+        np.searchsorted(np.array(day_starts, dtype="datetime64[us]"), created, "right")
+        - 1
+    )
+    groups = period_of_day[day_of_entry]
+
+    totals = group_totals(groups, weights, per_100g, len(periods))
+    grams = np.bincount(groups, weights=weights, minlength=len(periods))
+    entries = np.bincount(groups, minlength=len(periods))
+
+    return [
+        {
+            "period": period.isoformat(),
+            **to_dict(totals[index]),
+            "grams": int(grams[index]),
+            "entries": int(entries[index]),
+        }
+        for index, period in enumerate(periods)
+        if entries[index]
+    ]
+
+
+def find_rows(sorted_ids: np.ndarray, ids) -> Tuple[np.ndarray, np.ndarray]:
+    """
+    Looks up IDs in a sorted ID array.
+
+    :return: Position of every ID, and whether it was found; the position of
+        a missing ID is meaningless.
+    """
+    ids = np.asarray(ids, dtype=np.int64)
+    if not len(sorted_ids):
+        return np.zeros(len(ids), dtype=np.int64), np.zeros(len(ids), dtype=bool)
+    rows = np.minimum(np.searchsorted(sorted_ids, ids), len(sorted_ids) - 1)
+    return rows, sorted_ids[rows] == ids
+
+
+async def recompute_dish_nutrition(session: AsyncSession) -> dict:
+    """
+    Recomputes the nutrients of every dish from its ingredients.
+
+    The catalog is loaded into a nutrients-per-100g matrix and all dishes are
+    computed together, one level of nesting at a time. Only dishes whose
+    values changed are written, with one executemany, and the days on which
+    they were logged are recalculated. Used to repair drift after incremental
+    updates and to fill in the nutrients of dishes created before they were
+    tracked.
+
+    Dishes whose product or one of whose ingredients was deleted are skipped
+    and reported.
+
+    :return: Number of dishes, number of dishes that changed, and the IDs of
+        the skipped dishes.
+    """
+    result = await session.execute(
+        select(
+            Product.id, *(getattr(Product, column) for column in NUTRIENT_COLUMNS)
+        ).order_by(Product.id)
+    )
+    products = result.all()
+    result = await session.execute(
+        select(Dish.id, Dish.product_id, Dish.total_calories).order_by(Dish.id)
+    )
+    dishes = result.all()
+    if not dishes:
+        return {"dishes": 0, "updated": 0, "skipped": []}
+    result = await session.execute(
+        select(DishIngredient.dish_id, DishIngredient.product_id, DishIngredient.weight)
+    )
+    ingredients = result.all()
+
+    product_ids = np.array([row[0] for row in products], dtype=np.int64)
+    per_100g = np.array([row[1:] for row in products], dtype=float).reshape(
+        len(products), len(NUTRIENT_COLUMNS)
+    )
+    dish_ids = np.array([row.id for row in dishes], dtype=np.int64)
+    ingredient_columns = list(zip(*ingredients)) or [(), (), ()]
+    dish_products, dish_found = find_rows(
+        product_ids, [row.product_id for row in dishes]
+    )
+    ingredient_dishes, ingredient_dish_found = find_rows(
+        dish_ids, ingredient_columns[0]
+    )
+    ingredient_products, ingredient_product_found = find_rows(
+        product_ids, ingredient_columns[1]
+    )
+    ingredient_weights = np.array(ingredient_columns[2], dtype=float)
+
+    # Dishes whose product or one of whose ingredients no longer exists are
+    # left as they are, rather than computed from the wrong rows
+    missing_ingredients = ingredient_dish_found & ~ingredient_product_found
+    complete = dish_found.copy()
+    complete[ingredient_dishes[missing_ingredients]] = False
+    skipped = [int(dish_id) for dish_id in dish_ids[~complete]]
+    if not complete.any():
+        return {"dishes": len(dish_ids), "updated": 0, "skipped": skipped}
+
+    kept = ingredient_dish_found & complete[ingredient_dishes]
+    dish_index = np.cumsum(complete) - 1
+    dishes = [dish for dish, ok in zip(dishes, complete) if ok]
+    dish_products = dish_products[complete]
+    new_per_100g, totals = dish_nutrients(
+        per_100g,
+        dish_products,
+        dish_index[ingredient_dishes[kept]],
+        ingredient_products[kept],
+        ingredient_weights[kept],
+    )
+
+    # Dish products store whole calories and nutrients to two decimals
+    new_per_100g[dish_products, 0] = np.round(new_per_100g[dish_products, 0])
+    new_per_100g[dish_products, 1:] = np.round(new_per_100g[dish_products, 1:], 2)
+    changed = dish_products[
+        np.any(new_per_100g[dish_products] != per_100g[dish_products], axis=1)
+    ]
+    now = datetime.now(timezone.utc)
+
+    product_updates = [
+        {
+            "id": int(product_ids[row]),
+            "calories_per_100g": int(new_per_100g[row, 0]),
+            **{
+                column: float(value)
+                for column, value in zip(NUTRIENT_COLUMNS[1:], new_per_100g[row, 1:])
+            },
+            "updated": now,
+        }
+        for row in changed
+    ]
+    dish_updates = [
+        {"id": dish.id, "total_calories": float(totals[index, 0])}
+        for index, dish in enumerate(dishes)
+        if abs(dish.total_calories - totals[index, 0]) > 1e-6
+    ]
+
+    for row in changed:
+        calories_delta = new_per_100g[row, 0] - per_100g[row, 0]
+        if calories_delta:
+            await adjust_daily_totals_for_product(
+                session, int(product_ids[row]), float(calories_delta)
+            )
+    if product_updates:
+        await session.execute(update(Product), product_updates)
+    if dish_updates:
+        await session.execute(update(Dish), dish_updates)
+    if product_updates or dish_updates:
+        invalidation_bus.publish(session, "catalog", "recompute")
+    await session.commit()
+
+    return {
+        "dishes": len(dish_ids),
+        "updated": len(product_updates),
+        "skipped": skipped,
+    }
@@ -1,10 +1,179 @@
-from sqlmodel import select
-from typing import Optional
+import hashlib
+import os
+from datetime import datetime, timezone
+from sqlmodel import delete, func, select
+from typing import Dict, FrozenSet, Optional, List
 from fastapi import UploadFile, HTTPException
 
 from models.product import Product
+from models.dish import Dish
+from models.dish_ingredient import DishIngredient
+from models.record_product import RecordProduct
+from models.tombstone import Tombstone
 from sqlalchemy.ext.asyncio import AsyncSession
-from controllers.file_controller import save_file, update_file, delete_file
+from cache import LRUCache
+from search_index import ProductSearchIndex
+from db import AsyncSessionLocal
+from invalidation_bus import invalidation_bus
+from nutrition import NUTRIENT_COLUMNS
+from controllers.file_controller import save_file, release_file
+from controllers.daily_total_controller import (
+    adjust_daily_totals_for_product,
+    calories_for,
+)
+
+# Maximum number of products returned by one page of the catalog
+MAX_PAGE_SIZE = 500
+
+# Product columns returned by the catalog and kept in the search index
+PRODUCT_FIELDS = ("id", "name", "category", "calories_per_100g", "image_url")
+
+# Nutrient columns besides calories, returned only when requested
+NUTRIENT_FIELDS = tuple(
+    column for column in NUTRIENT_COLUMNS if column not in PRODUCT_FIELDS
+)
+
+# Catalog version derived from the database, so that every worker issues the
+# same ETags. It is dropped on every product write this worker sees and read
+# again by the next listing; the generation counts the drops.
+_catalog_version: Optional[str] = None
+_catalog_generation = 0
+
+
+# Cache for product lookups by ID and by normalized name
+product_cache = LRUCache(
+    maxsize=int(os.getenv("PRODUCT_CACHE_SIZE", "4096")),
+    ttl=float(os.getenv("PRODUCT_CACHE_TTL", "600")),
+)
+
+
+# Search index over product names, kept in sync with product writes
+product_search_index = ProductSearchIndex()
+
+
+async def build_search_index(session: AsyncSession) -> None:
+    """Loads every product into the search index."""
+    product_search_index.clear()
+    result = await session.execute(
+        select(*(getattr(Product, field) for field in PRODUCT_FIELDS))
+    )
+    product_search_index.add_many(dict(row) for row in result.mappings())
+    print(f"Search index built with {len(product_search_index)} products.")
+
+
+def index_product(product: Product) -> None:
+    """Adds or replaces a product in the search index."""
+    product_search_index.add(product.model_dump(include=set(PRODUCT_FIELDS)))
+
+
+def search_products(query: str, limit: int = 10) -> List[dict]:
+    """Searches products by name, tolerating typos and transliteration."""
+    return product_search_index.search(query, limit)
+
+
+def cache_product(product: Product) -> Product:
+    """
+    Stores a detached copy of the product in the cache under its ID and name.
+    """
+    cached = Product(**product.model_dump())
+    product_cache.set(("id", cached.id), cached)
+    product_cache.set(("name", cached.name), cached)
+    return cached
+
+
+def invalidate_product(product_id: int, *names: str) -> None:
+    """Removes a product from the cache by its ID and (old and new) names."""
+    product_cache.invalidate(("id", product_id), *(("name", name) for name in names))
+
+
+def publish_product_change(session: AsyncSession, product_id: int, *names: str):
+    """
+    Tells the other workers that a product changed, within the session's
+    transaction. `names` are its old and new names.
+    """
+    invalidation_bus.publish(session, "product", product_id)
+    invalidation_bus.publish(session, "product_name", *names)
+
+
+async def reload_products(keys: List[str]) -> None:
+    """Applies product changes made by another worker to the cache and index."""
+    product_ids = {int(key) for key in keys}
+    product_cache.invalidate(*(("id", product_id) for product_id in product_ids))
+    async with AsyncSessionLocal() as session:
+        result = await session.execute(
+            select(*(getattr(Product, field) for field in PRODUCT_FIELDS)).where(
+                Product.id.in_(product_ids)
+            )
+        )
+        found = {row["id"]: dict(row) for row in result.mappings()}
+    for product_id in product_ids:
+        if product_id in found:
+            product_search_index.add(found[product_id])
+        else:
+            product_search_index.remove(product_id)
+    bump_catalog_version()
+
+
+async def forget_product_names(keys: List[str]) -> None:
+    """Drops products renamed or deleted by another worker from the name cache."""
+    product_cache.invalidate(*(("name", name) for name in keys))
+
+
+async def reload_catalog(keys: List[str]) -> None:
+    """
+    Reloads the cache and search index after a bulk change of the catalog,
+    made by this or another worker.
+    """
+    product_cache.clear()
+    async with AsyncSessionLocal() as session:
+        await build_search_index(session)
+    bump_catalog_version()
+
+
+invalidation_bus.subscribe("product", reload_products)
+invalidation_bus.subscribe("product_name", forget_product_names)
+invalidation_bus.subscribe("catalog", reload_catalog)
+
+
+def bump_catalog_version() -> None:
+    """Marks the product catalog as changed."""
+    global _catalog_version, _catalog_generation
+    _catalog_version = None
+    _catalog_generation += 1
+
+
+async def get_catalog_version(session: AsyncSession) -> str:
+    """
+    Returns the version of the product catalog, computed from the latest
+    update time and the number of products.
+
+    Every write sets the update time of the products it touches and a delete
+    lowers the count, so the version changes with any product write.
+    """
+    global _catalog_version
+    if _catalog_version is not None:
+        return _catalog_version
+
+    generation = _catalog_generation
+    result = await session.execute(select(func.max(Product.updated), func.count()))
+    updated, count = result.one()
+    version = hashlib.md5(f"{updated}-{count}".encode()).hexdigest()[:8]
+    # A write seen while querying makes the result stale already
+    if generation == _catalog_generation:
+        _catalog_version = version
+    return version
+
+
+async def get_catalog_etag(session: AsyncSession, query: str = "") -> str:
+    """
+    Returns the ETag for a catalog listing.
+
+    :param query: Query string of the listing request (filters, page, fields).
+    :return: ETag that changes whenever any product is written.
+    """
+    version = await get_catalog_version(session)
+    query_hash = hashlib.md5(query.encode()).hexdigest()[:8]
+    return f'W/"{version}-{query_hash}"'
 
 
 # Asynchronous function to create a product
@@ -14,9 +183,13 @@ async def create_product(
     category: str,
     calories_per_100g: int,
     file: Optional[UploadFile] = None,
+    nutrients: Optional[Dict[str, float]] = None,
 ) -> Product:
     """
     Creates a product and saves an image file if provided.
+
+    :param nutrients: Grams of protein, fat, carbohydrates and fibre per 100g,
+        keyed by column name. Missing ones are 0.
     """
     image_url = None
     if file:
@@ -27,35 +200,196 @@ async def create_product(
         category=category.title(),
         calories_per_100g=calories_per_100g,
         image_url=image_url,
+        **(nutrients or {}),
     )
     session.add(product)
+    await session.flush()
+    publish_product_change(session, product.id)
     await session.commit()
+    bump_catalog_version()
     await session.refresh(product)
+    index_product(product)
     return product
 
 
 # Async function to get all products
-async def get_all_products(session: AsyncSession):
-    """Get all products from the database."""
-    statement = select(Product)
+async def get_all_products(
+    session: AsyncSession,
+    cursor: Optional[int] = None,
+    limit: Optional[int] = None,
+    category: Optional[str] = None,
+    name_prefix: Optional[str] = None,
+    fields: Optional[List[str]] = None,
+) -> List[dict]:
+    """
+    Get products from the database, ordered by ID.
+
+    :param session: Database session.
+    :param cursor: ID of the last product of the previous page (keyset pagination).
+    :param limit: Maximum number of products to return.
+    :param category: Return only products of this category.
+    :param name_prefix: Return only products whose name starts with this prefix.
+    :param fields: Product columns to return, PRODUCT_FIELDS by default; the
+        NUTRIENT_FIELDS can be requested as well. The ID is always included.
+    :raises HTTPException: If an unknown field is requested.
+    """
+    fields = fields or list(PRODUCT_FIELDS)
+    unknown = [
+        field for field in fields if field not in PRODUCT_FIELDS + NUTRIENT_FIELDS
+    ]
+    if unknown:
+        raise HTTPException(
+            status_code=400, detail=f"Unknown product fields: {', '.join(unknown)}"
+        )
+    if "id" not in fields:
+        fields = ["id", *fields]
+
+    # Selecting plain columns avoids building a Product object per row
+    statement = select(*(getattr(Product, field) for field in fields)).order_by(
+        Product.id
+    )
+    if cursor is not None:
+        statement = statement.where(Product.id > cursor)
+    if category:
+        statement = statement.where(Product.category == category.title())
+    if name_prefix:
+        # Range condition instead of LIKE, so the name index can be used
+        prefix = name_prefix.title()
+        statement = statement.where(
+            Product.name >= prefix, Product.name < prefix + "\uffff"
+        )
+    if limit is not None:
+        statement = statement.limit(limit)
+
     result = await session.execute(statement)
-    return result.scalars().all()
+    return [dict(row) for row in result.mappings().all()]
 
 
 # Asynchronous function to get product by ID
 async def get_product_by_id(session: AsyncSession, product_id: int) -> Product:
-    """Get a product by its ID."""
+    """
+    Get a product by its ID.
+
+    The returned product is a cached copy that is not attached to the session.
+    """
+    product = product_cache.get(("id", product_id))
+    if product is not None:
+        return product
+
     statement = select(Product).where(Product.id == product_id)
     result = await session.execute(statement)
-    return result.scalar_one_or_none()
+    product = result.scalar_one_or_none()
+    return cache_product(product) if product else None
+
+
+# Asynchronous function to get several products by their IDs
+async def get_products_by_ids(
+    session: AsyncSession, product_ids: List[int]
+) -> Dict[int, Product]:
+    """
+    Get products by their IDs with at most one query for the uncached ones.
+
+    :return: Products found, keyed by ID. Unknown IDs are missing from the result.
+    """
+    products = {}
+    missing = []
+    for product_id in set(product_ids):
+        product = product_cache.get(("id", product_id))
+        if product is not None:
+            products[product_id] = product
+        else:
+            missing.append(product_id)
+
+    if missing:
+        result = await session.execute(select(Product).where(Product.id.in_(missing)))
+        for product in result.scalars().all():
+            products[product.id] = cache_product(product)
+
+    return products
 
 
 # Async function to get product by name
 async def get_product_by_name(session: AsyncSession, name: str) -> Product:
-    """Get a product by its name."""
+    """
+    Get a product by its name, normalized the same way as on creation.
+
+    The returned product is a cached copy that is not attached to the session.
+    """
+    name = name.title()
+    product = product_cache.get(("name", name))
+    if product is not None:
+        return product
+
     statement = select(Product).where(Product.name == name)
     result = await session.execute(statement)
-    return result.scalar_one_or_none()
+    product = result.scalars().first()
+    return cache_product(product) if product else None
+
+
+async def update_dishes_containing(
+    session: AsyncSession,
+    product_id: int,
+    calories_delta_per_100g: float,
+    nutrient_deltas_per_100g: Optional[Dict[str, float]] = None,
+    ancestors: FrozenSet[int] = frozenset(),
+) -> List[Product]:
+    """
+    Applies a change of an ingredient's nutrients to every dish containing it.
+
+    Each dish keeps its total calories, so only the changed ingredient is
+    accounted for instead of summing all ingredients again. The other
+    nutrients per 100g of the dish change by the ingredient's share of the
+    dish weight. Dishes used as ingredients of other dishes are updated
+    recursively.
+
+    :param nutrient_deltas_per_100g: Changes of the nutrients besides
+        calories, keyed by column name.
+    :param ancestors: Products whose change led to this one. Dishes among
+        them are skipped, so dishes containing each other can't recurse
+        forever.
+    :return: Dish products whose nutrients per 100g changed.
+    """
+    ancestors = ancestors | {product_id}
+    result = await session.execute(
+        select(Dish, DishIngredient.weight)
+        .join(DishIngredient, DishIngredient.dish_id == Dish.id)
+        .where(DishIngredient.product_id == product_id)
+    )
+
+    changed = []
+    for dish, weight in result.all():
+        if dish.product_id in ancestors:
+            continue
+        dish.total_calories += calories_for(weight, calories_delta_per_100g)
+        dish_product = await session.get(Product, dish.product_id)
+        if not dish_product:
+            continue
+        new_calories = round(dish.total_calories / dish.total_weight * 100)
+        change = new_calories - dish_product.calories_per_100g
+        dish_deltas = {
+            column: delta * weight / dish.total_weight
+            for column, delta in (nutrient_deltas_per_100g or {}).items()
+            if delta
+        }
+        if not change and not dish_deltas:
+            continue
+
+        if change:
+            await adjust_daily_totals_for_product(session, dish_product.id, change)
+        dish_product.calories_per_100g = new_calories
+        for column, delta in dish_deltas.items():
+            setattr(
+                dish_product, column, round(getattr(dish_product, column) + delta, 2)
+            )
+        dish_product.updated = datetime.now(timezone.utc)
+        changed.append(dish_product)
+        changed.extend(
+            await update_dishes_containing(
+                session, dish_product.id, change, dish_deltas, ancestors
+            )
+        )
+
+    return changed
 
 
 # Asynchronous function for updating a product
@@ -66,55 +400,122 @@ async def update_product(
     category: str,
     calories_per_100g: int,
     image_file: Optional[UploadFile] = None,
+    nutrients: Optional[Dict[str, float]] = None,
 ) -> Optional[Product]:
-    """Update an existing product's information."""
+    """
+    Update an existing product's information.
+
+    :param nutrients: New grams of protein, fat, carbohydrates or fibre per
+        100g, keyed by column name. Missing ones are kept.
+    """
     product = await session.get(Product, product_id)
     if product:
+        old_name = product.name
+
+        # Logged days and dishes are recalculated when the nutrients change
+        calories_delta = calories_per_100g - product.calories_per_100g
+        nutrient_deltas = {
+            column: value - getattr(product, column)
+            for column, value in (nutrients or {}).items()
+            if value != getattr(product, column)
+        }
+        if calories_delta:
+            await adjust_daily_totals_for_product(session, product_id, calories_delta)
+        changed_dishes = []
+        if calories_delta or nutrient_deltas:
+            changed_dishes = await update_dishes_containing(
+                session, product_id, calories_delta, nutrient_deltas
+            )
+
         # Updating product master data
         product.name = name.title()
         product.category = category.title()
         product.calories_per_100g = calories_per_100g
+        for column, value in (nutrients or {}).items():
+            setattr(product, column, value)
+        product.updated = datetime.now(timezone.utc)
 
         # If the image is not transferred, do not change the image_url
+        old_image_url = product.image_url
         if image_file:
-            old_file_name = None
-            if product.image_url:
-                # Extracting the old file name from the URL
-                old_file_name = product.image_url.split("/")[-1]
+            product.image_url = await save_file(image_file)
 
-            # Use the function to update the image
-            new_image_url = await update_file(image_file, old_file_name)
-            product.image_url = new_image_url
+        # The old image is removed once no product uses it
+        if old_image_url != product.image_url:
+            await release_file(session, old_image_url)
 
+        publish_product_change(session, product_id, old_name, product.name)
+        for dish_product in changed_dishes:
+            publish_product_change(session, dish_product.id, dish_product.name)
         await session.commit()
+        invalidate_product(product_id, old_name, product.name)
+        for dish_product in changed_dishes:
+            invalidate_product(dish_product.id, dish_product.name)
+            index_product(dish_product)
+        bump_catalog_version()
         await session.refresh(product)
+        index_product(product)
 
     return product
 
 
 async def delete_product(session: AsyncSession, product_id: int) -> None:
     """
-    Deletes a product and its associated file (if exists).
+    Deletes a product and its associated file (if no other product uses it).
+
+    Deleting the product of a dish deletes the dish and its ingredient list as
+    well.
 
     :param session: Database session.
     :param product_id: ID of the product to delete.
-    :raises HTTPException: If the product does not exist.
+    :raises HTTPException: If the product does not exist (404), or is an
+        ingredient of a dish or logged in a record (409).
     """
     # Geting the product from the database
     product = await session.get(Product, product_id)
     if not product:
         raise HTTPException(status_code=404, detail="Product not found.")
 
-    # Delete the linked file if it exists
-    if product.image_url:
-        try:
-            await delete_file(
-                product.image_url.split("/")[-1]
-            )  # Extracting file name from URL
-        except HTTPException as e:
-            # If the file is not found, we simply log the error, but do not interrupt the process.
-            print(f"Error deleting file: {e.detail}")
-
-    # Removing a product from the database
+    # Dishes would lose an ingredient they were computed from
+    result = await session.execute(
+        select(DishIngredient.dish_id).where(DishIngredient.product_id == product_id)
+    )
+    dish_ids = result.scalars().all()
+    if dish_ids:
+        raise HTTPException(
+            status_code=409,
+            detail=(
+                "Product is an ingredient of dishes: "
+                f"{', '.join(map(str, sorted(dish_ids)))}"
+            ),
+        )
+
+    # Records keep their products, so logged products stay in the catalog
+    logged = await session.scalar(
+        select(RecordProduct.records_id)
+        .where(RecordProduct.product_id == product_id)
+        .limit(1)
+    )
+    if logged is not None:
+        raise HTTPException(
+            status_code=409, detail="Product is logged in records and can't be deleted"
+        )
+
+    dish_id = await session.scalar(select(Dish.id).where(Dish.product_id == product_id))
+    if dish_id is not None:
+        await session.execute(
+            delete(DishIngredient).where(DishIngredient.dish_id == dish_id)
+        )
+        await session.execute(delete(Dish).where(Dish.id == dish_id))
+
+    # Removing a product from the database, leaving a tombstone for delta sync
     await session.delete(product)
+    session.add(Tombstone(entity="product", entity_id=product_id))
+    # The linked file is deleted later if this was the last reference
+    await release_file(session, product.image_url)
+    publish_product_change(session, product_id, product.name)
     await session.commit()
+
+    invalidate_product(product_id, product.name)
+    product_search_index.remove(product_id)
+    bump_catalog_version()
@@ -0,0 +1,330 @@
+import csv
+import io
+import itertools
+import math
+import os
+import time
+from datetime import datetime, timezone
+from typing import IO, Callable, Dict, Iterator, List, Optional, Tuple
+import orjson
+from sqlalchemy import insert, update
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlmodel import select
+from starlette.concurrency import run_in_threadpool
+from models.dish_ingredient import DishIngredient
+from models.product import Product
+from models.record_product import RecordProduct
+from nutrition import NUTRIENT_COLUMNS
+from invalidation_bus import invalidation_bus
+from controllers.daily_total_controller import adjust_daily_totals_for_product
+from controllers.product_controller import reload_catalog, update_dishes_containing
+
+# Number of rows validated and written per transaction
+IMPORT_BATCH_SIZE = int(os.getenv("IMPORT_BATCH_SIZE", "5000"))
+
+# Highest plausible energy density; pure fat has about 900 kcal per 100g
+MAX_CALORIES_PER_100G = 1000
+
+# Longest accepted product name or category
+MAX_NAME_LENGTH = 255
+
+# Grams of a nutrient per 100g can be at most 100
+MAX_GRAMS_PER_100G = 100
+
+# Optional nutrient columns besides calories
+MACRONUTRIENT_COLUMNS = NUTRIENT_COLUMNS[1:]
+
+# Columns written for imported products, in COPY order
+IMPORT_COLUMNS = (
+    "name",
+    "category",
+    "calories_per_100g",
+    *MACRONUTRIENT_COLUMNS,
+    "updated",
+)
+
+# (line number, raw row) as read from the file; the row is an `UnparsedLine`
+# if it could not be parsed
+ImportRow = Tuple[int, object]
+
+# Called with the line number, raw row and reason of a rejected row
+RejectHandler = Callable[[int, object, str], None]
+
+
+class UnparsedLine(str):
+    """A line of the file that is not valid JSON, with the parser's message."""
+
+    def __new__(cls, line: str, error: str):
+        unparsed = super().__new__(cls, line)
+        unparsed.error = error
+        return unparsed
+
+
+class ImportStats:
+    """Progress counters of one catalog import."""
+
+    def __init__(self):
+        self.started = time.perf_counter()
+        self.read = 0
+        self.inserted = 0
+        self.updated = 0
+        self.unchanged = 0
+        self.duplicates = 0
+        self.rejected = 0
+
+    def as_dict(self) -> dict:
+        elapsed = time.perf_counter() - self.started
+        return {
+            "read": self.read,
+            "inserted": self.inserted,
+            "updated": self.updated,
+            "unchanged": self.unchanged,
+            "duplicates": self.duplicates,
+            "rejected": self.rejected,
+            "seconds": round(elapsed, 2),
+            "rows_per_second": round(self.read / elapsed) if elapsed else None,
+        }
+
+
+def detect_format(file_name: Optional[str]) -> str:
+    """Guesses the import format from a file name, defaulting to CSV."""
+    if file_name and file_name.lower().endswith((".jsonl", ".ndjson")):
+        return "jsonl"
+    return "csv"
+
+
+def read_rows(file: IO[bytes], import_format: str) -> Iterator[ImportRow]:
+    """
+    Parses a CSV file with a header line, or a JSONL file with one object per
+    line, one row at a time.
+    """
+    text = io.TextIOWrapper(file, encoding="utf-8-sig", newline="")
+    if import_format == "csv":
+        reader = csv.DictReader(text)
+        for row in reader:
+            yield reader.line_num, row
+        return
+
+    for line_number, line in enumerate(text, 1):
+        if not line.strip():
+            continue
+        try:
+            yield line_number, orjson.loads(line)
+        except orjson.JSONDecodeError as e:
+            yield line_number, UnparsedLine(line.rstrip("\r\n"), str(e))
+
+
+def to_number(value: object) -> float:
+    """
+    Converts a number or numeric string to a float.
+
+    :raises TypeError: For booleans, which JSON rows can contain.
+    """
+    if isinstance(value, bool):
+        raise TypeError("Booleans are not numbers")
+    return float(value)
+
+
+def normalize_product(row: object) -> dict:
+    """
+    Validates an imported row and normalizes it like `create_product`.
+
+    :raises ValueError: If the row is not a valid product.
+    """
+    if isinstance(row, UnparsedLine):
+        raise ValueError(f"Invalid JSON: {row.error}")
+    if not isinstance(row, dict):
+        raise ValueError("Row is not an object")
+
+    values = {}
+    for field in ("name", "category"):
+        value = row.get(field)
+        if not isinstance(value, str) or not value.strip():
+            raise ValueError(f"{field} is required")
+        value = " ".join(value.split()).title()
+        if len(value) > MAX_NAME_LENGTH:
+            raise ValueError(f"{field} is longer than {MAX_NAME_LENGTH} characters")
+        values[field] = value
+
+    calories = row.get("calories_per_100g")
+    try:
+        calories = to_number(calories)
+    except (TypeError, ValueError):
+        raise ValueError("calories_per_100g must be a number")
+    if not math.isfinite(calories) or not 0 <= calories <= MAX_CALORIES_PER_100G:
+        raise ValueError(
+            f"calories_per_100g must be between 0 and {MAX_CALORIES_PER_100G}"
+        )
+    values["calories_per_100g"] = round(calories)
+
+    # Nutrients missing from the row are left out, so they are not overwritten
+    for column in MACRONUTRIENT_COLUMNS:
+        grams = row.get(column)
+        if grams is None or grams == "":
+            continue
+        try:
+            grams = to_number(grams)
+        except (TypeError, ValueError):
+            raise ValueError(f"{column} must be a number")
+        if not math.isfinite(grams) or not 0 <= grams <= MAX_GRAMS_PER_100G:
+            raise ValueError(f"{column} must be between 0 and {MAX_GRAMS_PER_100G}")
+        values[column] = round(grams, 2)
+    return values
+
+
+async def insert_products(session: AsyncSession, products: List[dict]) -> None:
+    """
+    Inserts new products with COPY on PostgreSQL (asyncpg) and a multi-row
+    executemany elsewhere.
+    """
+    if session.bind.dialect.driver == "asyncpg":
+        connection = await session.connection()
+        raw_connection = await connection.get_raw_connection()
+        await raw_connection.driver_connection.copy_records_to_table(
+            Product.__tablename__,
+            records=[
+                tuple(product[column] for column in IMPORT_COLUMNS)
+                for product in products
+            ],
+            columns=IMPORT_COLUMNS,
+        )
+        return
+    await session.execute(insert(Product), products)
+
+
+async def upsert_products(
+    session: AsyncSession, products: List[dict], stats: ImportStats
+) -> None:
+    """
+    Inserts products with new names and updates the category and nutrients of
+    products with existing names, within the current transaction.
+
+    Days and dishes that contain a product whose nutrients changed are
+    recalculated, as by `update_product`.
+    """
+    result = await session.execute(
+        select(
+            Product.id,
+            Product.name,
+            Product.category,
+            *(getattr(Product, column) for column in NUTRIENT_COLUMNS),
+        ).where(Product.name.in_([product["name"] for product in products]))
+    )
+    existing: Dict[str, list] = {}
+    for row in result.mappings().all():
+        existing.setdefault(row["name"], []).append(row)
+
+    now = datetime.now(timezone.utc).replace(tzinfo=None)
+    defaults = {column: 0 for column in MACRONUTRIENT_COLUMNS}
+    inserts, updates, nutrient_changes = [], [], []
+    for product in products:
+        rows = existing.get(product["name"])
+        if not rows:
+            inserts.append({**defaults, **product, "updated": now})
+            continue
+        changed = False
+        for row in rows:
+            values = {
+                column: value
+                for column, value in product.items()
+                if column != "name" and value != row[column]
+            }
+            if not values:
+                continue
+            changed = True
+            updates.append({**values, "id": row["id"], "updated": now})
+            deltas = {
+                column: values[column] - row[column]
+                for column in NUTRIENT_COLUMNS
+                if column in values
+            }
+            if deltas:
+                nutrient_changes.append((row["id"], deltas))
+        if changed:
+            stats.updated += 1
+        else:
+            stats.unchanged += 1
+
+    if inserts:
+        await insert_products(session, inserts)
+        stats.inserted += len(inserts)
+    if updates:
+        # Bulk UPDATE by primary key, sent as one executemany per set of columns
+        await session.execute(update(Product), updates)
+    if not nutrient_changes:
+        return
+
+    # Only products that were logged or are dish ingredients need recalculation
+    changed_ids = [product_id for product_id, _ in nutrient_changes]
+    result = await session.execute(
+        select(RecordProduct.product_id)
+        .where(RecordProduct.product_id.in_(changed_ids))
+        .union(
+            select(DishIngredient.product_id).where(
+                DishIngredient.product_id.in_(changed_ids)
+            )
+        )
+    )
+    used_ids = set(result.scalars().all())
+    for product_id, deltas in nutrient_changes:
+        if product_id not in used_ids:
+            continue
+        calories_delta = deltas.pop("calories_per_100g", 0)
+        if calories_delta:
+            await adjust_daily_totals_for_product(session, product_id, calories_delta)
+        await update_dishes_containing(session, product_id, calories_delta, deltas)
+
+
+async def import_products(
+    session: AsyncSession,
+    rows: Iterator[ImportRow],
+    batch_size: int = IMPORT_BATCH_SIZE,
+    on_reject: Optional[RejectHandler] = None,
+    on_progress: Optional[Callable[[ImportStats], None]] = None,
+) -> ImportStats:
+    """
+    Upserts products by name from parsed rows, committing every `batch_size`
+    rows.
+
+    Rows are read in a worker thread, so parsing does not block the event
+    loop. A name repeated within a batch keeps its last row. Invalid rows are
+    passed to `on_reject`, and `on_progress` is called after every batch. Once
+    done, or if reading fails, every worker reloads its product cache and
+    search index.
+    """
+    stats = ImportStats()
+    try:
+        while True:
+            batch = await run_in_threadpool(
+                lambda: list(itertools.islice(rows, batch_size))
+            )
+            if not batch:
+                break
+
+            products: Dict[str, dict] = {}
+            for line_number, row in batch:
+                stats.read += 1
+                try:
+                    product = normalize_product(row)
+                except ValueError as e:
+                    stats.rejected += 1
+                    if on_reject:
+                        on_reject(line_number, row, str(e))
+                    continue
+                if product["name"] in products:
+                    stats.duplicates += 1
+                products[product["name"]] = product
+
+            if products:
+                await upsert_products(session, list(products.values()), stats)
+            await session.commit()
+            if on_progress:
+                on_progress(stats)
+    finally:
+        # Batches committed before a failure are imported as well
+        await session.rollback()
+        if stats.inserted or stats.updated:
+            invalidation_bus.publish(session, "catalog", "import")
+            await session.commit()
+            await reload_catalog([])
+    return stats
@@ -1,16 +1,49 @@
-from datetime import datetime, timezone
-from typing import List
+import csv
+import io
+from datetime import date, datetime, timezone
+from typing import AsyncIterator, Dict, List, Optional
+from zoneinfo import ZoneInfo
+import orjson
 from fastapi import HTTPException, Depends
+from sqlalchemy import delete, func
 from sqlalchemy.ext.asyncio import AsyncSession
 from sqlalchemy.future import select
 from sqlalchemy.orm import joinedload
 from models.record import Record
 from models.record_product import RecordProduct
 from models.product import Product
-from db import get_session
+from models.tombstone import Tombstone
+from db import AsyncSessionLocal, get_session
 from controllers.user_controller import get_current_username
+from controllers.daily_total_controller import (
+    apply_daily_total,
+    apply_daily_totals,
+    calories_for,
+    get_calories_per_100g,
+)
 from models.user import User
-from schemas.record import RecordCreate, RecordUpdate
+from schemas.record import RecordBatchCreate, RecordCreate, RecordUpdate
+from periods import get_day_bounds, get_local_day
+from record_events import record_events
+
+# Maximum number of days returned by one date-range request
+MAX_RANGE_DAYS = 366
+
+# Columns of the diary export, in order
+EXPORT_COLUMNS = (
+    "date",
+    "time",
+    "record_id",
+    "product_id",
+    "product",
+    "category",
+    "weight",
+    "calories_per_100g",
+    "calories",
+)
+
+# Number of rows fetched from the database and written out at a time
+EXPORT_BATCH_SIZE = 1000
 
 
 # Create a new record
@@ -22,25 +55,96 @@ async def create_record(
     product_id = record_data.product_id
     weight = record_data.weight
 
-    # Check if the product exists
-    result = await session.execute(select(Product).filter(Product.id == product_id))
-    product = result.scalar_one_or_none()
+    # Check if the product exists, reading the calories the day's total needs
+    calories_per_100g = await get_calories_per_100g(session, [product_id])
 
-    if not product:
+    if product_id not in calories_per_100g:
         raise HTTPException(status_code=404, detail="Product not found")
 
-    # Create the new record
-    record = Record(user_id=user.id)
+    # Create the record with its product. Both rows are inserted by the flush
+    # on commit, which gets the record ID back (with RETURNING where supported),
+    # so one commit is enough and no refresh is needed.
+    record = Record(
+        user_id=user.id,
+        client_id=record_data.client_id,
+        products=[RecordProduct(product_id=product_id, weight=weight)],
+    )
     session.add(record)
+    await apply_daily_total(
+        session,
+        user,
+        record.created,
+        calories_for(weight, calories_per_100g[product_id]),
+        weight,
+        1,
+    )
+    # The record ID is needed for the change event
+    await session.flush()
+    event = record_events.publish(
+        session,
+        "created",
+        user.id,
+        record.id,
+        get_local_day(record.created, ZoneInfo(user.timezone)),
+    )
     await session.commit()
-    await session.refresh(record)
+    await record_events.deliver([event])
+
+    return record
 
-    # Add product to RecordProduct
-    record_product = RecordProduct(
-        records_id=record.id, product_id=product.id, weight=weight
+
+# Create a record with several products
+async def create_records_batch(
+    batch: RecordBatchCreate, user: User, session: AsyncSession
+) -> Record:
+    """
+    Create one record holding every product of a meal in a single transaction.
+
+    All product IDs are validated with one query. The same product listed more
+    than once is stored as one entry with the weights added up.
+    """
+    weights: Dict[int, int] = {}
+    for item in batch.items:
+        weights[item.product_id] = weights.get(item.product_id, 0) + item.weight
+
+    calories_per_100g = await get_calories_per_100g(session, weights)
+    missing = sorted(set(weights) - set(calories_per_100g))
+    if missing:
+        raise HTTPException(
+            status_code=404,
+            detail=f"Products not found: {', '.join(map(str, missing))}",
+        )
+
+    # The record and its products are inserted together on commit
+    record = Record(
+        user_id=user.id,
+        products=[
+            RecordProduct(product_id=product_id, weight=weight)
+            for product_id, weight in weights.items()
+        ],
+    )
+    session.add(record)
+    await apply_daily_total(
+        session,
+        user,
+        record.created,
+        sum(
+            calories_for(weight, calories_per_100g[product_id])
+            for product_id, weight in weights.items()
+        ),
+        sum(weights.values()),
+        len(weights),
+    )
+    await session.flush()
+    event = record_events.publish(
+        session,
+        "created",
+        user.id,
+        record.id,
+        get_local_day(record.created, ZoneInfo(user.timezone)),
     )
-    session.add(record_product)
     await session.commit()
+    await record_events.deliver([event])
 
     return record
 
@@ -77,29 +181,31 @@ async def get_record_by_id(record_id: int, user: User, session: AsyncSession):
     return record
 
 
-async def get_records_by_date(
-    date: str, session: AsyncSession, user_id: int
-) -> List[dict]:
+async def get_records_between(
+    session: AsyncSession, user_id: int, start: datetime, end: datetime
+) -> List[Record]:
     """
-    Fetch all records for the authenticated user by date.
+    Fetch the user's records created in [start, end) with their products.
+
+    The range condition is served by the (user_id, created) index.
     """
-    # We execute a query to get all records for a specific date
     result = await session.execute(
         select(Record)
         .options(
             joinedload(Record.products).joinedload(RecordProduct.product)
         )  # Loading products and their information
         .filter(Record.user_id == user_id)
-        .filter(Record.created.like(f"{date}%"))  # Filter by date
+        .filter(Record.created >= start, Record.created < end)
+        .order_by(Record.created)
     )
+    return result.unique().scalars().all()
 
-    records = result.unique().scalars().all()
-
-    if not records:
-        raise HTTPException(status_code=404, detail="No records found for this date")
 
-    # We form a list of dictionaries with the necessary information
-    records_list = [
+def records_to_rows(records: List[Record]) -> List[dict]:
+    """
+    Flattens records into one dictionary per record product.
+    """
+    return [
         {
             "product_id": product.product.id,
             "name": product.product.name,
@@ -112,7 +218,160 @@ async def get_records_by_date(
         for product in record.products
     ]
 
-    return records_list
+
+async def get_records_by_date(
+    date: str, session: AsyncSession, user_id: int, tz: str = "UTC"
+) -> List[dict]:
+    """
+    Fetch all records for the authenticated user by date.
+
+    The day starts and ends at midnight in the time zone `tz`.
+    """
+    try:
+        day = datetime.strptime(date, "%Y-%m-%d").date()
+    except ValueError:
+        raise HTTPException(status_code=400, detail="Date must be YYYY-MM-DD")
+
+    # We execute a query to get all records for a specific date
+    start, end = get_day_bounds(day, ZoneInfo(tz))
+    records = await get_records_between(session, user_id, start, end)
+
+    if not records:
+        raise HTTPException(status_code=404, detail="No records found for this date")
+
+    # We form a list of dictionaries with the necessary information
+    return records_to_rows(records)
+
+
+async def get_records_by_range(
+    date_from: date, date_to: date, session: AsyncSession, user: User
+) -> Dict[str, List[dict]]:
+    """
+    Fetch the user's records for every day from `date_from` to `date_to` inclusive.
+
+    Records are grouped by the day they were created on in the user's time zone.
+    Days without records are omitted.
+    """
+    if date_to < date_from:
+        raise HTTPException(status_code=400, detail="'to' must not be before 'from'")
+    if (date_to - date_from).days >= MAX_RANGE_DAYS:
+        raise HTTPException(
+            status_code=400, detail=f"Range must not exceed {MAX_RANGE_DAYS} days"
+        )
+
+    tz = ZoneInfo(user.timezone)
+    start, _ = get_day_bounds(date_from, tz)
+    _, end = get_day_bounds(date_to, tz)
+    records = await get_records_between(session, user.id, start, end)
+
+    records_by_day: Dict[str, List[dict]] = {}
+    for record in records:
+        day = get_local_day(record.created, tz)
+        records_by_day.setdefault(day.isoformat(), []).extend(records_to_rows([record]))
+
+    return records_by_day
+
+
+def validate_export_range(date_from: Optional[date], date_to: Optional[date]) -> None:
+    """
+    Checks the optional date range of an export.
+
+    :raises HTTPException: If `date_to` is before `date_from`.
+    """
+    if date_from and date_to and date_to < date_from:
+        raise HTTPException(status_code=400, detail="'to' must not be before 'from'")
+
+
+async def stream_diary_rows(
+    user: User, date_from: Optional[date] = None, date_to: Optional[date] = None
+) -> AsyncIterator[List[dict]]:
+    """
+    Yields the user's diary oldest first, in batches of rows.
+
+    The rows are read through a server-side cursor and are not kept, so memory
+    use does not grow with the length of the history. The export has its own
+    session, because the response is still streaming after the request's
+    session has been closed.
+
+    :param date_from: First day in the user's time zone, or None for no limit.
+    :param date_to: Last day in the user's time zone, or None for no limit.
+    """
+    tz = ZoneInfo(user.timezone)
+    statement = (
+        select(
+            Record.id,
+            Record.created,
+            Product.id,
+            Product.name,
+            Product.category,
+            Product.calories_per_100g,
+            RecordProduct.weight,
+        )
+        .join(RecordProduct, RecordProduct.records_id == Record.id)
+        .join(Product, Product.id == RecordProduct.product_id)
+        .where(Record.user_id == user.id)
+        .order_by(Record.created, Record.id, Product.id)
+        .execution_options(yield_per=EXPORT_BATCH_SIZE)
+    )
+    if date_from:
+        statement = statement.where(Record.created >= get_day_bounds(date_from, tz)[0])
+    if date_to:
+        statement = statement.where(Record.created < get_day_bounds(date_to, tz)[1])
+
+    async with AsyncSessionLocal() as session:
+        result = await session.stream(statement)
+        async for partition in result.partitions():
+            rows = []
+            for (
+                record_id,
+                created,
+                product_id,
+                name,
+                category,
+                calories_per_100g,
+                weight,
+            ) in partition:
+                local_time = created.replace(tzinfo=timezone.utc).astimezone(tz)
+                rows.append(
+                    {
+                        "date": local_time.date().isoformat(),
+                        "time": local_time.time().isoformat("seconds"),
+                        "record_id": record_id,
+                        "product_id": product_id,
+                        "product": name,
+                        "category": category,
+                        "weight": weight,
+                        "calories_per_100g": calories_per_100g,
+                        "calories": round(calories_for(weight, calories_per_100g), 2),
+                    }
+                )
+            yield rows
+
+
+async def export_diary(
+    user: User,
+    export_format: str,
+    date_from: Optional[date] = None,
+    date_to: Optional[date] = None,
+) -> AsyncIterator[bytes]:
+    """
+    Yields the user's diary as CSV with a header line, or as NDJSON.
+
+    :param export_format: "csv" or "ndjson".
+    """
+    if export_format == "csv":
+        buffer = io.StringIO()
+        writer = csv.DictWriter(buffer, fieldnames=EXPORT_COLUMNS)
+        writer.writeheader()
+        yield buffer.getvalue().encode()
+        async for rows in stream_diary_rows(user, date_from, date_to):
+            buffer.seek(0)
+            buffer.truncate()
+            writer.writerows(rows)
+            yield buffer.getvalue().encode()
+    else:
+        async for rows in stream_diary_rows(user, date_from, date_to):
+            yield b"".join(orjson.dumps(row) + b"\n" for row in rows)
 
 
 # Update a record
@@ -124,38 +383,71 @@ async def update_record(
 
     If the user wants to update the quantity of a product, the weight will be updated.
     If the user wants to change the product, the product ID will be updated.
+    A record with several products only allows changing the weight of one of them.
     """
-    # Fetch the record and check if it exists
-    stmt = select(Record).where(Record.id == record_id, Record.user_id == user.id)
-    result = await session.execute(stmt)
-    record = result.scalar_one_or_none()
+    # Fetch the record together with its products in one query
+    result = await session.execute(
+        select(Record)
+        .options(joinedload(Record.products))
+        .where(Record.id == record_id, Record.user_id == user.id)
+    )
+    record = result.unique().scalar_one_or_none()
 
     if not record:
         raise HTTPException(status_code=404, detail="Record not found")
 
-    # Check if the product exists
-    stmt_product = select(Product).where(Product.id == record_data.product_id)
-    result_product = await session.execute(stmt_product)
-    product = result_product.scalar_one_or_none()
-
-    if not product:
-        raise HTTPException(status_code=404, detail="Product not found")
-
     # Check if we are updating product or just weight
-    record_product = await session.execute(
-        select(RecordProduct).where(RecordProduct.records_id == record_id)
+    record_product = next(
+        (rp for rp in record.products if rp.product_id == record_data.product_id),
+        None,
     )
-    record_product = record_product.scalar_one_or_none()
+    if record_product is None and len(record.products) > 1:
+        raise HTTPException(
+            status_code=400,
+            detail="The product of a record with several products can't be changed",
+        )
+    if record_product is None and record.products:
+        record_product = record.products[0]
+
+    # Check if the product exists (old and new products in one lookup)
+    product_ids = [record_data.product_id]
+    if record_product:
+        product_ids.append(record_product.product_id)
+    calories_per_100g = await get_calories_per_100g(session, product_ids)
+
+    if record_data.product_id not in calories_per_100g:
+        raise HTTPException(status_code=404, detail="Product not found")
 
     # Update product or weight
     if record_product:
+        old_calories = calories_for(
+            record_product.weight,
+            calories_per_100g.get(record_product.product_id, 0),
+        )
+        await apply_daily_total(
+            session,
+            user,
+            record.created,
+            calories_for(record_data.weight, calories_per_100g[record_data.product_id])
+            - old_calories,
+            record_data.weight - record_product.weight,
+            0,
+        )
+
         record_product.product_id = record_data.product_id
         record_product.weight = record_data.weight
 
     record.updated = datetime.now(timezone.utc)
 
+    event = record_events.publish(
+        session,
+        "updated",
+        user.id,
+        record.id,
+        get_local_day(record.created, ZoneInfo(user.timezone)),
+    )
     await session.commit()
-    await session.refresh(record)
+    await record_events.deliver([event])
 
     return record
 
@@ -166,30 +458,70 @@ async def delete_record(
     user: User,
     session: AsyncSession,
 ):
-    # Find the record
-    result = await session.execute(
-        select(Record).filter(Record.id == record_id, Record.user_id == user.id)
+    owned_record = select(Record.id).where(
+        Record.id == record_id, Record.user_id == user.id
+    )
+    # The calories to subtract are read with the deleted rows, from the same
+    # product values the daily totals are rebuilt from
+    calories_per_100g = func.coalesce(
+        select(Product.calories_per_100g)
+        .where(Product.id == RecordProduct.product_id)
+        .scalar_subquery(),
+        0,
     )
-    record = result.scalar_one_or_none()
 
-    if not record:
+    if session.bind.dialect.delete_returning:
+        # Delete the products and the record without selecting them first
+        result = await session.execute(
+            delete(RecordProduct)
+            .where(RecordProduct.records_id.in_(owned_record))
+            .returning(RecordProduct.weight, calories_per_100g)
+        )
+        deleted_products = result.all()
+        result = await session.execute(
+            delete(Record)
+            .where(Record.id == record_id, Record.user_id == user.id)
+            .returning(Record.created)
+        )
+        created = result.scalar_one_or_none()
+    else:
+        created = await session.scalar(
+            select(Record.created).where(
+                Record.id == record_id, Record.user_id == user.id
+            )
+        )
+        result = await session.execute(
+            select(RecordProduct.weight, calories_per_100g).where(
+                RecordProduct.records_id == record_id
+            )
+        )
+        deleted_products = result.all() if created else []
+        await session.execute(
+            delete(RecordProduct).where(RecordProduct.records_id == record_id)
+        )
+        await session.execute(delete(Record).where(Record.id == record_id))
+
+    if created is None:
+        await session.rollback()
         raise HTTPException(status_code=404, detail="Record not found")
 
-    # Delete associated products
-    # Correct query to select the associated RecordProduct entries
-    result = await session.execute(
-        select(RecordProduct).filter(RecordProduct.records_id == record_id)
+    # Clients syncing changes learn about the deletion from the tombstone
+    session.add(Tombstone(entity="record", entity_id=record_id, user_id=user.id))
+
+    # Subtract the deleted products from the day's totals
+    day = get_local_day(created, ZoneInfo(user.timezone))
+    await apply_daily_totals(
+        session,
+        [
+            (user.id, day, -calories_for(weight, calories), -weight, -1)
+            for weight, calories in deleted_products
+        ],
     )
-    products_to_delete = result.scalars().all()
-
-    # Delete each associated product
-    for product in products_to_delete:
-        await session.delete(product)
 
-    # Delete the record itself
-    await session.delete(record)
+    event = record_events.publish(session, "deleted", user.id, record_id, day)
 
     # Commit the transaction
     await session.commit()
+    await record_events.deliver([event])
 
     return {"message": "Record deleted successfully"}
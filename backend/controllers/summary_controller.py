@@ -0,0 +1,67 @@
+from datetime import date
+from typing import List
+from fastapi import HTTPException
+from sqlalchemy import func
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy.future import select
+from models.daily_total import DailyTotal
+from models.user import User
+from periods import GRANULARITIES, truncate_to_period
+
+# Maximum number of days covered by one summary request
+MAX_SUMMARY_DAYS = 3660
+
+
+async def get_calorie_summary(
+    date_from: date,
+    date_to: date,
+    granularity: str,
+    session: AsyncSession,
+    user: User,
+) -> List[dict]:
+    """
+    Computes calorie totals per day, week or month with one aggregate query.
+
+    Totals are read from the per-user daily rollup, so the cost depends on the
+    number of days rather than on the number of logged products. Periods follow
+    the user's time zone. Periods without records are omitted.
+    """
+    if granularity not in GRANULARITIES:
+        raise HTTPException(
+            status_code=400,
+            detail=f"Granularity must be one of: {', '.join(GRANULARITIES)}",
+        )
+    if date_to < date_from:
+        raise HTTPException(status_code=400, detail="'to' must not be before 'from'")
+    if (date_to - date_from).days >= MAX_SUMMARY_DAYS:
+        raise HTTPException(
+            status_code=400, detail=f"Range must not exceed {MAX_SUMMARY_DAYS} days"
+        )
+
+    period = truncate_to_period(
+        session.bind.dialect.name, granularity, DailyTotal.day
+    ).label("period")
+
+    result = await session.execute(
+        select(
+            period,
+            func.sum(DailyTotal.calories).label("calories"),
+            func.sum(DailyTotal.grams).label("grams"),
+            func.sum(DailyTotal.entries).label("entries"),
+        )
+        .filter(DailyTotal.user_id == user.id)
+        .filter(DailyTotal.day >= date_from, DailyTotal.day <= date_to)
+        .filter(DailyTotal.entries > 0)
+        .group_by(period)
+        .order_by(period)
+    )
+
+    return [
+        {
+            "period": str(row.period),
+            "calories": round(row.calories, 1),
+            "grams": row.grams,
+            "entries": row.entries,
+        }
+        for row in result.all()
+    ]
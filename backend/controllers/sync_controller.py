@@ -0,0 +1,358 @@
+import base64
+import binascii
+import os
+from datetime import datetime, timedelta, timezone
+from typing import List, Optional, Tuple
+import orjson
+from fastapi import HTTPException
+from sqlalchemy import and_, delete, exists, or_
+from sqlalchemy.exc import IntegrityError
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy.future import select
+from sqlalchemy.orm import selectinload
+from models.product import Product
+from models.record import Record
+from models.tombstone import Tombstone
+from models.user import User
+from schemas.record import RecordCreate, RecordUpdate
+from schemas.sync import SyncBatch, SyncOperation
+from controllers.record_controller import create_record, delete_record, update_record
+
+# Maximum number of records, products and deletions returned by one sync page
+MAX_SYNC_PAGE_SIZE = int(os.getenv("MAX_SYNC_PAGE_SIZE", "1000"))
+
+# Changes newer than this are sent again by the next sync, so a transaction
+# that committed late with an earlier timestamp is not skipped
+SYNC_OVERLAP = timedelta(seconds=float(os.getenv("SYNC_OVERLAP_SECONDS", "5")))
+
+# Tombstones are kept this long; clients that have not synced for longer
+# have to sync again from scratch
+TOMBSTONE_RETENTION = timedelta(days=float(os.getenv("TOMBSTONE_RETENTION_DAYS", "30")))
+
+# Position in a list of changes: update time and ID of the last change sent
+Position = Tuple[datetime, int]
+
+
+def encode_cursor(positions: dict) -> str:
+    """Packs the positions reached in every list of changes into a cursor."""
+    data = {
+        name: [timestamp.isoformat(), last_id]
+        for name, (timestamp, last_id) in positions.items()
+    }
+    return base64.urlsafe_b64encode(orjson.dumps(data)).decode().rstrip("=")
+
+
+def decode_cursor(cursor: Optional[str]) -> dict:
+    """
+    Unpacks a cursor returned by `get_changes`; no cursor means a full sync.
+
+    :raises HTTPException: If the cursor is malformed.
+    """
+    if not cursor:
+        return {}
+    try:
+        data = orjson.loads(base64.urlsafe_b64decode(cursor + "=" * (-len(cursor) % 4)))
+        if not isinstance(data, dict):
+            raise ValueError("Cursor is not an object")
+        positions = {}
+        for name, position in data.items():
+            if name not in ("records", "products", "deleted"):
+                continue
+            if not isinstance(position, list) or len(position) != 2:
+                raise ValueError(f"Invalid position of {name}")
+            timestamp, last_id = position
+            timestamp = datetime.fromisoformat(timestamp)
+            if timestamp.tzinfo is not None:
+                timestamp = timestamp.astimezone(timezone.utc).replace(tzinfo=None)
+            positions[name] = (timestamp, int(last_id))
+        return positions
+    except (binascii.Error, orjson.JSONDecodeError, TypeError, ValueError):
+        raise HTTPException(status_code=400, detail="Invalid sync cursor")
+
+
+def after(timestamp_column, id_column, position: Optional[Position]):
+    """Condition for the rows ordered after `position` by time and ID."""
+    if position is None:
+        return True
+    timestamp, last_id = position
+    return or_(
+        timestamp_column > timestamp,
+        and_(timestamp_column == timestamp, id_column > last_id),
+    )
+
+
+def next_position(
+    position: Optional[Position], last: Optional[Position], more: bool, horizon
+) -> Position:
+    """
+    Returns where the next sync continues a list of changes.
+
+    While there are more changes, it continues right after the last one sent.
+    Once the list is caught up, it continues at `horizon`, so recent changes
+    are sent again rather than missed.
+    """
+    if more:
+        return last or position
+    return horizon, 0
+
+
+def record_to_dict(record: Record) -> dict:
+    return {
+        "id": record.id,
+        "client_id": record.client_id,
+        "created": record.created,
+        "updated": record.updated,
+        "products": [
+            {"product_id": product.product_id, "weight": product.weight}
+            for product in record.products
+        ],
+    }
+
+
+def product_to_dict(product: Product) -> dict:
+    return {
+        "id": product.id,
+        "name": product.name,
+        "category": product.category,
+        "calories_per_100g": product.calories_per_100g,
+        "protein_per_100g": product.protein_per_100g,
+        "fat_per_100g": product.fat_per_100g,
+        "carbohydrates_per_100g": product.carbohydrates_per_100g,
+        "fibre_per_100g": product.fibre_per_100g,
+        "image_url": product.image_url,
+        "updated": product.updated,
+    }
+
+
+async def get_changes(
+    session: AsyncSession, user: User, cursor: Optional[str], limit: int
+) -> dict:
+    """
+    Returns the user's records, the products and the deletions of both changed
+    since `cursor`, at most `limit` of each, with the cursor to continue from.
+
+    Changes are read in (update time, ID) order through the update time
+    indexes. Deletions are taken from the tombstones; a deleted ID that is in
+    use again is sent as a change instead. A full sync sends no deletions
+    from before it started. Clients should apply deletions first and upsert
+    changes by ID, as changes near the cursor can be sent twice. If
+    `has_more` is set, the client should sync again right away.
+
+    :raises HTTPException: 400 if the cursor is malformed, 410 if it is older
+        than `TOMBSTONE_RETENTION`, so deletions may have been purged; the
+        client then has to sync again without a cursor.
+    """
+    positions = decode_cursor(cursor)
+    now = datetime.now(timezone.utc).replace(tzinfo=None)
+    horizon = now - SYNC_OVERLAP
+    # Deletions from before the client's data was fetched are of no interest
+    positions.setdefault("deleted", (horizon, 0))
+    if positions["deleted"][0] < now - TOMBSTONE_RETENTION:
+        raise HTTPException(
+            status_code=410, detail="Sync cursor expired, sync again without it"
+        )
+
+    result = await session.execute(
+        select(Record)
+        .options(selectinload(Record.products))
+        .where(Record.user_id == user.id)
+        .where(after(Record.updated, Record.id, positions.get("records")))
+        .order_by(Record.updated, Record.id)
+        .limit(limit + 1)
+    )
+    records = result.scalars().all()
+
+    result = await session.execute(
+        select(Product)
+        .where(after(Product.updated, Product.id, positions.get("products")))
+        .order_by(Product.updated, Product.id)
+        .limit(limit + 1)
+    )
+    products = result.scalars().all()
+
+    result = await session.execute(
+        select(Tombstone)
+        .where(
+            or_(
+                and_(
+                    Tombstone.user_id == user.id,
+                    Tombstone.entity == "record",
+                    ~exists().where(
+                        Record.id == Tombstone.entity_id, Record.user_id == user.id
+                    ),
+                ),
+                and_(
+                    Tombstone.user_id.is_(None),
+                    Tombstone.entity == "product",
+                    ~exists().where(Product.id == Tombstone.entity_id),
+                ),
+            )
+        )
+        .where(after(Tombstone.deleted, Tombstone.id, positions["deleted"]))
+        .order_by(Tombstone.deleted, Tombstone.id)
+        .limit(limit + 1)
+    )
+    tombstones = result.scalars().all()
+
+    more = {
+        "records": len(records) > limit,
+        "products": len(products) > limit,
+        "deleted": len(tombstones) > limit,
+    }
+    records, products, tombstones = (
+        records[:limit],
+        products[:limit],
+        tombstones[:limit],
+    )
+    last = {
+        "records": (records[-1].updated, records[-1].id) if records else None,
+        "products": (products[-1].updated, products[-1].id) if products else None,
+        "deleted": (
+            (tombstones[-1].deleted, tombstones[-1].id) if tombstones else None
+        ),
+    }
+
+    return {
+        "records": [record_to_dict(record) for record in records],
+        "products": [product_to_dict(product) for product in products],
+        "deleted": {
+            "records": [t.entity_id for t in tombstones if t.entity == "record"],
+            "products": [t.entity_id for t in tombstones if t.entity == "product"],
+        },
+        "cursor": encode_cursor(
+            {
+                name: next_position(
+                    positions.get(name), last[name], more[name], horizon
+                )
+                for name in more
+            }
+        ),
+        "has_more": any(more.values()),
+    }
+
+
+async def purge_tombstones(session: AsyncSession) -> int:
+    """
+    Deletes the tombstones older than `TOMBSTONE_RETENTION`.
+
+    :return: Number of tombstones deleted.
+    """
+    result = await session.execute(
+        delete(Tombstone).where(
+            Tombstone.deleted
+            < datetime.now(timezone.utc).replace(tzinfo=None) - TOMBSTONE_RETENTION
+        )
+    )
+    await session.commit()
+    return result.rowcount
+
+
+async def resolve_record_id(
+    session: AsyncSession, user: User, operation: SyncOperation
+) -> int:
+    """
+    Returns the ID of the record an update or delete refers to.
+
+    Records created offline are referred to by the client ID of their create
+    until the client has synced. Creates are committed one by one, so those
+    earlier in the same batch are found as well.
+
+    :raises HTTPException: If the operation names no record (422) or the
+        client ID is unknown (404).
+    """
+    if operation.record_id is not None:
+        return operation.record_id
+    if operation.client_id is None:
+        raise HTTPException(
+            status_code=422, detail="record_id or client_id is required"
+        )
+
+    record_id = await session.scalar(
+        select(Record.id).where(
+            Record.user_id == user.id, Record.client_id == operation.client_id
+        )
+    )
+    if record_id is None:
+        raise HTTPException(status_code=404, detail="Record not found")
+    return record_id
+
+
+async def apply_operation(
+    session: AsyncSession, user: User, operation: SyncOperation
+) -> Tuple[int, Optional[dict]]:
+    """
+    Applies one queued write with the same checks as the records API.
+
+    :return: HTTP status of the operation and the record it created or updated.
+    :raises HTTPException: If the operation is invalid or fails.
+    """
+    if operation.op == "delete_record":
+        record_id = await resolve_record_id(session, user, operation)
+        await delete_record(record_id, user, session)
+        return 200, None
+
+    if operation.product_id is None or operation.weight is None:
+        raise HTTPException(
+            status_code=422, detail="product_id and weight are required"
+        )
+
+    if operation.op == "update_record":
+        record = await update_record(
+            await resolve_record_id(session, user, operation),
+            RecordUpdate(product_id=operation.product_id, weight=operation.weight),
+            user,
+            session,
+        )
+        return 200, record_to_dict(record)
+
+    if operation.client_id is None:
+        raise HTTPException(status_code=422, detail="client_id is required")
+
+    # A create that was already applied returns the record it created
+    result = await session.execute(
+        select(Record)
+        .options(selectinload(Record.products))
+        .where(Record.user_id == user.id, Record.client_id == operation.client_id)
+    )
+    record = result.scalar_one_or_none()
+    if record:
+        return 200, record_to_dict(record)
+
+    record = await create_record(
+        RecordCreate(
+            product_id=operation.product_id,
+            weight=operation.weight,
+            client_id=operation.client_id,
+        ),
+        user,
+        session,
+    )
+    return 201, record_to_dict(record)
+
+
+async def apply_operations(
+    session: AsyncSession, user: User, batch: SyncBatch
+) -> List[dict]:
+    """
+    Applies queued offline writes in order, each in its own transaction.
+
+    A failing operation does not stop the others; every operation gets a
+    result with its status and the record or the error detail.
+    """
+    results = []
+    for index, operation in enumerate(batch.operations):
+        try:
+            status, record = await apply_operation(session, user, operation)
+            results.append({"index": index, "status": status, "record": record})
+        except HTTPException as e:
+            await session.rollback()
+            results.append(
+                {"index": index, "status": e.status_code, "detail": e.detail}
+            )
+        except IntegrityError:
+            # The same create was applied concurrently by another request
+            await session.rollback()
+            results.append(
+                {"index": index, "status": 409, "detail": "Conflicting operation"}
+            )
+    return results
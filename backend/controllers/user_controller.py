@@ -1,25 +1,77 @@
 import os
 import jwt
 from datetime import datetime, timezone, timedelta
-from fastapi import HTTPException, status, Depends
+from fastapi import HTTPException, Query, status, Depends
 from sqlalchemy.ext.asyncio import AsyncSession
 from passlib.context import CryptContext
 from sqlmodel import select
-from typing import Annotated
+from typing import Annotated, List, Optional
+from cache import LRUCache
+from password_hasher import PasswordHasher
 from db import get_session
+from invalidation_bus import invalidation_bus
 from models.user import User
+from controllers.daily_total_controller import rebuild_daily_totals
 from fastapi.security import OAuth2PasswordBearer
 
 # Initialize bcrypt for password hashing
 bcrypt_context = CryptContext(schemes=["bcrypt"], deprecated="auto")
 
+# bcrypt runs in a thread pool, so logins do not block the event loop
+password_hasher = PasswordHasher(
+    bcrypt_context,
+    max_workers=int(os.getenv("PASSWORD_HASH_WORKERS", "2")),
+    max_queue=int(os.getenv("PASSWORD_HASH_MAX_QUEUE", "64")),
+)
+
 # OAuth2 Password bearer configuration
 oauth2_scheme = OAuth2PasswordBearer(tokenUrl="api/v1/auth/token")
+optional_oauth2_scheme = OAuth2PasswordBearer(
+    tokenUrl="api/v1/auth/token", auto_error=False
+)
 
 # JWT secret key and algorithm for token generation
 SECRET_KEY = os.getenv("SECRET_KEY")
 ALGORITHM = os.getenv("ALGORITHM")
 
+# Stream tokens go into URLs, so they are only good for opening a stream and
+# expire quickly
+STREAM_TOKEN_SCOPE = "stream"
+STREAM_TOKEN_LIFETIME = timedelta(
+    seconds=float(os.getenv("STREAM_TOKEN_SECONDS", "60"))
+)
+
+# Short-lived cache of authenticated users, keyed by token claims
+user_cache = LRUCache(
+    maxsize=int(os.getenv("USER_CACHE_SIZE", "10000")),
+    ttl=float(os.getenv("USER_CACHE_TTL", "60")),
+)
+
+
+def invalidate_user(user_id: int, *usernames: str) -> None:
+    """Removes a user from the cache by its ID and (old and new) usernames."""
+    user_cache.invalidate(("uid", user_id), *(("sub", name) for name in usernames))
+
+
+def publish_user_change(session: AsyncSession, user_id: int, *usernames: str):
+    """Tells the other workers to drop a user from their caches on commit."""
+    invalidation_bus.publish(session, "user", user_id)
+    invalidation_bus.publish(session, "username", *usernames)
+
+
+async def forget_users(keys: List[str]) -> None:
+    """Drops users changed by another worker from the cache."""
+    user_cache.invalidate(*(("uid", int(key)) for key in keys))
+
+
+async def forget_usernames(keys: List[str]) -> None:
+    """Drops usernames changed by another worker from the cache."""
+    user_cache.invalidate(*(("sub", name) for name in keys))
+
+
+invalidation_bus.subscribe("user", forget_users)
+invalidation_bus.subscribe("username", forget_usernames)
+
 
 # Function to generate JWT token
 def create_access_token(data: dict, expires_delta: timedelta = timedelta(hours=24)):
@@ -34,7 +86,7 @@ async def authenticate_user(
     db: Annotated[AsyncSession, Depends(get_session)], username: str, password: str
 ):
     user = await db.scalar(select(User).where(User.username == username))
-    if not user or not bcrypt_context.verify(password, user.hashed_password):
+    if not user or not await password_hasher.verify(password, user.hashed_password):
         raise HTTPException(
             status_code=status.HTTP_401_UNAUTHORIZED,
             detail="Invalid authentication credentials",
@@ -43,10 +95,29 @@ async def authenticate_user(
     return user
 
 
-async def get_current_username(
-    db: Annotated[AsyncSession, Depends(get_session)],
-    token: str = Depends(oauth2_scheme),
-):
+def create_stream_token(user: User) -> str:
+    """
+    Creates a token for opening the user's event stream.
+
+    Browsers can't send an Authorization header with an EventSource, so the
+    token is passed in the URL instead.
+    """
+    return create_access_token(
+        {"sub": user.username, "uid": user.id, "scope": STREAM_TOKEN_SCOPE},
+        STREAM_TOKEN_LIFETIME,
+    )
+
+
+async def get_token_user(
+    db: AsyncSession, token: str, scope: Optional[str] = None
+) -> User:
+    """
+    Returns the user a token was issued to.
+
+    :param scope: Scope the token must have; None for access tokens.
+    :raises HTTPException: If the token is invalid, expired, has another
+        scope or its user no longer exists (401).
+    """
     credentials_exception = HTTPException(
         status_code=status.HTTP_401_UNAUTHORIZED,
         detail="Could not validate credentials",
@@ -55,16 +126,59 @@ async def get_current_username(
     try:
         payload = jwt.decode(token, SECRET_KEY, algorithms=[ALGORITHM])
         username: str = payload.get("sub")
-        if username is None:
+        user_id: int = payload.get("uid")
+        if username is None or payload.get("scope") != scope:
             raise credentials_exception
     except jwt.PyJWTError:
         raise credentials_exception
-    user = await db.scalar(select(User).where(User.username == username))
+
+    # Tokens issued before the user ID claim existed are resolved by username
+    cache_key = ("uid", user_id) if user_id is not None else ("sub", username)
+    user = user_cache.get(cache_key)
     if user is None:
+        if user_id is not None:
+            user = await db.get(User, user_id)
+        else:
+            user = await db.scalar(select(User).where(User.username == username))
+        if user is None:
+            raise credentials_exception
+
+        # The cached copy is detached from the session
+        user = User(**user.model_dump())
+        user_cache.set(cache_key, user)
+
+    # A renamed user's old tokens are no longer valid, cached or not
+    if user.username != username:
         raise credentials_exception
     return user
 
 
+async def get_current_username(
+    db: Annotated[AsyncSession, Depends(get_session)],
+    token: str = Depends(oauth2_scheme),
+):
+    return await get_token_user(db, token)
+
+
+async def get_stream_user(
+    db: Annotated[AsyncSession, Depends(get_session)],
+    token: Optional[str] = Query(
+        None, description="Stream token, for clients that can't send headers"
+    ),
+    bearer_token: Optional[str] = Depends(optional_oauth2_scheme),
+) -> User:
+    """Authenticates an event stream by a stream token or an access token."""
+    if token is not None:
+        return await get_token_user(db, token, STREAM_TOKEN_SCOPE)
+    if bearer_token is not None:
+        return await get_token_user(db, bearer_token)
+    raise HTTPException(
+        status_code=status.HTTP_401_UNAUTHORIZED,
+        detail="Not authenticated",
+        headers={"WWW-Authenticate": "Bearer"},
+    )
+
+
 async def create_user(
     session: Annotated[AsyncSession, Depends(get_session)], user_data
 ):
@@ -76,7 +190,7 @@ async def create_user(
             status_code=status.HTTP_400_BAD_REQUEST, detail="Email already registered"
         )
 
-    hashed_password = bcrypt_context.hash(user_data.password)
+    hashed_password = await password_hasher.hash(user_data.password)
     new_user = User(
         username=user_data.username,
         email=user_data.email,
@@ -85,6 +199,7 @@ async def create_user(
         height=user_data.height,
         target_weight=user_data.target_weight,
         time_frame=user_data.time_frame,
+        timezone=user_data.timezone,
     )
     session.add(new_user)
     await session.commit()
@@ -97,10 +212,18 @@ async def update_user(session: AsyncSession, user_id: int, user_data):
     if not user:
         raise HTTPException(status_code=404, detail="User not found")
 
+    old_username = user.username
+    old_timezone = user.timezone
     for key, value in user_data.dict(exclude_unset=True).items():
         setattr(user, key, value)
 
+    # Daily totals are per local day, so they are rebuilt for the new time zone
+    if user.timezone != old_timezone:
+        await rebuild_daily_totals(session, user)
+
+    publish_user_change(session, user.id, old_username, user.username)
     await session.commit()
+    invalidate_user(user.id, old_username, user.username)
     await session.refresh(user)
     return user
 
@@ -111,7 +234,9 @@ async def delete_user(session: AsyncSession, user_id: int):
         raise HTTPException(status_code=404, detail="User not found")
 
     await session.delete(user)
+    publish_user_change(session, user.id, user.username)
     await session.commit()
+    invalidate_user(user.id, user.username)
     return {"detail": "User deleted successfully"}
 
 
@@ -125,12 +250,14 @@ async def change_password(
     if not user:
         raise HTTPException(status_code=404, detail="User not found")
 
-    if not bcrypt_context.verify(old_password, user.hashed_password):
+    if not await password_hasher.verify(old_password, user.hashed_password):
         raise HTTPException(
             status_code=status.HTTP_400_BAD_REQUEST, detail="Old password is incorrect"
         )
 
-    user.hashed_password = bcrypt_context.hash(new_password)
+    user.hashed_password = await password_hasher.hash(new_password)
+    publish_user_change(session, user.id, user.username)
     await session.commit()
+    invalidate_user(user.id, user.username)
     await session.refresh(user)
     return {"detail": "Password changed successfully"}
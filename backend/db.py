@@ -1,25 +1,208 @@
 import os
-from sqlalchemy.ext.asyncio import create_async_engine, AsyncSession
-from sqlalchemy.orm import sessionmaker
+import threading
+import time
+from datetime import datetime
+from sqlalchemy import event, inspect, literal, update
+from sqlalchemy.engine import make_url
+from sqlalchemy.ext.asyncio import AsyncEngine, create_async_engine, AsyncSession
+from sqlalchemy.orm import Session, sessionmaker
+from sqlalchemy.pool import AsyncAdaptedQueuePool
 from sqlmodel import SQLModel
-from databases import Database
+from instrumentation import instrument_engine, instrument_sessions
 from models.user import User
 from models.product import Product
 from models.record import Record
 from models.record_product import RecordProduct
-
+from models.daily_total import DailyTotal
+from models.dish import Dish
+from models.dish_ingredient import DishIngredient
+from models.cache_invalidation import CacheInvalidation
+from models.tombstone import Tombstone
+from models.released_file import ReleasedFile
 
 # Database URL for SQLite
 DATABASE_URL = os.getenv("DATABASE_URL")
 
+# Values for the rows that existed before a column without a constant default
+# was added. Products from before update times were tracked count as very old.
+BACKFILLS = {
+    (Product, "updated"): datetime(1970, 1, 1),
+}
+
+
+def env_flag(name: str, default: bool) -> bool:
+    """Reads a boolean setting from the environment."""
+    return os.getenv(name, str(default)).lower() in ("1", "true", "yes", "on")
+
+
+class PoolMetrics:
+    """Counters for connection pool checkouts and the time spent waiting for them."""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.connects = 0
+        self.checkouts = 0
+        self.checkins = 0
+        self.wait_seconds = 0.0
+        self.max_wait_seconds = 0.0
+
+    def record_wait(self, seconds: float) -> None:
+        with self._lock:
+            self.wait_seconds += seconds
+            self.max_wait_seconds = max(self.max_wait_seconds, seconds)
+
+    def stats(self, pool) -> dict:
+        """Returns the counters together with the current pool state."""
+        stats = {
+            "pool": type(pool).__name__,
+            "connects": self.connects,
+            "checkouts": self.checkouts,
+            "checkins": self.checkins,
+            "wait_seconds": round(self.wait_seconds, 4),
+            "max_wait_seconds": round(self.max_wait_seconds, 4),
+        }
+        if isinstance(pool, AsyncAdaptedQueuePool):
+            stats.update(
+                size=pool.size(),
+                checked_out=pool.checkedout(),
+                overflow=pool.overflow(),
+            )
+        return stats
+
+
+pool_metrics = PoolMetrics()
+
+
+class InstrumentedQueuePool(AsyncAdaptedQueuePool):
+    """Queue pool that measures how long checkouts wait for a connection."""
+
+    def _do_get(self):
+        started = time.perf_counter()
+        try:
+            return super()._do_get()
+        finally:
+            pool_metrics.record_wait(time.perf_counter() - started)
+
+
+def set_sqlite_pragmas(dbapi_connection, connection_record) -> None:
+    """Configures every new SQLite connection for concurrent web traffic."""
+    cursor = dbapi_connection.cursor()
+    cursor.execute("PRAGMA journal_mode=WAL")
+    cursor.execute("PRAGMA synchronous=NORMAL")
+    cursor.execute(
+        f"PRAGMA busy_timeout={int(os.getenv('SQLITE_BUSY_TIMEOUT', '5000'))}"
+    )
+    cursor.execute(
+        f"PRAGMA mmap_size={int(os.getenv('SQLITE_MMAP_SIZE', '268435456'))}"
+    )
+    cursor.close()
+
+
+def create_engine(url: str) -> AsyncEngine:
+    """
+    Creates the asynchronous engine from environment settings.
+
+    DB_ECHO, DB_POOL_SIZE, DB_MAX_OVERFLOW, DB_POOL_TIMEOUT, DB_POOL_RECYCLE and
+    DB_POOL_PRE_PING configure logging and the connection pool. SQLite
+    connections additionally get WAL mode and related pragmas.
+    """
+    database_url = make_url(url)
+    is_sqlite = database_url.get_backend_name() == "sqlite"
+    in_memory = is_sqlite and database_url.database in (None, "", ":memory:")
+
+    options = {"echo": env_flag("DB_ECHO", False)}
+    if not in_memory:
+        options.update(
+            poolclass=InstrumentedQueuePool,
+            pool_size=int(os.getenv("DB_POOL_SIZE", "5")),
+            max_overflow=int(os.getenv("DB_MAX_OVERFLOW", "10")),
+            pool_timeout=float(os.getenv("DB_POOL_TIMEOUT", "30")),
+            pool_recycle=int(os.getenv("DB_POOL_RECYCLE", "1800")),
+            pool_pre_ping=env_flag("DB_POOL_PRE_PING", not is_sqlite),
+        )
+    new_engine = create_async_engine(url, **options)
+
+    pool_events = new_engine.sync_engine.pool
+    if is_sqlite and not in_memory:
+        event.listen(pool_events, "connect", set_sqlite_pragmas)
+
+    @event.listens_for(pool_events, "connect")
+    def count_connect(dbapi_connection, connection_record):
+        pool_metrics.connects += 1
+
+    @event.listens_for(pool_events, "checkout")
+    def count_checkout(dbapi_connection, connection_record, connection_proxy):
+        pool_metrics.checkouts += 1
+
+    @event.listens_for(pool_events, "checkin")
+    def count_checkin(dbapi_connection, connection_record):
+        pool_metrics.checkins += 1
+
+    # Queries are counted and timed per request
+    instrument_engine(new_engine.sync_engine)
+
+    return new_engine
+
+
 # Creating an asynchronous engine
-engine = create_async_engine(DATABASE_URL, echo=True)
+engine = create_engine(DATABASE_URL)
 
 # Creating an asynchronous session
 AsyncSessionLocal = sessionmaker(engine, class_=AsyncSession, expire_on_commit=False)
 
-# Creating an object for working with a database (via the databases library)
-database = Database(DATABASE_URL)
+# Rows returned by queries are counted per request
+instrument_sessions(Session)
+
+
+def get_pool_stats() -> dict:
+    """Returns connection pool counters and state."""
+    return pool_metrics.stats(engine.sync_engine.pool)
+
+
+def sync_schema(connection) -> None:
+    """
+    Brings tables that already exist up to date with the models.
+
+    `create_all` only creates missing tables, so columns and indexes added to a
+    model later are created here, and the `BACKFILLS` are applied.
+    """
+    inspector = inspect(connection)
+    preparer = connection.dialect.identifier_preparer
+    for table in SQLModel.metadata.sorted_tables:
+        existing_columns = {
+            column["name"] for column in inspector.get_columns(table.name)
+        }
+        for column in table.columns:
+            if column.name in existing_columns:
+                continue
+            ddl = (
+                f"ALTER TABLE {preparer.quote(table.name)} "
+                f"ADD COLUMN {preparer.quote(column.name)} "
+                f"{column.type.compile(dialect=connection.dialect)}"
+            )
+            # Existing rows get the model default, if there is a scalar one
+            if column.default is not None and column.default.is_scalar:
+                default = literal(column.default.arg).compile(
+                    dialect=connection.dialect, compile_kwargs={"literal_binds": True}
+                )
+                ddl += f" DEFAULT {default}"
+                if not column.nullable:
+                    ddl += " NOT NULL"
+            connection.exec_driver_sql(ddl)
+            print(f"Added column {table.name}.{column.name}")
+
+        for index in table.indexes:
+            index.create(connection, checkfirst=True)
+
+    for (model, column_name), value in BACKFILLS.items():
+        column = getattr(model, column_name)
+        result = connection.execute(
+            update(model).where(column.is_(None)).values({column_name: value})
+        )
+        if result.rowcount:
+            print(
+                f"Filled in {model.__tablename__}.{column_name} of {result.rowcount} rows"
+            )
 
 
 # Asynchronous database initialization
@@ -28,6 +211,7 @@ async def init_db():
         # Creating tables asynchronously
         async with engine.begin() as conn:
             await conn.run_sync(SQLModel.metadata.create_all)
+            await conn.run_sync(sync_schema)
         print("Database initialized successfully.")
     except Exception as e:
         print(f"Error initializing the database: {e}")
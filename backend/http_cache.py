@@ -0,0 +1,130 @@
+import mimetypes
+import os
+import re
+import stat
+from email.utils import parsedate_to_datetime
+from typing import Optional
+import aiofiles.os
+from fastapi import HTTPException
+from fastapi.responses import FileResponse, Response
+from starlette.datastructures import Headers
+from starlette.staticfiles import StaticFiles
+
+# Types missing from older mimetypes tables
+mimetypes.add_type("image/webp", ".webp")
+mimetypes.add_type("image/avif", ".avif")
+mimetypes.add_type("image/heic", ".heic")
+mimetypes.add_type("image/heif", ".heif")
+
+# Files named after their content never change, so they are cached for a year
+IMMUTABLE_CACHE_CONTROL = "public, max-age=31536000, immutable"
+
+# Other files are cached briefly and revalidated with their ETag afterwards
+DEFAULT_CACHE_CONTROL = "public, max-age=3600"
+
+# Names of content-addressed files and their variants start with a SHA-256 digest
+CONTENT_ADDRESSED_NAME = re.compile(r"^[0-9a-f]{64}(?:\.[a-z0-9.]+)?$")
+
+# Headers repeated in a 304 response
+NOT_MODIFIED_HEADERS = ("cache-control", "etag", "expires", "vary", "last-modified")
+
+
+def etag_matches(if_none_match: Optional[str], etag: str) -> bool:
+    """
+    Checks whether an If-None-Match header matches the given ETag.
+
+    Tags are compared weakly, as RFC 9110 requires for If-None-Match.
+    """
+    if not if_none_match:
+        return False
+    candidates = [tag.strip().removeprefix("W/") for tag in if_none_match.split(",")]
+    return "*" in candidates or etag.removeprefix("W/") in candidates
+
+
+def is_not_modified(request_headers: Headers, response_headers: Headers) -> bool:
+    """
+    Checks the conditional request headers against a response.
+
+    If-Modified-Since is only used when there is no If-None-Match.
+    """
+    if_none_match = request_headers.get("if-none-match")
+    if if_none_match is not None:
+        return etag_matches(if_none_match, response_headers.get("etag", ""))
+
+    if_modified_since = request_headers.get("if-modified-since")
+    last_modified = response_headers.get("last-modified")
+    if not if_modified_since or not last_modified:
+        return False
+    try:
+        return parsedate_to_datetime(if_modified_since) >= parsedate_to_datetime(
+            last_modified
+        )
+    except (TypeError, ValueError):
+        return False
+
+
+class CachedFileResponse(FileResponse):
+    """
+    File response with caching headers.
+
+    Content-addressed files get their name as a strong ETag and are cached
+    forever. Range requests are served by Starlette; If-Range is checked
+    against the ETag set here.
+    """
+
+    def __init__(self, path: str, stat_result: os.stat_result, **kwargs):
+        super().__init__(path, stat_result=stat_result, **kwargs)
+        file_name = os.path.basename(path)
+        if CONTENT_ADDRESSED_NAME.match(file_name):
+            self.headers["etag"] = f'"{file_name}"'
+            self.headers.setdefault("cache-control", IMMUTABLE_CACHE_CONTROL)
+        else:
+            self.headers.setdefault("cache-control", DEFAULT_CACHE_CONTROL)
+
+    def _should_use_range(self, http_if_range: str, stat_result) -> bool:
+        return http_if_range in (self.headers["etag"], self.headers["last-modified"])
+
+
+def not_modified_response(response: Response) -> Response:
+    """Returns a 304 response carrying the validators of `response`."""
+    headers = {
+        name: value
+        for name, value in response.headers.items()
+        if name in NOT_MODIFIED_HEADERS
+    }
+    return Response(status_code=304, headers=headers)
+
+
+async def cached_file_response(
+    request_headers: Headers, path: str, **kwargs
+) -> Response:
+    """
+    Returns a file with caching headers, or a 304 response if the client has it.
+
+    The media type is guessed from the file name unless given.
+
+    :raises HTTPException: If the path does not exist or is not a regular file.
+    """
+    try:
+        stat_result = await aiofiles.os.stat(path)
+    except FileNotFoundError:
+        stat_result = None
+    if stat_result is None or not stat.S_ISREG(stat_result.st_mode):
+        raise HTTPException(status_code=404, detail="File not found.")
+
+    response = CachedFileResponse(path, stat_result, **kwargs)
+    if is_not_modified(request_headers, response.headers):
+        return not_modified_response(response)
+    return response
+
+
+class CachedStaticFiles(StaticFiles):
+    """Static files served with the same caching headers as the files API."""
+
+    def file_response(self, full_path, stat_result, scope, status_code=200):
+        response = CachedFileResponse(
+            str(full_path), stat_result, status_code=status_code
+        )
+        if is_not_modified(Headers(scope=scope), response.headers):
+            return not_modified_response(response)
+        return response
@@ -0,0 +1,203 @@
+import bisect
+import threading
+import time
+from contextvars import ContextVar
+from typing import Dict, Optional, Sequence, Tuple
+from sqlalchemy import event
+from sqlalchemy.engine import Engine
+from sqlalchemy.orm import ORMExecuteState
+
+# Upper bounds of the latency histogram buckets in seconds
+DURATION_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0)
+
+# Upper bounds of the queries-per-request histogram buckets
+QUERY_COUNT_BUCKETS = (0, 1, 2, 3, 5, 10, 20, 50, 100)
+
+
+class RequestStats:
+    """Database work done while handling one request."""
+
+    __slots__ = ("queries", "db_seconds", "rows_returned", "rows_written")
+
+    def __init__(self):
+        self.queries = 0
+        self.db_seconds = 0.0
+        self.rows_returned = 0
+        self.rows_written = 0
+
+
+# Stats of the request being handled in the current task
+current_request_stats: ContextVar[Optional[RequestStats]] = ContextVar(
+    "current_request_stats", default=None
+)
+
+
+def instrument_engine(engine: Engine) -> None:
+    """
+    Counts the queries, database time and rows written by every statement run
+    while a request is being handled.
+
+    Written rows are the row count the driver reports for INSERT, UPDATE and
+    DELETE statements. Returned rows are counted by `instrument_sessions`.
+    """
+
+    @event.listens_for(engine, "before_cursor_execute")
+    def before_cursor_execute(conn, cursor, statement, parameters, context, many):
+        conn.info.setdefault("query_started", []).append(time.perf_counter())
+
+    @event.listens_for(engine, "after_cursor_execute")
+    def after_cursor_execute(conn, cursor, statement, parameters, context, many):
+        elapsed = time.perf_counter() - conn.info["query_started"].pop()
+        stats = current_request_stats.get()
+        if stats is None:
+            return
+        stats.queries += 1
+        stats.db_seconds += elapsed
+        if context is not None and (
+            context.isinsert or context.isupdate or context.isdelete
+        ):
+            stats.rows_written += max(cursor.rowcount or 0, 0)
+
+
+def instrument_sessions(session_class: type) -> None:
+    """
+    Counts the rows returned by queries run through ORM sessions while a
+    request is being handled.
+
+    The result is fetched in full to count its rows and handed to the caller
+    from memory, like SQLAlchemy's result caching does. Streamed results
+    (`yield_per` or `stream_results`) are not counted, so they stay streamed.
+    """
+
+    @event.listens_for(session_class, "do_orm_execute")
+    def count_returned_rows(state: ORMExecuteState):
+        stats = current_request_stats.get()
+        options = state.execution_options
+        if (
+            stats is None
+            or not state.is_select
+            or options.get("yield_per")
+            or options.get("stream_results")
+        ):
+            return None
+
+        frozen = state.invoke_statement().freeze()
+        stats.rows_returned += len(frozen.data)
+        return frozen()
+
+
+class Histogram:
+    """Cumulative histogram in the Prometheus format."""
+
+    def __init__(self, buckets: Sequence[float]):
+        self.buckets = tuple(buckets)
+        self.counts = [0] * (len(self.buckets) + 1)
+        self.sum = 0.0
+
+    def observe(self, value: float) -> None:
+        self.counts[bisect.bisect_left(self.buckets, value)] += 1
+        self.sum += value
+
+    def samples(self, name: str, labels: str):
+        total = 0
+        for bound, count in zip(self.buckets + ("+Inf",), self.counts):
+            total += count
+            separator = "," if labels else ""
+            yield f'{name}_bucket{{{labels}{separator}le="{bound}"}} {total}'
+        yield f"{name}_sum{{{labels}}} {self.sum}"
+        yield f"{name}_count{{{labels}}} {total}"
+
+
+def format_labels(**labels: str) -> str:
+    escaped = (
+        (name, str(value).replace("\\", "\\\\").replace('"', '\\"'))
+        for name, value in labels.items()
+    )
+    return ",".join(f'{name}="{value}"' for name, value in escaped)
+
+
+class RequestMetrics:
+    """Per-route request counters and histograms, rendered for Prometheus."""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.requests: Dict[Tuple[str, str, int], int] = {}
+        self.durations: Dict[Tuple[str, str], Histogram] = {}
+        self.query_counts: Dict[Tuple[str, str], Histogram] = {}
+        self.db_seconds: Dict[Tuple[str, str], float] = {}
+        self.rows_returned: Dict[Tuple[str, str], int] = {}
+        self.rows_written: Dict[Tuple[str, str], int] = {}
+
+    def record(
+        self, method: str, route: str, status: int, seconds: float, stats: RequestStats
+    ) -> None:
+        key = (method, route)
+        with self._lock:
+            self.requests[(method, route, status)] = (
+                self.requests.get((method, route, status), 0) + 1
+            )
+            self.durations.setdefault(key, Histogram(DURATION_BUCKETS)).observe(seconds)
+            self.query_counts.setdefault(key, Histogram(QUERY_COUNT_BUCKETS)).observe(
+                stats.queries
+            )
+            self.db_seconds[key] = self.db_seconds.get(key, 0.0) + stats.db_seconds
+            self.rows_returned[key] = (
+                self.rows_returned.get(key, 0) + stats.rows_returned
+            )
+            self.rows_written[key] = self.rows_written.get(key, 0) + stats.rows_written
+
+    def render(self) -> str:
+        """Returns the metrics in the Prometheus text exposition format."""
+        lines = []
+        with self._lock:
+            lines += [
+                "# HELP http_requests_total Handled HTTP requests.",
+                "# TYPE http_requests_total counter",
+            ]
+            for (method, route, status), count in sorted(self.requests.items()):
+                labels = format_labels(method=method, route=route, status=status)
+                lines.append(f"http_requests_total{{{labels}}} {count}")
+
+            lines += [
+                "# HELP http_request_duration_seconds Time to handle a request.",
+                "# TYPE http_request_duration_seconds histogram",
+            ]
+            for (method, route), histogram in sorted(self.durations.items()):
+                labels = format_labels(method=method, route=route)
+                lines += histogram.samples("http_request_duration_seconds", labels)
+
+            lines += [
+                "# HELP http_request_db_queries Database queries run per request.",
+                "# TYPE http_request_db_queries histogram",
+            ]
+            for (method, route), histogram in sorted(self.query_counts.items()):
+                labels = format_labels(method=method, route=route)
+                lines += histogram.samples("http_request_db_queries", labels)
+
+            lines += [
+                "# HELP http_request_db_seconds_total Time spent in database queries.",
+                "# TYPE http_request_db_seconds_total counter",
+            ]
+            for (method, route), seconds in sorted(self.db_seconds.items()):
+                labels = format_labels(method=method, route=route)
+                lines.append(f"http_request_db_seconds_total{{{labels}}} {seconds}")
+
+            lines += [
+                "# HELP http_request_db_rows_returned_total Rows returned by queries.",
+                "# TYPE http_request_db_rows_returned_total counter",
+            ]
+            for (method, route), rows in sorted(self.rows_returned.items()):
+                labels = format_labels(method=method, route=route)
+                lines.append(f"http_request_db_rows_returned_total{{{labels}}} {rows}")
+
+            lines += [
+                "# HELP http_request_db_rows_written_total Rows changed by writes.",
+                "# TYPE http_request_db_rows_written_total counter",
+            ]
+            for (method, route), rows in sorted(self.rows_written.items()):
+                labels = format_labels(method=method, route=route)
+                lines.append(f"http_request_db_rows_written_total{{{labels}}} {rows}")
+        return "\n".join(lines) + "\n"
+
+
+request_metrics = RequestMetrics()
@@ -0,0 +1,218 @@
+import asyncio
+import os
+import socket
+import time
+import uuid
+from collections import defaultdict
+from datetime import datetime, timedelta, timezone
+from typing import Awaitable, Callable, Dict, List
+from sqlalchemy import delete, func, or_
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlmodel import select
+from db import AsyncSessionLocal
+from models.cache_invalidation import CacheInvalidation
+
+# Called with the keys of the entries that another worker changed
+Handler = Callable[[List[str]], Awaitable[None]]
+
+
+class InvalidationBus:
+    """
+    Tells the other worker processes which cached entries were changed.
+
+    Writers call `publish` before committing their change, and every worker
+    runs the handlers subscribed to a topic with the keys changed by the other
+    workers. Local caches are still updated by the writer itself.
+
+    This base implementation is for a single worker and publishes nothing.
+    """
+
+    def __init__(self):
+        self.origin = f"{socket.gethostname()}-{os.getpid()}-{uuid.uuid4().hex[:8]}"
+        self._handlers: Dict[str, List[Handler]] = defaultdict(list)
+
+    def subscribe(self, topic: str, handler: Handler) -> None:
+        """Registers a handler for the changes other workers make to a topic."""
+        self._handlers[topic].append(handler)
+
+    def publish(self, session: AsyncSession, topic: str, *keys) -> None:
+        """Announces changed entries once the session's transaction commits."""
+
+    async def dispatch(self, topic: str, keys: List[str]) -> None:
+        """Runs the handlers of a topic, logging their errors."""
+        for handler in self._handlers.get(topic, ()):
+            try:
+                await handler(keys)
+            except Exception as e:
+                print(f"Error handling invalidation of {topic}: {e}")
+
+    async def start(self) -> None:
+        pass
+
+    async def stop(self) -> None:
+        pass
+
+
+class DatabaseInvalidationBus(InvalidationBus):
+    """
+    Invalidation bus backed by a change-sequence table in the application database.
+
+    Published changes are inserted into the writer's transaction, so they become
+    visible exactly when the change itself does. Every worker polls the table
+    for rows with a higher sequence number than the last one it has seen; this
+    is a primary key range scan that usually returns nothing. Old rows are
+    purged after `retention`.
+
+    Sequence numbers are not committed in order on every database: a
+    transaction can commit after one that got a higher number. Numbers skipped
+    by a poll are therefore looked for again until `gap_timeout` has passed,
+    after which the transaction is assumed to have rolled back.
+    """
+
+    def __init__(
+        self,
+        session_factory=AsyncSessionLocal,
+        poll_interval: float = 0.5,
+        retention: timedelta = timedelta(minutes=10),
+        gap_timeout: float = 60,
+        max_gaps: int = 1000,
+    ):
+        super().__init__()
+        self.session_factory = session_factory
+        self.poll_interval = poll_interval
+        self.retention = retention
+        self.gap_timeout = gap_timeout
+        self.max_gaps = max_gaps
+        self.last_id = 0
+        # Skipped sequence numbers and when they were noticed
+        self._gaps: Dict[int, float] = {}
+        self._task = None
+
+    def publish(self, session: AsyncSession, topic: str, *keys) -> None:
+        session.add_all(
+            CacheInvalidation(topic=topic, key=str(key), origin=self.origin)
+            for key in keys
+        )
+
+    async def start(self) -> None:
+        # Only changes made from now on are of interest
+        async with self.session_factory() as session:
+            result = await session.execute(select(func.max(CacheInvalidation.id)))
+            self.last_id = result.scalar_one() or 0
+        self._task = asyncio.create_task(self._run())
+
+    async def stop(self) -> None:
+        if self._task:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+
+    async def poll(self) -> int:
+        """
+        Dispatches the changes made by other workers since the last poll.
+
+        :return: Number of changes dispatched.
+        """
+        now = time.monotonic()
+        self._gaps = {
+            gap: noticed
+            for gap, noticed in self._gaps.items()
+            if now - noticed < self.gap_timeout
+        }
+        condition = CacheInvalidation.id > self.last_id
+        if self._gaps:
+            condition = or_(condition, CacheInvalidation.id.in_(list(self._gaps)))
+
+        async with self.session_factory() as session:
+            result = await session.execute(
+                select(
+                    CacheInvalidation.id,
+                    CacheInvalidation.topic,
+                    CacheInvalidation.key,
+                    CacheInvalidation.origin,
+                )
+                .where(condition)
+                .order_by(CacheInvalidation.id)
+            )
+            rows = result.all()
+        if not rows:
+            return 0
+
+        next_id = self.last_id + 1
+        for row in rows:
+            if self._gaps.pop(row.id, None) is not None or row.id < next_id:
+                continue
+            # Numbers between the rows seen may still be committed
+            for gap in range(next_id, min(row.id, next_id + self.max_gaps)):
+                self._gaps[gap] = now
+            next_id = row.id + 1
+        self.last_id = max(self.last_id, rows[-1].id)
+        if len(self._gaps) > self.max_gaps:
+            self._gaps = dict(sorted(self._gaps.items())[-self.max_gaps :])
+
+        keys_by_topic: Dict[str, List[str]] = defaultdict(list)
+        for row in rows:
+            if row.origin != self.origin:
+                keys_by_topic[row.topic].append(row.key)
+        for topic, keys in keys_by_topic.items():
+            await self.dispatch(topic, keys)
+        return sum(len(keys) for keys in keys_by_topic.values())
+
+    async def purge(self) -> None:
+        """
+        Deletes changes older than the retention period.
+
+        The latest change is kept, so that sequence numbers are not handed out
+        again on databases that continue after the highest existing one.
+        """
+        async with self.session_factory() as session:
+            result = await session.execute(select(func.max(CacheInvalidation.id)))
+            latest_id = result.scalar_one()
+            if latest_id is None:
+                return
+            await session.execute(
+                delete(CacheInvalidation).where(
+                    CacheInvalidation.created
+                    < datetime.now(timezone.utc) - self.retention,
+                    CacheInvalidation.id < latest_id,
+                )
+            )
+            await session.commit()
+
+    async def _run(self) -> None:
+        polls_per_purge = max(1, int(60 / self.poll_interval))
+        polls = 0
+        while True:
+            await asyncio.sleep(self.poll_interval)
+            try:
+                await self.poll()
+                polls += 1
+                if polls % polls_per_purge == 0:
+                    await self.purge()
+            except Exception as e:
+                print(f"Error polling cache invalidations: {e}")
+
+
+def create_invalidation_bus() -> InvalidationBus:
+    """
+    Creates the bus selected by CACHE_INVALIDATION_BUS: "database", needed
+    when running several workers, or "none" for a single process.
+
+    Without the setting, the database bus is only used when WEB_CONCURRENCY,
+    which uvicorn and gunicorn read as their number of workers, is above one.
+    """
+    backend = os.getenv("CACHE_INVALIDATION_BUS")
+    if backend is None:
+        workers = int(os.getenv("WEB_CONCURRENCY", "1"))
+        backend = "database" if workers > 1 else "none"
+    if backend == "none":
+        return InvalidationBus()
+    return DatabaseInvalidationBus(
+        poll_interval=float(os.getenv("CACHE_INVALIDATION_POLL_INTERVAL", "0.5"))
+    )
+
+
+invalidation_bus = create_invalidation_bus()
@@ -3,15 +3,35 @@ from dotenv import load_dotenv
 # Loading environment variables from .env
 load_dotenv()
 
+import os
 from fastapi import FastAPI
+from fastapi.responses import ORJSONResponse
 from fastapi.middleware.cors import CORSMiddleware
-from fastapi.staticfiles import StaticFiles
-from db import database, init_db
+from http_cache import CachedStaticFiles
+from middleware import (
+    BodySizeLimitMiddleware,
+    CompressionMiddleware,
+    InstrumentationMiddleware,
+)
+from db import engine, init_db, AsyncSessionLocal
+from controllers.product_controller import build_search_index
+from controllers.user_controller import password_hasher
+from controllers.image_controller import shutdown_executor
+from controllers.file_controller import (
+    MAX_UPLOAD_SIZE,
+    start_file_sweeper,
+    stop_file_sweeper,
+)
+from invalidation_bus import invalidation_bus
 from contextlib import asynccontextmanager
 from routes.product_routes import router as product_router
 from routes.files_routes import router as files_router
 from routes.record_router import router as record_router
 from routes.user_router import router as user_router
+from routes.dish_routes import router as dish_router
+from routes.stats_routes import router as stats_router
+from routes.metrics_routes import router as metrics_router
+from routes.sync_routes import router as sync_router
 
 
 # Define the lifespan context manager
@@ -20,19 +40,35 @@ async def lifespan(app: FastAPI):
     """
     Lifespan event handler. Executes logic during application startup and shutdown.
     """
-    # Startup logic: connect to the database and initialize it
-    await database.connect()
+    # Startup logic: initialize the database
     await init_db()  # Initialize the database (create tables)
+    async with AsyncSessionLocal() as session:
+        await build_search_index(session)  # Load products into the search index
+    await invalidation_bus.start()  # Follow cache changes made by other workers
+    start_file_sweeper()  # Delete images that are no longer used
     yield  # The application runs during this time
-    # Shutdown logic: disconnect from the database
-    await database.disconnect()
+    # Shutdown logic: close the pooled database connections
+    await stop_file_sweeper()
+    await invalidation_bus.stop()
+    await engine.dispose()
+    password_hasher.shutdown()
+    shutdown_executor()
 
 
 # Initialize FastAPI app with lifespan handler
 app = FastAPI(
-    lifespan=lifespan
+    lifespan=lifespan, default_response_class=ORJSONResponse
 )  # app = FastAPI(dependencies=[Depends(get_current_user)])
 
+# Text responses above the threshold are sent compressed with brotli or gzip
+app.add_middleware(
+    CompressionMiddleware,
+    minimum_size=int(os.getenv("COMPRESSION_MIN_SIZE", "1024")),
+)
+
+# Oversize uploads are rejected before they are buffered; 64 KiB covers form fields
+app.add_middleware(BodySizeLimitMiddleware, max_body_size=MAX_UPLOAD_SIZE + 65536)
+
 # Connecting CORS
 app.add_middleware(
     CORSMiddleware,
@@ -40,11 +76,25 @@ app.add_middleware(
     allow_credentials=True,  # We allow the use of cookies
     allow_methods=["*"],  # Allow all HTTP methods
     allow_headers=["*"],  # We allow any headers
+    expose_headers=["ETag", "X-Next-Cursor"],  # Headers readable by the client
+)
+
+# Timing and query counts of every request; slow requests are profiled when
+# PROFILE_SLOW_REQUESTS_MS is set
+slow_request_ms = os.getenv("PROFILE_SLOW_REQUESTS_MS")
+app.add_middleware(
+    InstrumentationMiddleware,
+    slow_request_seconds=float(slow_request_ms) / 1000 if slow_request_ms else None,
+    profile_dir=os.getenv("PROFILE_DIR", "profiles"),
 )
 app.include_router(product_router)
 app.include_router(files_router)
 app.include_router(record_router)
 app.include_router(user_router)
+app.include_router(dish_router)
+app.include_router(stats_router)
+app.include_router(metrics_router)
+app.include_router(sync_router)
 
 
-app.mount("/static", StaticFiles(directory="static"), name="static")
+app.mount("/static", CachedStaticFiles(directory="static"), name="static")
@@ -0,0 +1,269 @@
+import os
+import re
+import time
+import zlib
+from typing import Callable, Optional, Tuple
+import brotli
+from fastapi import HTTPException
+from starlette.datastructures import Headers, MutableHeaders
+from starlette.responses import JSONResponse
+from starlette.types import ASGIApp, Message, Receive, Scope, Send
+from instrumentation import RequestStats, current_request_stats, request_metrics
+
+# Content types worth compressing; images and archives are compressed already
+COMPRESSIBLE_TYPES = (
+    "text/",
+    "application/json",
+    "application/x-ndjson",
+    "application/javascript",
+    "application/xml",
+    "image/svg+xml",
+)
+
+
+class BodySizeLimitMiddleware:
+    """
+    Rejects request bodies larger than `max_body_size` bytes with 413.
+
+    A too large Content-Length is rejected before the body is read. Bodies
+    without one are counted while they stream in, and reading stops as soon as
+    the limit is passed, so an oversize upload is never buffered completely.
+    """
+
+    def __init__(self, app: ASGIApp, max_body_size: int):
+        self.app = app
+        self.max_body_size = max_body_size
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send) -> None:
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        headers = dict(scope["headers"])
+        content_length = headers.get(b"content-length")
+        if (
+            content_length
+            and content_length.isdigit()
+            and int(content_length) > self.max_body_size
+        ):
+            response = JSONResponse(
+                {"detail": "Request body is too large."}, status_code=413
+            )
+            await response(scope, receive, send)
+            return
+
+        received = 0
+
+        async def limited_receive() -> Message:
+            nonlocal received
+            message = await receive()
+            if message["type"] == "http.request":
+                received += len(message.get("body", b""))
+                if received > self.max_body_size:
+                    raise HTTPException(
+                        status_code=413, detail="Request body is too large."
+                    )
+            return message
+
+        await self.app(scope, limited_receive, send)
+
+
+def choose_encoding(accept_encoding: str) -> Optional[str]:
+    """
+    Picks brotli or gzip from an Accept-Encoding header, preferring brotli.
+
+    :return: "br", "gzip" or None if the client accepts neither.
+    """
+    qualities = {}
+    for item in accept_encoding.split(","):
+        name, _, params = item.strip().partition(";")
+        quality = 1.0
+        params = params.strip()
+        if params.startswith("q="):
+            try:
+                quality = float(params[2:])
+            except ValueError:
+                quality = 0.0
+        qualities[name.strip().lower()] = quality
+
+    wildcard = qualities.get("*", 0.0)
+    candidates = [
+        (qualities.get(encoding, wildcard), preference, encoding)
+        for preference, encoding in enumerate(("gzip", "br"))
+    ]
+    quality, _, encoding = max(candidates)
+    return encoding if quality > 0 else None
+
+
+class CompressionMiddleware:
+    """
+    Compresses text responses with brotli or gzip, as negotiated with the client.
+
+    Responses smaller than `minimum_size`, partial and not modified responses,
+    event streams and already encoded bodies are sent unchanged. Streaming
+    responses are compressed chunk by chunk. Strong ETags of compressed
+    responses are made weak.
+    """
+
+    def __init__(
+        self,
+        app: ASGIApp,
+        minimum_size: int = 1024,
+        gzip_level: int = 6,
+        brotli_quality: int = 4,
+    ):
+        self.app = app
+        self.minimum_size = minimum_size
+        self.gzip_level = gzip_level
+        self.brotli_quality = brotli_quality
+
+    def create_compressor(
+        self, encoding: str
+    ) -> Tuple[Callable[[bytes], bytes], Callable[[], bytes]]:
+        """Returns the compress and finish functions for an encoding."""
+        if encoding == "br":
+            compressor = brotli.Compressor(quality=self.brotli_quality)
+            return compressor.process, compressor.finish
+        compressor = zlib.compressobj(self.gzip_level, zlib.DEFLATED, 31)
+        return compressor.compress, compressor.flush
+
+    @staticmethod
+    def is_compressible(status: int, headers: Headers) -> bool:
+        content_type = headers.get("content-type", "")
+        return (
+            status not in (204, 206, 304)
+            and "content-encoding" not in headers
+            and content_type.startswith(COMPRESSIBLE_TYPES)
+            and not content_type.startswith("text/event-stream")
+        )
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send) -> None:
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        encoding = choose_encoding(Headers(scope=scope).get("accept-encoding", ""))
+        if encoding is None:
+            await self.app(scope, receive, send)
+            return
+
+        start_message: Optional[Message] = None
+        compress = finish = None
+
+        async def compressing_send(message: Message) -> None:
+            nonlocal start_message, compress, finish
+            if message["type"] == "http.response.start":
+                start_message = message
+                return
+
+            if start_message is not None:
+                # The first body message decides whether the response is compressed
+                headers = MutableHeaders(raw=start_message["headers"])
+                body = message.get("body", b"")
+                if message["type"] == "http.response.body" and self.is_compressible(
+                    start_message["status"], headers
+                ):
+                    headers.add_vary_header("Accept-Encoding")
+                    if message.get("more_body") or len(body) >= self.minimum_size:
+                        compress, finish = self.create_compressor(encoding)
+                        headers["Content-Encoding"] = encoding
+                        if "content-length" in headers:
+                            del headers["Content-Length"]
+                        # The compressed body is not byte-identical to the
+                        # identity one, so its ETag can only be weak
+                        etag = headers.get("etag")
+                        if etag and not etag.startswith("W/"):
+                            headers["ETag"] = f"W/{etag}"
+                await send(start_message)
+                start_message = None
+
+            if compress is None or message["type"] != "http.response.body":
+                await send(message)
+                return
+
+            more_body = message.get("more_body", False)
+            data = compress(message.get("body", b""))
+            if not more_body:
+                data += finish()
+            if data or not more_body:
+                await send(
+                    {"type": "http.response.body", "body": data, "more_body": more_body}
+                )
+
+        await self.app(scope, receive, compressing_send)
+
+
+class InstrumentationMiddleware:
+    """
+    Records the wall time, database time, query count and rows returned and
+    written of every request.
+
+    The numbers are added to the request metrics and sent to the client in a
+    `Server-Timing` header. If `slow_request_seconds` is set, requests are
+    profiled with pyinstrument and the profiles of requests slower than that
+    are saved as HTML to `profile_dir`.
+    """
+
+    def __init__(
+        self,
+        app: ASGIApp,
+        slow_request_seconds: Optional[float] = None,
+        profile_dir: str = "profiles",
+    ):
+        self.app = app
+        self.slow_request_seconds = slow_request_seconds
+        self.profile_dir = profile_dir
+
+    def save_profile(self, profiler, scope: Scope, route: str, seconds: float):
+        os.makedirs(self.profile_dir, exist_ok=True)
+        slug = re.sub(r"[^A-Za-z0-9]+", "-", route).strip("-") or "root"
+        file_name = (
+            f"{time.strftime('%Y%m%d-%H%M%S')}-{scope['method']}-{slug}-"
+            f"{seconds * 1000:.0f}ms.html"
+        )
+        with open(os.path.join(self.profile_dir, file_name), "w") as file:
+            file.write(profiler.output_html())
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send) -> None:
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        stats = RequestStats()
+        token = current_request_stats.set(stats)
+        status = 500
+        profiler = None
+        if self.slow_request_seconds is not None:
+            # Imported here, so the profiler is only needed when profiling
+            from pyinstrument import Profiler
+
+            profiler = Profiler(interval=0.001, async_mode="enabled")
+            profiler.start()
+        started = time.perf_counter()
+
+        async def timing_send(message: Message) -> None:
+            nonlocal status
+            if message["type"] == "http.response.start":
+                status = message["status"]
+                elapsed = time.perf_counter() - started
+                MutableHeaders(raw=message["headers"]).append(
+                    "Server-Timing",
+                    f"app;dur={elapsed * 1000:.1f}, "
+                    f"db;dur={stats.db_seconds * 1000:.1f};"
+                    f'desc="{stats.queries} queries, {stats.rows_returned} rows '
+                    f'returned, {stats.rows_written} rows written"',
+                )
+            await send(message)
+
+        try:
+            await self.app(scope, receive, timing_send)
+        finally:
+            elapsed = time.perf_counter() - started
+            current_request_stats.reset(token)
+            route = scope.get("route")
+            route_path = getattr(route, "path", None) or "unmatched"
+            request_metrics.record(scope["method"], route_path, status, elapsed, stats)
+            if profiler is not None:
+                profiler.stop()
+                if elapsed >= self.slow_request_seconds:
+                    self.save_profile(profiler, scope, route_path, elapsed)
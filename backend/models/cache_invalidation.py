@@ -0,0 +1,18 @@
+from datetime import datetime, timezone
+from typing import Optional
+from sqlmodel import Field
+from models.base import BaseModel
+
+
+class CacheInvalidation(BaseModel, table=True):
+    id: Optional[int] = Field(
+        default=None, primary_key=True, description="Sequence number of the change"
+    )
+    topic: str = Field(nullable=False, description="Kind of cached data that changed")
+    key: str = Field(nullable=False, description="Key of the changed entry")
+    origin: str = Field(nullable=False, description="Worker that made the change")
+    created: datetime = Field(
+        default_factory=lambda: datetime.now(timezone.utc),
+        index=True,
+        description="When the change was committed",
+    )
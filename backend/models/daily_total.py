@@ -0,0 +1,13 @@
+from datetime import date
+from sqlmodel import Field
+from models.base import BaseModel
+
+
+class DailyTotal(BaseModel, table=True):
+    user_id: int = Field(
+        foreign_key="user.id", primary_key=True, description="Owner of the totals"
+    )
+    day: date = Field(primary_key=True, description="Day in the user's time zone")
+    calories: float = Field(default=0, description="Calories eaten on the day")
+    grams: int = Field(default=0, description="Weight of food eaten on the day")
+    entries: int = Field(default=0, description="Number of logged products")
@@ -0,0 +1,22 @@
+from sqlmodel import Field, Relationship
+from typing import Optional, List
+from models.base import BaseModel
+from models.dish_ingredient import DishIngredient
+
+
+class Dish(BaseModel, table=True):
+    id: Optional[int] = Field(default=None, primary_key=True)
+    product_id: int = Field(
+        foreign_key="product.id",
+        unique=True,
+        index=True,
+        description="Product under which the dish is logged",
+    )
+    total_weight: int = Field(
+        nullable=False, description="Weight of all ingredients in grams"
+    )
+    total_calories: float = Field(
+        nullable=False, description="Calories of all ingredients"
+    )
+
+    ingredients: List["DishIngredient"] = Relationship(back_populates="dish")
@@ -0,0 +1,18 @@
+from sqlmodel import Field, Relationship
+from typing import Optional
+from models.base import BaseModel
+
+
+class DishIngredient(BaseModel, table=True):
+    dish_id: int = Field(
+        foreign_key="dish.id", primary_key=True, description="Associated dish"
+    )
+    product_id: int = Field(
+        foreign_key="product.id",
+        primary_key=True,
+        index=True,
+        description="Ingredient product",
+    )
+    weight: int = Field(..., description="Weight of the ingredient in grams")
+
+    dish: Optional["Dish"] = Relationship(back_populates="ingredients")
@@ -1,3 +1,4 @@
+from datetime import datetime, timezone
 from sqlmodel import Field, Relationship
 from typing import Optional, List
 from models.base import BaseModel
@@ -13,8 +14,29 @@ class Product(BaseModel, table=True):
     calories_per_100g: int = Field(
         nullable=False, description="Calories per 100g of the product"
     )
+    protein_per_100g: float = Field(
+        default=0, description="Protein per 100g of the product in grams"
+    )
+    fat_per_100g: float = Field(
+        default=0, description="Fat per 100g of the product in grams"
+    )
+    carbohydrates_per_100g: float = Field(
+        default=0, description="Carbohydrates per 100g of the product in grams"
+    )
+    fibre_per_100g: float = Field(
+        default=0, description="Fibre per 100g of the product in grams"
+    )
     image_url: Optional[str] = Field(
-        default=None, description="URL to the product image", nullable=True
+        default=None,
+        index=True,
+        description="URL to the product image",
+        nullable=True,
+    )
+    updated: Optional[datetime] = Field(
+        default_factory=lambda: datetime.now(timezone.utc),
+        index=True,
+        nullable=True,
+        description="Last updated date of the product",
     )
 
     # Delayed import for relationship to avoid circular import
@@ -1,3 +1,4 @@
+from sqlalchemy import Index
 from sqlmodel import Field, Relationship
 from datetime import datetime, timezone
 from typing import Optional, List
@@ -6,6 +7,15 @@ from models.record_product import RecordProduct
 
 
 class Record(BaseModel, table=True):
+    # Daily and date-range queries filter by user and creation time, delta
+    # sync by user and update time. Offline clients create records at most once
+    # per client ID.
+    __table_args__ = (
+        Index("ix_record_user_id_created", "user_id", "created"),
+        Index("ix_record_user_id_updated", "user_id", "updated"),
+        Index("ix_record_user_id_client_id", "user_id", "client_id", unique=True),
+    )
+
     id: Optional[int] = Field(default=None, primary_key=True)
     user_id: int = Field(
         foreign_key="user.id", nullable=False, description="User who created the record"
@@ -18,5 +28,10 @@ class Record(BaseModel, table=True):
         default_factory=lambda: datetime.now(timezone.utc),
         description="Last updated date of the record",
     )
+    client_id: Optional[str] = Field(
+        default=None,
+        max_length=64,
+        description="ID the record was given by an offline client",
+    )
 
     products: List["RecordProduct"] = Relationship(back_populates="record")
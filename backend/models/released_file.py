@@ -0,0 +1,16 @@
+from datetime import datetime, timezone
+from typing import Optional
+from sqlmodel import Field
+from models.base import BaseModel
+
+
+class ReleasedFile(BaseModel, table=True):
+    id: Optional[int] = Field(default=None, primary_key=True)
+    path: str = Field(
+        nullable=False, index=True, description="Path of the file that lost a reference"
+    )
+    released: datetime = Field(
+        default_factory=lambda: datetime.now(timezone.utc),
+        index=True,
+        description="When the reference was dropped",
+    )
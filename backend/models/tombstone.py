@@ -0,0 +1,23 @@
+from datetime import datetime, timezone
+from typing import Optional
+from sqlalchemy import Index
+from sqlmodel import Field
+from models.base import BaseModel
+
+
+class Tombstone(BaseModel, table=True):
+    # Delta sync reads the deletions of one user, or of shared entities, by time
+    __table_args__ = (Index("ix_tombstone_user_id_deleted", "user_id", "deleted"),)
+
+    id: Optional[int] = Field(default=None, primary_key=True)
+    entity: str = Field(nullable=False, description="Kind of the deleted entity")
+    entity_id: int = Field(nullable=False, description="ID of the deleted entity")
+    user_id: Optional[int] = Field(
+        default=None,
+        nullable=True,
+        description="Owner of the deleted entity, none for shared entities",
+    )
+    deleted: datetime = Field(
+        default_factory=lambda: datetime.now(timezone.utc),
+        description="When the entity was deleted",
+    )
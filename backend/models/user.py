@@ -24,3 +24,8 @@ class User(BaseModel, table=True):
     time_frame: int = Field(
         default=6, description="Timeframe to reach target weight in months"
     )
+    timezone: str = Field(
+        default="UTC",
+        nullable=False,
+        description="IANA time zone used for the user's day boundaries",
+    )
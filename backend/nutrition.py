@@ -0,0 +1,105 @@
+from typing import Tuple
+import numpy as np
+
+# Nutrients stored per 100g of a product, in the order of the matrix columns
+NUTRIENTS = ("calories", "protein", "fat", "carbohydrates", "fibre")
+
+# Product columns holding the nutrients
+NUTRIENT_COLUMNS = tuple(f"{nutrient}_per_100g" for nutrient in NUTRIENTS)
+
+
+def nutrient_totals(weights: np.ndarray, per_100g: np.ndarray) -> np.ndarray:
+    """
+    Nutrients of several portions added up.
+
+    :param weights: Grams of every portion, shape (n,).
+    :param per_100g: Nutrients per 100g of every portion's product, shape (n, k).
+    :return: Totals, shape (k,).
+    """
+    return weights @ per_100g / 100
+
+
+def group_totals(
+    groups: np.ndarray, weights: np.ndarray, per_100g: np.ndarray, group_count: int
+) -> np.ndarray:
+    """
+    Nutrients of portions added up per group, e.g. per day or per dish.
+
+    :param groups: Group index of every portion, shape (n,).
+    :return: Totals per group, shape (group_count, k).
+    """
+    contributions = per_100g * (weights / 100)[:, None]
+    return np.stack(
+        [
+            np.bincount(groups, weights=column, minlength=group_count)
+            for column in contributions.T
+        ],
+        axis=1,
+    ).reshape(group_count, per_100g.shape[1])
+
+
+def dish_nutrients(
+    per_100g: np.ndarray,
+    dish_products: np.ndarray,
+    ingredient_dishes: np.ndarray,
+    ingredient_products: np.ndarray,
+    ingredient_weights: np.ndarray,
+) -> Tuple[np.ndarray, np.ndarray]:
+    """
+    Computes the nutrients of dishes from their ingredients.
+
+    Products are rows of `per_100g`. Dishes used as ingredients of other dishes
+    are computed first, so there is one round of array operations per level of
+    nesting rather than per dish.
+
+    :param per_100g: Nutrients per 100g of every product, shape (p, k).
+    :param dish_products: Product row of every dish, shape (d,).
+    :param ingredient_dishes: Dish index of every ingredient, shape (m,).
+    :param ingredient_products: Product row of every ingredient, shape (m,).
+    :param ingredient_weights: Grams of every ingredient, shape (m,).
+    :return: `per_100g` with the dish rows recomputed, and the nutrients of
+        every whole dish, shape (d, k).
+    :raises ValueError: If dishes contain each other.
+    """
+    per_100g = per_100g.astype(float)
+    dish_count = len(dish_products)
+    totals = np.zeros((dish_count, per_100g.shape[1]))
+    total_weights = np.bincount(
+        ingredient_dishes, weights=ingredient_weights, minlength=dish_count
+    )
+
+    # Dish index of every product, -1 for plain products
+    dish_of_product = np.full(len(per_100g), -1)
+    dish_of_product[dish_products] = np.arange(dish_count)
+    ingredient_dish_of = dish_of_product[ingredient_products]
+
+    pending = np.ones(dish_count, dtype=bool)
+    while pending.any():
+        # A dish is ready once none of its ingredients is a pending dish
+        waiting = (ingredient_dish_of >= 0) & pending[ingredient_dish_of]
+        blocked = np.bincount(ingredient_dishes[waiting], minlength=dish_count) > 0
+        ready = pending & ~blocked
+        if not ready.any():
+            raise ValueError("Dishes contain each other")
+
+        rows = ready[ingredient_dishes]
+        level_totals = group_totals(
+            ingredient_dishes[rows],
+            ingredient_weights[rows],
+            per_100g[ingredient_products[rows]],
+            dish_count,
+        )
+        totals[ready] = level_totals[ready]
+        per_100g[dish_products[ready]] = (
+            level_totals[ready] / np.maximum(total_weights[ready], 1)[:, None] * 100
+        )
+        pending &= ~ready
+
+    return per_100g, totals
+
+
+def to_dict(values: np.ndarray) -> dict:
+    """Names a vector of nutrients, rounded to one decimal."""
+    return {
+        nutrient: round(float(value), 1) for nutrient, value in zip(NUTRIENTS, values)
+    }
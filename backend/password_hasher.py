@@ -0,0 +1,98 @@
+import asyncio
+import threading
+import time
+from concurrent.futures import Future, ThreadPoolExecutor
+from fastapi import HTTPException, status
+from passlib.context import CryptContext
+
+
+class PasswordHasher:
+    """
+    Runs password hashing and verification in a bounded thread pool.
+
+    bcrypt releases the GIL, so hashing in threads keeps the event loop free
+    for other requests. When more than `max_queue` calls are waiting for a
+    worker, new calls are rejected with 503 instead of piling up.
+    """
+
+    def __init__(
+        self, context: CryptContext, max_workers: int = 2, max_queue: int = 64
+    ):
+        self.context = context
+        self.max_workers = max_workers
+        self.max_queue = max_queue
+        self._executor = ThreadPoolExecutor(
+            max_workers=max_workers, thread_name_prefix="password-hash"
+        )
+        self._lock = threading.Lock()
+        self.queued = 0
+        self.running = 0
+        self.completed = 0
+        self.rejected = 0
+        self.max_queued = 0
+        self.wait_seconds = 0.0
+        self.hash_seconds = 0.0
+
+    def _run(self, submitted_at: float, function, *args):
+        started_at = time.perf_counter()
+        with self._lock:
+            self.queued -= 1
+            self.running += 1
+            self.wait_seconds += started_at - submitted_at
+        try:
+            return function(*args)
+        finally:
+            with self._lock:
+                self.running -= 1
+                self.completed += 1
+                self.hash_seconds += time.perf_counter() - started_at
+
+    async def _submit(self, function, *args):
+        with self._lock:
+            if self.queued >= self.max_queue:
+                self.rejected += 1
+                raise HTTPException(
+                    status_code=status.HTTP_503_SERVICE_UNAVAILABLE,
+                    detail="Too many concurrent password checks, please retry",
+                    headers={"Retry-After": "1"},
+                )
+            self.queued += 1
+            self.max_queued = max(self.max_queued, self.queued)
+
+        future = self._executor.submit(self._run, time.perf_counter(), function, *args)
+        future.add_done_callback(self._forget_cancelled)
+        return await asyncio.wrap_future(future)
+
+    def _forget_cancelled(self, future: Future) -> None:
+        # A call cancelled before a worker picked it up never reaches `_run`,
+        # e.g. when the client disconnects while waiting
+        if future.cancelled():
+            with self._lock:
+                self.queued -= 1
+
+    async def hash(self, password: str) -> str:
+        """Hashes a password without blocking the event loop."""
+        return await self._submit(self.context.hash, password)
+
+    async def verify(self, password: str, hashed_password: str) -> bool:
+        """Verifies a password without blocking the event loop."""
+        return await self._submit(self.context.verify, password, hashed_password)
+
+    def shutdown(self) -> None:
+        """Stops the worker threads."""
+        self._executor.shutdown(wait=False, cancel_futures=True)
+
+    def stats(self) -> dict:
+        """Returns the pool counters."""
+        with self._lock:
+            return {
+                "max_workers": self.max_workers,
+                "max_queue": self.max_queue,
+                "queued": self.queued,
+                "running": self.running,
+                "completed": self.completed,
+                "rejected": self.rejected,
+                "max_queued": self.max_queued,
+                "wait_seconds": round(self.wait_seconds, 3),
+                "hash_seconds": round(self.hash_seconds, 3),
+            }
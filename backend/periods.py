@@ -0,0 +1,121 @@
+from datetime import date, datetime, time, timedelta, timezone
+from typing import List, Tuple
+from zoneinfo import ZoneInfo
+from sqlalchemy import Date, case, cast, func
+
+# Supported summary periods
+GRANULARITIES = ("day", "week", "month")
+
+
+def get_day_bounds(day: date, tz: ZoneInfo) -> Tuple[datetime, datetime]:
+    """
+    Returns the half-open interval [start, end) of a day in the given time zone.
+
+    Record timestamps are stored as naive UTC, so the bounds are converted to
+    naive UTC as well.
+    """
+    start = datetime.combine(day, time.min, tzinfo=tz)
+    end = datetime.combine(day + timedelta(days=1), time.min, tzinfo=tz)
+    return (
+        start.astimezone(timezone.utc).replace(tzinfo=None),
+        end.astimezone(timezone.utc).replace(tzinfo=None),
+    )
+
+
+def get_local_day(moment: datetime, tz: ZoneInfo) -> date:
+    """
+    Returns the day a timestamp falls on in the given time zone.
+
+    Naive timestamps are treated as UTC, which is how they are stored.
+    """
+    if moment.tzinfo is None:
+        moment = moment.replace(tzinfo=timezone.utc)
+    return moment.astimezone(tz).date()
+
+
+def get_offset_segments(
+    start: datetime, end: datetime, tz: ZoneInfo
+) -> List[Tuple[datetime, int]]:
+    """
+    Splits [start, end) (naive UTC) into segments with a constant UTC offset.
+
+    :return: List of (segment end, offset in minutes) pairs, one per segment.
+    """
+
+    def offset_at(moment: datetime) -> int:
+        local = moment.replace(tzinfo=timezone.utc).astimezone(tz)
+        return int(local.utcoffset().total_seconds() // 60)
+
+    segments = []
+    current = start
+    current_offset = offset_at(start)
+    while current < end:
+        step = min(current + timedelta(days=1), end)
+        if offset_at(step) == current_offset or step == end:
+            current = step
+            continue
+
+        # Binary search for the first minute with the new offset
+        low, high = 0, int((step - current).total_seconds() // 60)
+        while high - low > 1:
+            middle = (low + high) // 2
+            if offset_at(current + timedelta(minutes=middle)) == current_offset:
+                low = middle
+            else:
+                high = middle
+        high = current + timedelta(minutes=high)
+        segments.append((high, current_offset))
+        current, current_offset = high, offset_at(high)
+
+    segments.append((end, current_offset))
+    return segments
+
+
+def local_day_expression(
+    dialect: str, column, tz: ZoneInfo, start: datetime, end: datetime
+):
+    """
+    Builds the SQL expression for the local day of a naive UTC timestamp column.
+
+    :param start: Earliest timestamp the expression has to handle.
+    :param end: Timestamp after the latest one the expression has to handle.
+    """
+    if dialect == "postgresql":
+        return cast(func.timezone(tz.key, func.timezone("UTC", column)), Date)
+
+    # SQLite has no time zone support: shift each UTC offset segment separately
+    segments = get_offset_segments(start, end, tz)
+    return case(
+        *(
+            (column < segment_end, func.date(column, f"{offset:+d} minutes"))
+            for segment_end, offset in segments
+        ),
+        else_=func.date(column, f"{segments[-1][1]:+d} minutes"),
+    )
+
+
+def truncate_to_period(dialect: str, granularity: str, day):
+    """
+    Builds the SQL expression for the first day of the period containing `day`.
+
+    Weeks start on Monday.
+    """
+    if granularity == "day":
+        return day
+    if dialect == "postgresql":
+        return cast(func.date_trunc(granularity, day), Date)
+    if granularity == "week":
+        return func.date(day, "weekday 0", "-6 days")
+    return func.strftime("%Y-%m-01", day)
+
+
+def get_period_start(day: date, granularity: str) -> date:
+    """
+    Returns the first day of the period containing `day`, like
+    `truncate_to_period` does in SQL. Weeks start on Monday.
+    """
+    if granularity == "week":
+        return day - timedelta(days=day.weekday())
+    if granularity == "month":
+        return day.replace(day=1)
+    return day
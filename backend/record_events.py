@@ -0,0 +1,174 @@
+import asyncio
+import os
+from collections import defaultdict
+from datetime import date
+from typing import AsyncIterator, Dict, List, Set
+import orjson
+from sqlalchemy.ext.asyncio import AsyncSession
+from db import AsyncSessionLocal
+from invalidation_bus import invalidation_bus
+from models.daily_total import DailyTotal
+
+# Bus topic the events of records changed by other workers arrive on
+RECORD_EVENT_TOPIC = "record_event"
+
+
+class Subscription:
+    """
+    One event stream connection with a bounded queue of pending events.
+
+    A client too slow to keep up loses its pending events and is sent a single
+    `resync` event instead, telling it to fetch its records again.
+    """
+
+    __slots__ = ("user_id", "queue")
+
+    def __init__(self, user_id: int, queue_size: int):
+        self.user_id = user_id
+        self.queue: asyncio.Queue = asyncio.Queue(maxsize=queue_size)
+
+    def put(self, event: dict) -> bool:
+        """
+        Queues an event without waiting.
+
+        :return: False if the queue was full and the client has to resync.
+        """
+        try:
+            self.queue.put_nowait(event)
+            return True
+        except asyncio.QueueFull:
+            while not self.queue.empty():
+                self.queue.get_nowait()
+            self.queue.put_nowait({"type": "resync"})
+            return False
+
+
+class RecordEventBroker:
+    """
+    Pushes the record changes of a user to the user's open event streams.
+
+    Writers publish an event within their transaction, so other workers get
+    it through the invalidation bus once it commits, and deliver it locally
+    after committing. Every worker with subscribers of the user adds the
+    current total of the changed day before delivering. Subscribers are kept
+    in memory per user, so an idle connection costs one queue and one waiting
+    task.
+    """
+
+    def __init__(self, queue_size: int = 64, heartbeat_seconds: float = 15):
+        self.queue_size = queue_size
+        self.heartbeat_seconds = heartbeat_seconds
+        self._subscribers: Dict[int, Set[Subscription]] = defaultdict(set)
+        self.events_delivered = 0
+        self.resyncs = 0
+
+    def subscribe(self, user_id: int) -> Subscription:
+        subscription = Subscription(user_id, self.queue_size)
+        self._subscribers[user_id].add(subscription)
+        return subscription
+
+    def unsubscribe(self, subscription: Subscription) -> None:
+        subscribers = self._subscribers.get(subscription.user_id)
+        if subscribers is not None:
+            subscribers.discard(subscription)
+            if not subscribers:
+                del self._subscribers[subscription.user_id]
+
+    def publish(
+        self,
+        session: AsyncSession,
+        event_type: str,
+        user_id: int,
+        record_id: int,
+        day: date,
+    ) -> dict:
+        """
+        Announces a record change to the other workers once the session's
+        transaction commits.
+
+        :return: The event, to be delivered locally with `deliver` after commit.
+        """
+        event = {
+            "type": event_type,
+            "user_id": user_id,
+            "record_id": record_id,
+            "day": day.isoformat(),
+        }
+        invalidation_bus.publish(
+            session, RECORD_EVENT_TOPIC, orjson.dumps(event).decode()
+        )
+        return event
+
+    async def deliver(self, events: List[dict]) -> None:
+        """Queues events, with their day totals, for the users' subscribers."""
+        events = [event for event in events if event["user_id"] in self._subscribers]
+        if not events:
+            return
+
+        # One lookup per changed day, however many connections the user has
+        days = {(event["user_id"], event["day"]) for event in events}
+        async with AsyncSessionLocal() as session:
+            totals = {
+                (user_id, day): await session.get(
+                    DailyTotal, (user_id, date.fromisoformat(day))
+                )
+                for user_id, day in days
+            }
+
+        for event in events:
+            total = totals[(event["user_id"], event["day"])]
+            payload = {
+                **event,
+                "day_total": {
+                    "calories": total.calories if total else 0,
+                    "grams": total.grams if total else 0,
+                    "entries": total.entries if total else 0,
+                },
+            }
+            for subscription in self._subscribers.get(event["user_id"], ()):
+                if subscription.put(payload):
+                    self.events_delivered += 1
+                else:
+                    self.resyncs += 1
+
+    async def stream(self, user_id: int) -> AsyncIterator[str]:
+        """
+        Yields the user's events in the server-sent events format, with a
+        comment as heartbeat whenever nothing happened for a while.
+        """
+        subscription = self.subscribe(user_id)
+        try:
+            yield f"retry: {int(self.heartbeat_seconds * 1000)}\n\n"
+            while True:
+                try:
+                    async with asyncio.timeout(self.heartbeat_seconds):
+                        event = await subscription.queue.get()
+                except TimeoutError:
+                    yield ": heartbeat\n\n"
+                    continue
+                yield (
+                    f"event: {event['type']}\n"
+                    f"data: {orjson.dumps(event).decode()}\n\n"
+                )
+        finally:
+            self.unsubscribe(subscription)
+
+    def stats(self) -> dict:
+        return {
+            "users": len(self._subscribers),
+            "connections": sum(len(s) for s in self._subscribers.values()),
+            "events_delivered": self.events_delivered,
+            "resyncs": self.resyncs,
+        }
+
+
+async def deliver_remote_events(keys: List[str]) -> None:
+    """Delivers the record events of other workers to local subscribers."""
+    await record_events.deliver([orjson.loads(key) for key in keys])
+
+
+record_events = RecordEventBroker(
+    queue_size=int(os.getenv("RECORD_STREAM_QUEUE_SIZE", "64")),
+    heartbeat_seconds=float(os.getenv("RECORD_STREAM_HEARTBEAT", "15")),
+)
+invalidation_bus.subscribe(RECORD_EVENT_TOPIC, deliver_remote_events)
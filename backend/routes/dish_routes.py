@@ -0,0 +1,63 @@
+import json
+from fastapi import APIRouter, Depends, UploadFile, File, Form, HTTPException
+from pydantic import TypeAdapter, ValidationError
+from sqlalchemy.ext.asyncio import AsyncSession
+from typing import List
+
+from controllers.dish_controller import create_dish, get_dish_by_id
+from controllers.user_controller import get_current_username
+from db import get_session
+from models.user import User
+from schemas.dish import DishIngredientCreate, DishRead
+
+router = APIRouter(prefix="/api/v1/dishes", tags=["dishes"])
+
+ingredients_adapter = TypeAdapter(List[DishIngredientCreate])
+
+
+# Create a dish
+@router.post("/", response_model=DishRead, status_code=201, summary="Create a dish")
+async def create_dish_endpoint(
+    name: str,
+    category: str,
+    ingredients: str = Form(
+        ..., description='JSON list of {"product_id": int, "weight": int}'
+    ),
+    file: UploadFile = File(None),
+    session: AsyncSession = Depends(get_session),
+    current_user: User = Depends(get_current_username),
+):
+    """
+    Endpoint for creating a dish from existing products and uploading a file.
+
+    The dish is stored as a product, so it can be logged like any other product.
+    """
+    try:
+        parsed_ingredients = ingredients_adapter.validate_python(
+            json.loads(ingredients)
+        )
+    except (ValueError, ValidationError) as e:
+        raise HTTPException(status_code=422, detail=f"Invalid ingredients: {e}")
+
+    print(f"Dish created by user: {current_user.username}")  # User Logging
+    return await create_dish(
+        session=session,
+        name=name,
+        category=category,
+        ingredients=parsed_ingredients,
+        file=file,
+    )
+
+
+# Get a dish by ID
+@router.get("/{dish_id}", response_model=DishRead)
+async def get_dish_by_id_route(
+    dish_id: int, session: AsyncSession = Depends(get_session)
+):
+    """
+    Fetches a dish with its ingredients by its ID.
+    """
+    dish = await get_dish_by_id(session, dish_id)
+    if not dish:
+        raise HTTPException(status_code=404, detail="Dish not found")
+    return dish
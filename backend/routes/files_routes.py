@@ -1,79 +1,107 @@
-from fastapi import APIRouter, Depends, HTTPException
-from pathlib import Path
+import os
+import aiofiles.os
+from fastapi import APIRouter, Depends, HTTPException, Query, Request
+from typing import Optional
+from sqlalchemy.ext.asyncio import AsyncSession
 from fastapi.responses import FileResponse
 
-from controllers.file_controller import (
-    get_file_path,
-    delete_file,
+from controllers.file_controller import STATIC_DIR, delete_file
+from controllers.image_controller import (
+    ensure_variant,
+    is_resizable,
+    pick_variant_width,
 )
 from controllers.user_controller import get_current_username
+from db import get_session
+from http_cache import cached_file_response
 from models.user import User
 
-
 router = APIRouter(prefix="/api/v1/files", tags=["files"])
 
 
 @router.get("/{file_name}", summary="Download a file")
-async def download_file(file_name: str):
+async def download_file(file_name: str, request: Request):
     """
     Download a file from the 'static' directory.
 
+    Supports conditional and range requests.
+
     :param file_name: The name of the file to download.
     :return: The requested file as a response.
     """
-    try:
-        file_path = await get_file_path(file_name)
-        return FileResponse(
-            file_path, media_type="application/octet-stream", filename=file_name
-        )
-    except HTTPException as e:
-        raise e
+    return await cached_file_response(
+        request.headers,
+        os.path.join(STATIC_DIR, file_name),
+        media_type="application/octet-stream",
+        filename=file_name,
+    )
 
 
 @router.get("/image/{file_name}", response_class=FileResponse)
-async def show_file(file_name: str):
+async def show_file(
+    file_name: str,
+    request: Request,
+    w: Optional[int] = Query(None, ge=1, le=4096, description="Wanted width in px"),
+):
     """
     Retrieve a file from the 'static' directory and return it as a response.
 
-    This endpoint handles different image file types (PNG, JPEG) and serves them
-    with the appropriate media type. If the requested file doesn't exist, a 404
-    error is returned.
+    The media type is detected from the file extension. If the requested file
+    doesn't exist, a 404 error is returned.
 
-    - If the file is a PNG image, the response will be served with a `image/png` media type.
-    - If the file is a JPEG or JPG image, the response will be served with a `image/jpeg` media type.
-    - For all other file types, the default media type will be used.
+    - If a width is given, the nearest resized variant is served instead, as WebP
+      when the client accepts it and as JPEG otherwise. Missing variants are
+      generated on demand and kept on disk.
+    - Responses carry an ETag and Last-Modified, so repeated requests get a 304
+      response. Content-addressed files are marked immutable.
+    - Range requests are supported.
 
     :param file_name: The name of the file to retrieve from the 'static' directory.
+    :param w: Width the image will be displayed at, in pixels.
     :return: A `FileResponse` containing the requested file.
     :raises HTTPException: If the file does not exist, a 404 HTTPException is raised.
     """
-    file_path = Path("static") / file_name
+    file_path = os.path.join(STATIC_DIR, file_name)
 
-    # Checking file existence
-    if not file_path.exists():
+    # Checking file existence; directories such as the variants one are not files
+    if not await aiofiles.os.path.isfile(file_path):
         raise HTTPException(status_code=404, detail="File not found")
 
-    # Defining the content type for images
-    if file_name.endswith(".png"):
-        return FileResponse(file_path, media_type="image/png")
-    elif file_name.endswith(".jpg") or file_name.endswith(".jpeg"):
-        return FileResponse(file_path, media_type="image/jpeg")
+    # Serving a resized variant
+    if w is not None and is_resizable(file_name):
+        image_format = (
+            "webp" if "image/webp" in request.headers.get("accept", "") else "jpeg"
+        )
+        variant_path = await ensure_variant(
+            file_path, pick_variant_width(w), image_format
+        )
+        if variant_path:
+            return await cached_file_response(
+                request.headers,
+                variant_path,
+                media_type=f"image/{image_format}",
+                headers={"Vary": "Accept"},
+            )
 
-    return FileResponse(file_path)
+    return await cached_file_response(request.headers, file_path)
 
 
 @router.delete("/{file_name}", summary="Delete a file")
 async def delete_file_route(
-    file_name: str, current_user: User = Depends(get_current_username)
+    file_name: str,
+    current_user: User = Depends(get_current_username),
+    session: AsyncSession = Depends(get_session),
 ):
     """
     Delete a file from the 'static' directory.
 
+    Files that are still used by a product can't be deleted.
+
     :param file_name: The name of the file to delete.
     :return: A success message upon deletion.
     """
     try:
-        await delete_file(file_name)
+        await delete_file(session, file_name)
         return {"message": f"File '{file_name}' deleted successfully."}
     except HTTPException as e:
         raise e
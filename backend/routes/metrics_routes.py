@@ -0,0 +1,35 @@
+from fastapi import APIRouter, Depends
+from fastapi.responses import PlainTextResponse
+
+from db import get_pool_stats
+from controllers.file_controller import upload_metrics
+from controllers.user_controller import get_current_username, password_hasher
+from instrumentation import request_metrics
+from models.user import User
+
+router = APIRouter(tags=["stats"])
+
+
+def render_gauges(prefix: str, stats: dict) -> str:
+    """Renders the numeric values of a stats dictionary as Prometheus gauges."""
+    lines = []
+    for name, value in stats.items():
+        if isinstance(value, bool) or not isinstance(value, (int, float)):
+            continue
+        lines += [f"# TYPE {prefix}_{name} gauge", f"{prefix}_{name} {value}"]
+    return "\n".join(lines) + "\n"
+
+
+@router.get("/metrics", response_class=PlainTextResponse, summary="Prometheus metrics")
+async def get_metrics(current_user: User = Depends(get_current_username)):
+    """
+    Returns request, database pool, upload and password hashing metrics in the
+    Prometheus text format. Scrapers authenticate with a bearer token.
+    """
+    return PlainTextResponse(
+        request_metrics.render()
+        + render_gauges("db_pool", get_pool_stats())
+        + render_gauges("uploads", upload_metrics.stats())
+        + render_gauges("password_hashing", password_hasher.stats()),
+        media_type="text/plain; version=0.0.4",
+    )
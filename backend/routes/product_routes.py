@@ -1,22 +1,62 @@
-from fastapi import APIRouter, Depends, UploadFile, File, HTTPException
-from typing import Optional
+import csv
+from fastapi import (
+    APIRouter,
+    Depends,
+    UploadFile,
+    File,
+    HTTPException,
+    Query,
+    Request,
+    Response,
+)
+from fastapi.responses import ORJSONResponse
+from typing import Dict, Literal, Optional
 from sqlalchemy.ext.asyncio import AsyncSession
 
 from controllers.product_controller import (
     create_product,
     get_all_products,
+    get_catalog_etag,
     get_product_by_id,
     get_product_by_name,
     update_product,
     delete_product,
+    product_cache,
+    search_products,
+    MAX_PAGE_SIZE,
+)
+from controllers.product_import_controller import (
+    detect_format,
+    import_products,
+    read_rows,
 )
 from db import get_session
+from http_cache import etag_matches
 from models.product import Product
 from controllers.user_controller import get_current_username
 from models.user import User
 
 router = APIRouter(prefix="/api/v1/products", tags=["products"])
 
+# Number of rejected rows listed in the response of an import
+MAX_REPORTED_REJECTS = 100
+
+
+def get_nutrients(
+    protein_per_100g: Optional[float] = Query(None, ge=0, le=100),
+    fat_per_100g: Optional[float] = Query(None, ge=0, le=100),
+    carbohydrates_per_100g: Optional[float] = Query(None, ge=0, le=100),
+    fibre_per_100g: Optional[float] = Query(None, ge=0, le=100),
+) -> Dict[str, float]:
+    """Grams of nutrients per 100g given in the query, keyed by column name."""
+    nutrients = {
+        "protein_per_100g": protein_per_100g,
+        "fat_per_100g": fat_per_100g,
+        "carbohydrates_per_100g": carbohydrates_per_100g,
+        "fibre_per_100g": fibre_per_100g,
+    }
+    return {column: value for column, value in nutrients.items() if value is not None}
+
 
 # Create a product
 @router.post(
@@ -27,11 +67,14 @@ async def create_product_endpoint(
     category: str,
     calories_per_100g: int,
     file: UploadFile = File(None),
+    nutrients: Dict[str, float] = Depends(get_nutrients),
     session: AsyncSession = Depends(get_session),
     current_user: User = Depends(get_current_username),
 ):
     """
     Endpoint for creating a product and uploading a file.
+
+    Protein, fat, carbohydrates and fibre in grams per 100g are optional.
     """
     print(f"Product created by user: {current_user.username}")  # User Logging
     return await create_product(
@@ -40,13 +83,105 @@ async def create_product_endpoint(
         category=category,
         calories_per_100g=calories_per_100g,
         file=file,
+        nutrients=nutrients,
     )
 
 
+# Import products in bulk
+@router.post("/import", summary="Import products from a CSV or JSONL file")
+async def import_products_endpoint(
+    file: UploadFile = File(...),
+    import_format: Optional[Literal["csv", "jsonl"]] = Query(None, alias="format"),
+    session: AsyncSession = Depends(get_session),
+    current_user: User = Depends(get_current_username),
+):
+    """
+    Creates or updates products by name from rows with `name`, `category`,
+    `calories_per_100g` and optionally the grams of protein, fat,
+    carbohydrates and fibre per 100g, normalized like single products.
+
+    The format is guessed from the file name unless given. Returns the import
+    counters and the first rejected rows with the reason. Uploads are limited
+    to the request body size; larger dumps are imported with the
+    `commands.import_products` command.
+    """
+    print(f"Products imported by user: {current_user.username}")  # User Logging
+    rejects = []
+
+    def on_reject(line_number: int, row: object, error: str) -> None:
+        if len(rejects) < MAX_REPORTED_REJECTS:
+            rejects.append({"line": line_number, "error": error, "row": row})
+
+    try:
+        stats = await import_products(
+            session,
+            read_rows(file.file, import_format or detect_format(file.filename)),
+            on_reject=on_reject,
+        )
+    except (UnicodeDecodeError, csv.Error) as e:
+        raise HTTPException(status_code=400, detail=f"Unreadable file: {e}")
+    return {**stats.as_dict(), "rejects": rejects}
+
+
 # Get all products
-@router.get("/", response_model=list[Product])
-async def get_all_products_route(session: AsyncSession = Depends(get_session)):
-    return await get_all_products(session)
+@router.get("/", response_model=list[dict])
+async def get_all_products_route(
+    request: Request,
+    cursor: Optional[int] = Query(None, description="ID of the last product seen"),
+    limit: Optional[int] = Query(None, ge=1, le=MAX_PAGE_SIZE),
+    category: Optional[str] = Query(None, description="Filter by category"),
+    name: Optional[str] = Query(None, description="Filter by name prefix"),
+    fields: Optional[str] = Query(None, description="Comma-separated fields"),
+    session: AsyncSession = Depends(get_session),
+):
+    """
+    Fetches the product catalog, optionally filtered, paginated and projected.
+
+    The ID of the last product of a full page is returned in the `X-Next-Cursor`
+    header. Repeated requests with a matching `If-None-Match` header get a 304
+    response without querying the catalog. Rows come straight from the
+    database, so they are serialized without response model validation.
+    """
+    etag = await get_catalog_etag(session, str(request.query_params))
+    if etag_matches(request.headers.get("if-none-match"), etag):
+        return Response(status_code=304, headers={"ETag": etag})
+
+    products = await get_all_products(
+        session,
+        cursor=cursor,
+        limit=limit,
+        category=category,
+        name_prefix=name,
+        fields=[field.strip() for field in fields.split(",")] if fields else None,
+    )
+
+    headers = {"ETag": etag, "Cache-Control": "no-cache"}
+    if limit is not None and len(products) == limit:
+        headers["X-Next-Cursor"] = str(products[-1]["id"])
+    return ORJSONResponse(products, headers=headers)
+
+
+# Search products by name
+@router.get("/search", response_model=list[dict], summary="Search products by name")
+async def search_products_route(
+    q: str = Query(..., min_length=1, description="Part of the product name"),
+    limit: int = Query(10, ge=1, le=50),
+):
+    """
+    Finds products by name prefix, with typos or in another alphabet.
+
+    Served from an in-memory index without querying the database.
+    """
+    return search_products(q, limit)
+
+
+# Product cache counters
+@router.get("/cache/stats", summary="Product cache statistics")
+async def get_product_cache_stats(current_user: User = Depends(get_current_username)):
+    """
+    Returns hit, miss and eviction counters of the product lookup cache.
+    """
+    return product_cache.stats()
 
 
 # Update a product by ID
@@ -57,15 +192,18 @@ async def update_product_route(
     category: str,
     calories_per_100g: int,
     image_file: Optional[UploadFile] = File(None),  # File is optional, can be None
+    nutrients: Dict[str, float] = Depends(get_nutrients),
     session: AsyncSession = Depends(get_session),
     current_user: User = Depends(get_current_username),
 ):
     """
     Updates a product's information.
+
+    Nutrients that are not given keep their values.
     """
     print(f"Product updated by user: {current_user.username}")  # User Logging
     product = await update_product(
-        session, product_id, name, category, calories_per_100g, image_file
+        session, product_id, name, category, calories_per_100g, image_file, nutrients
     )
     if not product:
         raise HTTPException(status_code=404, detail="Product not found")
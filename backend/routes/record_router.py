@@ -1,18 +1,32 @@
-from fastapi import APIRouter, Depends
+from datetime import date
+from fastapi import APIRouter, Depends, Query
+from fastapi.responses import ORJSONResponse, StreamingResponse
 from controllers.record_controller import (
     create_record,
+    create_records_batch,
     get_all_records,
     get_record_by_id,
     get_records_by_date,
+    get_records_by_range,
     update_record,
     delete_record,
+    export_diary,
+    validate_export_range,
 )
-from schemas.record import RecordCreate, RecordUpdate
+from controllers.summary_controller import get_calorie_summary
+from controllers.nutrition_controller import get_nutrition_report
+from record_events import record_events
+from schemas.record import RecordBatchCreate, RecordCreate, RecordUpdate
 from models.record import Record
 from sqlalchemy.ext.asyncio import AsyncSession
 from db import get_session
-from typing import List, Annotated
-from controllers.user_controller import get_current_username
+from typing import Dict, List, Annotated, Literal, Optional
+from controllers.user_controller import (
+    STREAM_TOKEN_LIFETIME,
+    create_stream_token,
+    get_current_username,
+    get_stream_user,
+)
 from models.user import User
 
 router = APIRouter(prefix="/api/v1/records", tags=["records"])
@@ -30,6 +44,23 @@ async def create_new_record(
     return await create_record(record_data=record_data, user=user, session=session)
 
 
+@router.post(
+    "/batch",
+    response_model=Record,
+    status_code=201,
+    summary="Create a record with several products",
+)
+async def create_new_records_batch(
+    batch: RecordBatchCreate,
+    session: Annotated[AsyncSession, Depends(get_session)],
+    user: User = Depends(get_current_username),
+):
+    """
+    Log a whole meal for the authenticated user in one request.
+    """
+    return await create_records_batch(batch=batch, user=user, session=session)
+
+
 @router.get("/", response_model=List[Record], summary="Get all records")
 async def get_all_user_records(
     session: Annotated[AsyncSession, Depends(get_session)],
@@ -41,6 +72,136 @@ async def get_all_user_records(
     return await get_all_records(user=user, session=session)
 
 
+@router.get(
+    "/range",
+    response_model=Dict[str, List[dict]],
+    summary="Get records for a range of dates",
+)
+async def get_records_by_range_endpoint(
+    session: Annotated[AsyncSession, Depends(get_session)],
+    date_from: date = Query(..., alias="from", description="First day, YYYY-MM-DD"),
+    date_to: date = Query(..., alias="to", description="Last day, YYYY-MM-DD"),
+    user: User = Depends(get_current_username),
+):
+    """
+    Retrieve records for every day in a range, grouped by day.
+
+    Days follow the user's time zone. Days without records are omitted.
+    """
+    return await get_records_by_range(
+        date_from=date_from, date_to=date_to, session=session, user=user
+    )
+
+
+@router.get("/export", summary="Export the food diary as CSV or NDJSON")
+async def export_records_endpoint(
+    export_format: Literal["csv", "ndjson"] = Query("csv", alias="format"),
+    date_from: Optional[date] = Query(None, alias="from", description="YYYY-MM-DD"),
+    date_to: Optional[date] = Query(None, alias="to", description="YYYY-MM-DD"),
+    user: User = Depends(get_current_username),
+):
+    """
+    Stream the authenticated user's records, one row per logged product, with
+    the product name and calories.
+
+    Days follow the user's time zone; without `from` and `to` the whole
+    history is exported.
+    """
+    validate_export_range(date_from, date_to)
+    media_type = "text/csv" if export_format == "csv" else "application/x-ndjson"
+    return StreamingResponse(
+        export_diary(user, export_format, date_from, date_to),
+        media_type=media_type,
+        headers={
+            "Content-Disposition": (
+                f'attachment; filename="food-diary.{export_format}"'
+            )
+        },
+    )
+
+
+@router.post("/stream/token", summary="Get a token for opening the record stream")
+async def create_stream_token_endpoint(user: User = Depends(get_current_username)):
+    """
+    Issue a short-lived token for `GET /stream?token=...`, for browsers whose
+    EventSource can't send the Authorization header.
+    """
+    return {
+        "token": create_stream_token(user),
+        "expires_in": int(STREAM_TOKEN_LIFETIME.total_seconds()),
+    }
+
+
+@router.get("/stream", summary="Stream record changes as server-sent events")
+async def stream_records_endpoint(user: User = Depends(get_stream_user)):
+    """
+    Push the authenticated user's record changes from every tab and device.
+
+    Authenticate with a token from `POST /stream/token` in the `token` query
+    parameter, or with the Authorization header. The token is only checked
+    when the stream is opened; reconnect with a new one.
+
+    Each `created`, `updated` or `deleted` event carries the record ID, its day
+    and the day's current totals. A `resync` event means events were dropped
+    because the client fell behind, and records should be fetched again.
+    Comment lines are sent as heartbeats.
+    """
+    return StreamingResponse(
+        record_events.stream(user.id),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"},
+    )
+
+
+@router.get(
+    "/summary", response_model=List[dict], summary="Get calorie totals per period"
+)
+async def get_calorie_summary_endpoint(
+    session: Annotated[AsyncSession, Depends(get_session)],
+    date_from: date = Query(..., alias="from", description="First day, YYYY-MM-DD"),
+    date_to: date = Query(..., alias="to", description="Last day, YYYY-MM-DD"),
+    granularity: Literal["day", "week", "month"] = Query("day"),
+    user: User = Depends(get_current_username),
+):
+    """
+    Retrieve calorie, weight and entry totals per day, week or month.
+
+    Periods follow the user's time zone and are identified by their first day.
+    """
+    return await get_calorie_summary(
+        date_from=date_from,
+        date_to=date_to,
+        granularity=granularity,
+        session=session,
+        user=user,
+    )
+
+
+@router.get(
+    "/nutrition", response_model=List[dict], summary="Get nutrient totals per period"
+)
+async def get_nutrition_report_endpoint(
+    session: Annotated[AsyncSession, Depends(get_session)],
+    date_from: date = Query(..., alias="from", description="First day, YYYY-MM-DD"),
+    date_to: date = Query(..., alias="to", description="Last day, YYYY-MM-DD"),
+    granularity: Literal["day", "week", "month"] = Query("day"),
+    user: User = Depends(get_current_username),
+):
+    """
+    Retrieve calories, protein, fat, carbohydrates and fibre eaten per day,
+    week or month, with the weight and number of entries.
+
+    Periods follow the user's time zone and are identified by their first day.
+    """
+    return await get_nutrition_report(
+        date_from=date_from,
+        date_to=date_to,
+        granularity=granularity,
+        session=session,
+        user=user,
+    )
+
+
 @router.get("/{date}", response_model=List[dict], summary="Get records by date")
 async def get_records_by_date_endpoint(
     date: str,
@@ -48,9 +209,15 @@ async def get_records_by_date_endpoint(
     user: User = Depends(get_current_username),
 ):
     """
-    Retrieve records for a specific date (only the day part of the timestamp).
+    Retrieve records for a specific date in the user's time zone.
+
+    The rows are built from database objects, so they are serialized without
+    response model validation.
     """
-    return await get_records_by_date(date=date, session=session, user_id=user.id)
+    rows = await get_records_by_date(
+        date=date, session=session, user_id=user.id, tz=user.timezone
+    )
+    return ORJSONResponse(rows)
 
 
 @router.get("/{record_id}", response_model=Record, summary="Get a record by ID")
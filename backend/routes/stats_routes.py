@@ -0,0 +1,35 @@
+from fastapi import APIRouter, Depends
+
+from db import get_pool_stats
+from controllers.file_controller import upload_metrics
+from controllers.user_controller import get_current_username
+from models.user import User
+from record_events import record_events
+
+router = APIRouter(prefix="/api/v1/stats", tags=["stats"])
+
+
+@router.get("/db-pool", summary="Database connection pool statistics")
+async def get_db_pool_stats(current_user: User = Depends(get_current_username)):
+    """
+    Returns connection pool checkout counters, wait times and current usage.
+    """
+    return get_pool_stats()
+
+
+@router.get("/uploads", summary="Upload statistics")
+async def get_upload_stats(current_user: User = Depends(get_current_username)):
+    """
+    Returns the number of stored and rejected uploads and the write throughput.
+    """
+    return upload_metrics.stats()
+
+
+@router.get("/record-streams", summary="Record event stream statistics")
+async def get_record_stream_stats(
+    current_user: User = Depends(get_current_username),
+):
+    """
+    Returns the open record event streams and the events delivered to them.
+    """
+    return record_events.stats()
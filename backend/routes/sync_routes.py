@@ -0,0 +1,51 @@
+from typing import Annotated, Optional
+from fastapi import APIRouter, Depends, Query
+from sqlalchemy.ext.asyncio import AsyncSession
+from controllers.sync_controller import (
+    MAX_SYNC_PAGE_SIZE,
+    apply_operations,
+    get_changes,
+)
+from controllers.user_controller import get_current_username
+from db import get_session
+from models.user import User
+from schemas.sync import SyncBatch
+
+router = APIRouter(prefix="/api/v1/sync", tags=["sync"])
+
+
+@router.get("", summary="Get records and products changed since a cursor")
+async def get_changes_endpoint(
+    session: Annotated[AsyncSession, Depends(get_session)],
+    since: Optional[str] = Query(
+        None, description="Cursor returned by the previous sync; omit for a full sync"
+    ),
+    limit: int = Query(MAX_SYNC_PAGE_SIZE, ge=1, le=MAX_SYNC_PAGE_SIZE),
+    user: User = Depends(get_current_username),
+):
+    """
+    Returns the authenticated user's changed records, the changed products and
+    the IDs of deleted ones, with the cursor to pass to the next sync.
+
+    If `has_more` is set, sync again with the new cursor right away. A cursor
+    older than the tombstone retention period gets a 410 response; sync again
+    without a cursor then.
+    """
+    return await get_changes(session, user, since, limit)
+
+
+@router.post("", summary="Apply queued offline writes")
+async def apply_operations_endpoint(
+    batch: SyncBatch,
+    session: Annotated[AsyncSession, Depends(get_session)],
+    user: User = Depends(get_current_username),
+):
+    """
+    Applies record creates, updates and deletes queued by an offline client,
+    in order, and returns the result of each.
+
+    Creates carry a `client_id`, so sending a batch again does not duplicate
+    records. Updates and deletes of records created offline can give that
+    `client_id` instead of a `record_id`.
+    """
+    return {"results": await apply_operations(session, user, batch)}
@@ -9,6 +9,7 @@ from controllers.user_controller import (
     delete_user,
     change_password,
     get_current_username,
+    password_hasher,
 )
 from db import get_session
 from schemas.user import UserCreate, UserUpdate, PasswordChange
@@ -25,10 +26,17 @@ async def login(
     form_data: Annotated[OAuth2PasswordRequestForm, Depends()],
 ):
     user = await authenticate_user(db, form_data.username, form_data.password)
-    access_token = create_access_token(data={"sub": user.username})
+    access_token = create_access_token(data={"sub": user.username, "uid": user.id})
     return {"access_token": access_token, "token_type": "bearer"}
 
 
+@router.get("/password-hashing/stats", summary="Password hashing pool statistics")
+async def get_password_hashing_stats(
+    current_user: User = Depends(get_current_username),
+):
+    return password_hasher.stats()
+
+
 @router.get("/read_current_user")
 async def read_current_user(current_user: User = Depends(get_current_username)):
     return current_user
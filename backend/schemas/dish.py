@@ -0,0 +1,31 @@
+from typing import List, Optional
+from pydantic import BaseModel, Field
+
+
+class DishIngredientCreate(BaseModel):
+    product_id: int
+    weight: int = Field(..., gt=0)
+
+
+class DishIngredientRead(BaseModel):
+    product_id: int
+    weight: int
+
+    class Config:
+        from_attributes = True
+
+
+class DishRead(BaseModel):
+    id: int
+    product_id: int
+    name: str
+    category: str
+    calories_per_100g: int
+    protein_per_100g: float
+    fat_per_100g: float
+    carbohydrates_per_100g: float
+    fibre_per_100g: float
+    image_url: Optional[str]
+    total_weight: int
+    total_calories: float
+    ingredients: List[DishIngredientRead]
@@ -1,11 +1,18 @@
-from pydantic import BaseModel
+from typing import List, Optional
+from pydantic import BaseModel, Field
 
 
 class RecordCreate(BaseModel):
     product_id: int
     weight: int
+    # Set by offline clients, so a create that is sent again is applied once
+    client_id: Optional[str] = Field(None, max_length=64)
 
 
 class RecordUpdate(BaseModel):
     product_id: int
     weight: int
+
+
+class RecordBatchCreate(BaseModel):
+    items: List[RecordCreate] = Field(..., min_length=1)
@@ -0,0 +1,23 @@
+from typing import List, Literal, Optional
+from pydantic import BaseModel, Field
+
+# Maximum number of queued operations sent in one sync request
+MAX_SYNC_OPERATIONS = 500
+
+
+class SyncOperation(BaseModel):
+    op: Literal["create_record", "update_record", "delete_record"]
+    # Required to create a record, so a create sent again is applied once.
+    # Updates and deletes of a record that has no ID on the client yet name
+    # it by the client ID of its create instead of `record_id`.
+    client_id: Optional[str] = Field(None, min_length=1, max_length=64)
+    # ID of the record to update or delete
+    record_id: Optional[int] = None
+    product_id: Optional[int] = None
+    weight: Optional[int] = None
+
+
+class SyncBatch(BaseModel):
+    operations: List[SyncOperation] = Field(
+        ..., min_length=1, max_length=MAX_SYNC_OPERATIONS
+    )
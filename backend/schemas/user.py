@@ -1,8 +1,22 @@
 from typing import Optional
 import re
+from zoneinfo import ZoneInfo, ZoneInfoNotFoundError
 from pydantic import BaseModel, EmailStr, Field, field_validator
 
 
+def validate_timezone(value: Optional[str]) -> Optional[str]:
+    """
+    Validate that the value is a known IANA time zone name.
+    """
+    if value is None:
+        return value
+    try:
+        ZoneInfo(value)
+    except (ZoneInfoNotFoundError, ValueError):
+        raise ValueError(f"Unknown time zone: {value}")
+    return value
+
+
 class UserBase(BaseModel):
     """
     Base schema for user information.
@@ -14,6 +28,9 @@ class UserBase(BaseModel):
     height: int  # Height of the user in centimeters
     target_weight: float  # Desired target weight of the user in kilograms
     time_frame: int  # Timeframe to reach the target weight in days
+    timezone: str = "UTC"  # IANA time zone used for day boundaries
+
+    _validate_timezone = field_validator("timezone")(validate_timezone)
 
 
 class UserCreate(UserBase):
@@ -67,6 +84,9 @@ class UserUpdate(BaseModel):
     height: Optional[int]  # Optional updated height in centimeters
     target_weight: Optional[float]  # Optional updated target weight in kilograms
     time_frame: Optional[int]  # Optional updated timeframe in days
+    timezone: Optional[str] = None  # Optional updated IANA time zone
+
+    _validate_timezone = field_validator("timezone")(validate_timezone)
 
     class Config:
         from_attributes = True
@@ -0,0 +1,182 @@
+import bisect
+import heapq
+import re
+from collections import Counter
+from typing import Dict, Iterable, List, Set
+
+# Cyrillic to Latin transliteration, so "Манго" and "mango" match each other
+TRANSLITERATION = {
+    "а": "a", "б": "b", "в": "v", "г": "g", "ґ": "g", "д": "d", "е": "e",
+    "ё": "e", "є": "ye", "ж": "zh", "з": "z", "и": "i", "і": "i", "ї": "yi",
+    "й": "y", "к": "k", "л": "l", "м": "m", "н": "n", "о": "o", "п": "p",
+    "р": "r", "с": "s", "т": "t", "у": "u", "ф": "f", "х": "kh", "ц": "ts",
+    "ч": "ch", "ш": "sh", "щ": "shch", "ъ": "", "ы": "y", "ь": "", "э": "e",
+    "ю": "yu", "я": "ya",
+}  # fmt: skip
+
+NON_ALPHANUMERIC = re.compile(r"[^a-z0-9]+")
+
+
+def normalize(text: str) -> str:
+    """
+    Lowercases and transliterates text, keeping only words of Latin letters and digits.
+    """
+    text = "".join(TRANSLITERATION.get(char, char) for char in text.lower())
+    return NON_ALPHANUMERIC.sub(" ", text).strip()
+
+
+def trigrams(text: str) -> Set[str]:
+    """
+    Returns the trigrams of every word, padded so that word starts count more.
+    """
+    grams = set()
+    for word in text.split():
+        padded = f"  {word} "
+        grams.update(padded[i : i + 3] for i in range(len(padded) - 2))
+    return grams
+
+
+class ProductSearchIndex:
+    """
+    In-memory index over product names.
+
+    Word prefixes are looked up in a sorted word list; misspellings fall back
+    to trigram similarity. Names are transliterated, so Cyrillic and Latin
+    spellings match. Documents are stored with the index, so a search does not
+    need the database.
+    """
+
+    # Number of prefix matches ranked per requested result
+    PREFIX_SCAN_FACTOR = 20
+
+    def __init__(self):
+        self._documents: Dict[int, dict] = {}
+        self._names: Dict[int, str] = {}
+        self._trigrams: Dict[int, Set[str]] = {}
+        self._postings: Dict[str, Set[int]] = {}
+        self._words: List[tuple] = []
+
+    def __len__(self) -> int:
+        return len(self._documents)
+
+    def _index(self, document: dict) -> List[tuple]:
+        """Indexes a document and returns its (word, id) entries."""
+        document_id = document["id"]
+        name = normalize(document["name"])
+        grams = trigrams(name)
+        self._documents[document_id] = document
+        self._names[document_id] = name
+        self._trigrams[document_id] = grams
+        for gram in grams:
+            self._postings.setdefault(gram, set()).add(document_id)
+        return [(word, document_id) for word in set(name.split())]
+
+    def add(self, document: dict) -> None:
+        """Adds or replaces a document. It must have `id` and `name` keys."""
+        self.remove(document["id"])
+        for entry in self._index(document):
+            bisect.insort(self._words, entry)
+
+    def add_many(self, documents: Iterable[dict]) -> None:
+        """Adds or replaces many documents, sorting the word list only once."""
+        for document in documents:
+            self.remove(document["id"])
+            self._words.extend(self._index(document))
+        self._words.sort()
+
+    def remove(self, document_id: int) -> None:
+        """Removes a document if it is indexed."""
+        if document_id not in self._documents:
+            return
+        for gram in self._trigrams.pop(document_id):
+            postings = self._postings[gram]
+            postings.discard(document_id)
+            if not postings:
+                del self._postings[gram]
+        for word in set(self._names[document_id].split()):
+            position = bisect.bisect_left(self._words, (word, document_id))
+            del self._words[position]
+        del self._documents[document_id]
+        del self._names[document_id]
+
+    def clear(self) -> None:
+        """Removes every document."""
+        self._documents.clear()
+        self._names.clear()
+        self._trigrams.clear()
+        self._postings.clear()
+        self._words.clear()
+
+    def _rank(self, document_id: int, query: str) -> tuple:
+        """Sort key preferring exact names, then names starting with the query."""
+        name = self._names[document_id]
+        return (name != query, not name.startswith(query), len(name), document_id)
+
+    def _search_prefix(self, query: str, limit: int) -> List[int]:
+        """
+        Returns documents with a word starting with the last query word and
+        containing the other query words.
+        """
+        *other_words, last_word = query.split()
+        matches = set()
+        position = bisect.bisect_left(self._words, (last_word,))
+        while (
+            position < len(self._words)
+            and len(matches) < limit * self.PREFIX_SCAN_FACTOR
+        ):
+            word, document_id = self._words[position]
+            if not word.startswith(last_word):
+                break
+            name = self._names[document_id]
+            if all(other in name for other in other_words):
+                matches.add(document_id)
+            position += 1
+        return heapq.nsmallest(limit, matches, key=lambda item: self._rank(item, query))
+
+    def search(self, query: str, limit: int = 10) -> List[dict]:
+        """
+        Returns the documents best matching the query, best match first.
+
+        Prefix matches come first. If there are fewer than `limit` of them,
+        the rest is filled with documents ranked by trigram similarity, with a
+        bonus for names equal to or starting with the query.
+        """
+        query = normalize(query)
+        if not query:
+            return []
+
+        found = self._search_prefix(query, limit)
+        if len(found) < limit:
+            found += [
+                document_id
+                for document_id in self._search_fuzzy(query, limit)
+                if document_id not in found
+            ][: limit - len(found)]
+        return [self._documents[document_id] for document_id in found]
+
+    def _search_fuzzy(self, query: str, limit: int) -> List[int]:
+        """Returns documents ranked by trigram similarity to the query."""
+        query_grams = trigrams(query)
+
+        shared = Counter()
+        for gram in query_grams:
+            shared.update(self._postings.get(gram, ()))
+
+        def score(document_id: int) -> float:
+            common = shared[document_id]
+            similarity = common / (
+                len(query_grams) + len(self._trigrams[document_id]) - common
+            )
+            name = self._names[document_id]
+            if name == query:
+                similarity += 2
+            elif name.startswith(query) or f" {query}" in name:
+                similarity += 1
+            return similarity
+
+        # Weak candidates sharing less than half of the query are skipped
+        minimum = max(1, (len(query_grams) + 1) // 2)
+        candidates = [
+            document_id for document_id, common in shared.items() if common >= minimum
+        ]
+        return heapq.nlargest(limit, candidates, key=lambda item: (score(item), -item))
@@ -0,0 +1,91 @@
+"""
+Shared fixtures. The tests run against a temporary SQLite database and static
+directory, emptied after every test.
+
+Usage (from the backend directory):
+    python -m pytest tests
+"""
+
+import os
+import sys
+import tempfile
+
+# The application reads its settings on import
+BACKEND_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+WORK_DIR = tempfile.mkdtemp(prefix="calorie_counter_tests_")
+os.makedirs(os.path.join(WORK_DIR, "static"))
+os.chdir(WORK_DIR)
+sys.path.insert(0, BACKEND_DIR)
+os.environ["DATABASE_URL"] = f"sqlite+aiosqlite:///{WORK_DIR}/tests.db"
+os.environ.setdefault("SECRET_KEY", "tests")
+os.environ.setdefault("ALGORITHM", "HS256")
+
+import httpx
+import pytest
+from sqlmodel import SQLModel
+from db import AsyncSessionLocal, engine, init_db
+from models.user import User
+from controllers.product_controller import (
+    bump_catalog_version,
+    product_cache,
+    product_search_index,
+)
+from controllers.user_controller import create_access_token, user_cache
+from main import app as application
+
+
+@pytest.fixture
+def anyio_backend():
+    return "asyncio"
+
+
+@pytest.fixture
+async def db():
+    """Creates the tables, and empties them and the caches afterwards."""
+    await init_db()
+    yield
+    async with engine.begin() as connection:
+        for table in reversed(SQLModel.metadata.sorted_tables):
+            await connection.execute(table.delete())
+    product_cache.clear()
+    user_cache.clear()
+    product_search_index.clear()
+    bump_catalog_version()
+
+
+@pytest.fixture
+async def session(db):
+    async with AsyncSessionLocal() as session:
+        yield session
+
+
+@pytest.fixture
+async def client(db):
+    """Client of the application, started with its lifespan."""
+    async with application.router.lifespan_context(application):
+        transport = httpx.ASGITransport(app=application)
+        async with httpx.AsyncClient(
+            transport=transport, base_url="http://test"
+        ) as client:
+            yield client
+
+
+@pytest.fixture
+async def user(session):
+    user = User(
+        username="tester",
+        email="tester@example.com",
+        hashed_password="not used",
+        weight=70,
+        height=175,
+        target_weight=65,
+    )
+    session.add(user)
+    await session.commit()
+    return user
+
+
+@pytest.fixture
+def auth_headers(user):
+    token = create_access_token({"sub": user.username, "uid": user.id})
+    return {"Authorization": f"Bearer {token}"}
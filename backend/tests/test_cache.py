@@ -0,0 +1,62 @@
+import time
+import pytest
+from cache import LRUCache
+
+
+def test_returns_cached_values():
+    cache = LRUCache()
+    cache.set("apple", 52)
+
+    assert cache.get("apple") == 52
+    assert cache.get("pear") is None
+    assert cache.stats()["hits"] == 1
+    assert cache.stats()["misses"] == 1
+
+
+def test_evicts_least_recently_used():
+    cache = LRUCache(maxsize=2)
+    cache.set("apple", 1)
+    cache.set("pear", 2)
+    cache.get("apple")
+    cache.set("plum", 3)
+
+    assert cache.get("pear") is None
+    assert cache.get("apple") == 1
+    assert cache.get("plum") == 3
+    assert cache.stats()["evictions"] == 1
+
+
+def test_expires_entries(monkeypatch):
+    now = time.monotonic()
+    monkeypatch.setattr(time, "monotonic", lambda: now)
+    cache = LRUCache(ttl=10)
+    cache.set("apple", 1)
+
+    monkeypatch.setattr(time, "monotonic", lambda: now + 11)
+
+    assert cache.get("apple") is None
+    assert cache.stats()["expirations"] == 1
+    assert cache.stats()["size"] == 0
+
+
+def test_invalidates_keys():
+    cache = LRUCache()
+    cache.set("apple", 1)
+    cache.set("pear", 2)
+
+    cache.invalidate("apple", "missing")
+    assert cache.get("apple") is None
+    assert cache.get("pear") == 2
+
+    cache.clear()
+    assert cache.get("pear") is None
+
+
+@pytest.mark.anyio
+async def test_stats_need_authentication(client, auth_headers):
+    response = await client.get("/api/v1/products/cache/stats")
+    assert response.status_code == 401
+
+    response = await client.get("/api/v1/products/cache/stats", headers=auth_headers)
+    assert response.status_code == 200
+    assert "hits" in response.json()
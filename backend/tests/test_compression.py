@@ -0,0 +1,119 @@
+import gzip
+from typing import Tuple
+import brotli
+import httpx
+import pytest
+from starlette.applications import Starlette
+from starlette.responses import PlainTextResponse, StreamingResponse
+from starlette.routing import Route
+from middleware import CompressionMiddleware, choose_encoding
+
+LARGE_BODY = "calories " * 500
+
+
+async def large(request):
+    return PlainTextResponse(LARGE_BODY, headers={"ETag": '"large"'})
+
+
+async def small(request):
+    return PlainTextResponse("ok")
+
+
+async def events(request):
+    async def stream():
+        yield "data: one\n\n"
+        yield "data: two\n\n"
+
+    return StreamingResponse(stream(), media_type="text/event-stream")
+
+
+async def chunks(request):
+    async def stream():
+        for _ in range(3):
+            yield LARGE_BODY
+
+    return StreamingResponse(stream(), media_type="text/plain")
+
+
+app = CompressionMiddleware(
+    Starlette(
+        routes=[
+            Route("/large", large),
+            Route("/small", small),
+            Route("/events", events),
+            Route("/chunks", chunks),
+        ]
+    )
+)
+
+
+async def get(path: str, accept_encoding: str) -> Tuple[httpx.Headers, bytes]:
+    """Returns the headers and the body as sent, without httpx decoding it."""
+    async with httpx.AsyncClient(
+        transport=httpx.ASGITransport(app=app), base_url="http://test"
+    ) as client:
+        async with client.stream(
+            "GET", path, headers={"Accept-Encoding": accept_encoding}
+        ) as response:
+            body = b"".join([chunk async for chunk in response.aiter_raw()])
+            return response.headers, body
+
+
+def test_choose_encoding():
+    assert choose_encoding("gzip, deflate, br") == "br"
+    assert choose_encoding("gzip, br;q=0.5") == "gzip"
+    assert choose_encoding("deflate") is None
+    assert choose_encoding("*") == "br"
+    assert choose_encoding("br;q=0, *;q=0.1") == "gzip"
+    assert choose_encoding("") is None
+
+
+@pytest.mark.anyio
+@pytest.mark.parametrize(
+    "accept_encoding, encoding, decompress",
+    [("gzip, br", "br", brotli.decompress), ("gzip", "gzip", gzip.decompress)],
+)
+async def test_compresses_negotiated_encoding(accept_encoding, encoding, decompress):
+    headers, body = await get("/large", accept_encoding)
+    assert headers["content-encoding"] == encoding
+    assert headers["vary"] == "Accept-Encoding"
+    assert "content-length" not in headers
+    assert decompress(body) == LARGE_BODY.encode()
+
+
+@pytest.mark.anyio
+async def test_weakens_etag_of_compressed_responses():
+    headers, body = await get("/large", "gzip")
+    assert headers["etag"] == 'W/"large"'
+
+    headers, body = await get("/large", "identity")
+    assert headers["etag"] == '"large"'
+
+
+@pytest.mark.anyio
+async def test_sends_identity_when_no_encoding_is_accepted():
+    headers, body = await get("/large", "identity")
+    assert "content-encoding" not in headers
+    assert body == LARGE_BODY.encode()
+
+
+@pytest.mark.anyio
+async def test_skips_small_bodies():
+    headers, body = await get("/small", "gzip, br")
+    assert "content-encoding" not in headers
+    assert headers["vary"] == "Accept-Encoding"
+    assert body == b"ok"
+
+
+@pytest.mark.anyio
+async def test_skips_event_streams():
+    headers, body = await get("/events", "gzip, br")
+    assert "content-encoding" not in headers
+    assert body == b"data: one\n\ndata: two\n\n"
+
+
+@pytest.mark.anyio
+async def test_compresses_streaming_responses():
+    headers, body = await get("/chunks", "gzip")
+    assert headers["content-encoding"] == "gzip"
+    assert gzip.decompress(body) == (LARGE_BODY * 3).encode()
@@ -0,0 +1,149 @@
+import pytest
+from sqlalchemy import update
+from sqlalchemy.future import select
+from db import AsyncSessionLocal, engine
+from models.daily_total import DailyTotal
+from models.product import Product
+from controllers.daily_total_controller import (
+    adjust_daily_totals_for_product,
+    rebuild_daily_totals,
+)
+
+
+async def create_product(client, auth_headers, name: str, calories: int) -> int:
+    response = await client.post(
+        "/api/v1/products/",
+        params={"name": name, "category": "Test", "calories_per_100g": calories},
+        headers=auth_headers,
+    )
+    return response.json()["id"]
+
+
+async def read_totals(session, user_id: int) -> dict:
+    result = await session.execute(
+        select(DailyTotal).where(DailyTotal.user_id == user_id)
+    )
+    return {
+        total.day: (round(total.calories, 6), total.grams, total.entries)
+        for total in result.scalars()
+    }
+
+
+async def assert_totals_match_records(user) -> dict:
+    """Compares the rollup with one rebuilt from the records, and returns it."""
+    async with AsyncSessionLocal() as session:
+        stored = await read_totals(session, user.id)
+        await rebuild_daily_totals(session, user)
+        rebuilt = await read_totals(session, user.id)
+        await session.rollback()
+    assert stored == rebuilt
+    return stored
+
+
+async def change_calories_elsewhere(product_id: int, calories: int) -> None:
+    """Updates a product like another worker would, before this one hears of it."""
+    async with AsyncSessionLocal() as session:
+        old = await session.scalar(
+            select(Product.calories_per_100g).where(Product.id == product_id)
+        )
+        await session.execute(
+            update(Product)
+            .where(Product.id == product_id)
+            .values(calories_per_100g=calories)
+        )
+        await adjust_daily_totals_for_product(session, product_id, calories - old)
+        await session.commit()
+
+
+@pytest.mark.anyio
+async def test_record_writes_keep_totals(client, auth_headers, user):
+    apple = await create_product(client, auth_headers, "Apple", 52)
+    bread = await create_product(client, auth_headers, "Bread", 250)
+
+    response = await client.post(
+        "/api/v1/records/",
+        json={"product_id": apple, "weight": 150},
+        headers=auth_headers,
+    )
+    record_id = response.json()["id"]
+    [totals] = (await assert_totals_match_records(user)).values()
+    assert totals == (78, 150, 1)
+
+    response = await client.post(
+        "/api/v1/records/batch",
+        json={
+            "items": [
+                {"product_id": apple, "weight": 100},
+                {"product_id": bread, "weight": 50},
+                {"product_id": apple, "weight": 20},
+            ]
+        },
+        headers=auth_headers,
+    )
+    assert response.status_code == 201
+    [totals] = (await assert_totals_match_records(user)).values()
+    assert totals == (78 + 62.4 + 125, 320, 3)
+
+    await client.put(
+        f"/api/v1/records/{record_id}",
+        json={"product_id": bread, "weight": 100},
+        headers=auth_headers,
+    )
+    [totals] = (await assert_totals_match_records(user)).values()
+    assert totals == (250 + 62.4 + 125, 270, 3)
+
+    await client.delete(f"/api/v1/records/{record_id}", headers=auth_headers)
+    [totals] = (await assert_totals_match_records(user)).values()
+    assert totals == (62.4 + 125, 170, 2)
+
+
+@pytest.mark.anyio
+async def test_uses_current_calories_of_cached_products(client, auth_headers, user):
+    apple = await create_product(client, auth_headers, "Apple", 52)
+    bread = await create_product(client, auth_headers, "Bread", 250)
+    response = await client.post(
+        "/api/v1/records/",
+        json={"product_id": apple, "weight": 100},
+        headers=auth_headers,
+    )
+    record_id = response.json()["id"]
+
+    await change_calories_elsewhere(apple, 60)
+    await client.post(
+        "/api/v1/records/",
+        json={"product_id": apple, "weight": 100},
+        headers=auth_headers,
+    )
+    await assert_totals_match_records(user)
+
+    await change_calories_elsewhere(apple, 70)
+    await client.put(
+        f"/api/v1/records/{record_id}",
+        json={"product_id": bread, "weight": 100},
+        headers=auth_headers,
+    )
+    await assert_totals_match_records(user)
+
+    await change_calories_elsewhere(bread, 200)
+    await client.delete(f"/api/v1/records/{record_id}", headers=auth_headers)
+    [totals] = (await assert_totals_match_records(user)).values()
+    assert totals == (70, 100, 1)
+
+
+@pytest.mark.anyio
+async def test_rebuild_repairs_totals(client, auth_headers, user):
+    apple = await create_product(client, auth_headers, "Apple", 52)
+    for weight in (100, 200):
+        await client.post(
+            "/api/v1/records/",
+            json={"product_id": apple, "weight": weight},
+            headers=auth_headers,
+        )
+    async with engine.begin() as connection:
+        await connection.execute(update(DailyTotal).values(calories=1, entries=9))
+
+    async with AsyncSessionLocal() as session:
+        assert await rebuild_daily_totals(session) == 1
+        await session.commit()
+        [totals] = (await read_totals(session, user.id)).values()
+    assert totals == (156, 300, 2)
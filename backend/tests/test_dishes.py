@@ -0,0 +1,89 @@
+import json
+import pytest
+from models.dish_ingredient import DishIngredient
+
+
+async def create_product(client, auth_headers, name: str, calories: int) -> int:
+    response = await client.post(
+        "/api/v1/products/",
+        params={
+            "name": name,
+            "category": "Test",
+            "calories_per_100g": calories,
+            "protein_per_100g": 10,
+        },
+        headers=auth_headers,
+    )
+    return response.json()["id"]
+
+
+async def create_dish(client, auth_headers, name: str, ingredients: dict) -> dict:
+    response = await client.post(
+        "/api/v1/dishes/",
+        params={"name": name, "category": "Dish"},
+        data={
+            "ingredients": json.dumps(
+                [
+                    {"product_id": product_id, "weight": weight}
+                    for product_id, weight in ingredients.items()
+                ]
+            )
+        },
+        headers=auth_headers,
+    )
+    assert response.status_code == 201
+    return response.json()
+
+
+async def update_calories(client, auth_headers, product_id: int, calories: int):
+    response = await client.put(
+        f"/api/v1/products/{product_id}",
+        params={"name": "Flour", "category": "Test", "calories_per_100g": calories},
+        headers=auth_headers,
+    )
+    assert response.status_code == 200
+
+
+async def get_product(client, product_id: int) -> dict:
+    return (await client.get(f"/api/v1/products/{product_id}")).json()
+
+
+@pytest.mark.anyio
+async def test_updates_nested_dishes(client, auth_headers):
+    flour = await create_product(client, auth_headers, "Flour", 300)
+    butter = await create_product(client, auth_headers, "Butter", 700)
+    apple = await create_product(client, auth_headers, "Apple", 50)
+    dough = await create_dish(client, auth_headers, "Dough", {flour: 300, butter: 100})
+    pie = await create_dish(
+        client, auth_headers, "Pie", {dough["product_id"]: 200, apple: 200}
+    )
+    assert dough["calories_per_100g"] == 400
+    assert pie["calories_per_100g"] == 225
+
+    await update_calories(client, auth_headers, flour, 340)
+
+    dough_product = await get_product(client, dough["product_id"])
+    pie_product = await get_product(client, pie["product_id"])
+    assert dough_product["calories_per_100g"] == 430
+    assert pie_product["calories_per_100g"] == 240
+    response = await client.get(f"/api/v1/dishes/{pie['id']}")
+    assert response.json()["total_calories"] == 960
+    # Nutrients that did not change are left alone
+    assert pie_product["protein_per_100g"] == 10
+
+
+@pytest.mark.anyio
+async def test_stops_at_dishes_containing_each_other(client, auth_headers, session):
+    flour = await create_product(client, auth_headers, "Flour", 300)
+    dough = await create_dish(client, auth_headers, "Dough", {flour: 100})
+    bread = await create_dish(client, auth_headers, "Bread", {dough["product_id"]: 100})
+    # Only possible with inconsistent data: the dough contains the bread
+    session.add(
+        DishIngredient(dish_id=dough["id"], product_id=bread["product_id"], weight=1)
+    )
+    await session.commit()
+
+    await update_calories(client, auth_headers, flour, 400)
+
+    assert (await get_product(client, dough["product_id"]))["calories_per_100g"] == 400
+    assert (await get_product(client, bread["product_id"]))["calories_per_100g"] == 400
@@ -0,0 +1,90 @@
+import os
+import time
+from datetime import datetime, timedelta, timezone
+import pytest
+from sqlmodel import select
+from models.product import Product
+from models.released_file import ReleasedFile
+from controllers.file_controller import STATIC_DIR, sweep_released_files
+
+GRACE = timedelta(minutes=10)
+
+
+def store_file(name: str, age: timedelta) -> str:
+    """Writes a file to the static directory, last modified `age` ago."""
+    path = os.path.join(STATIC_DIR, name)
+    with open(path, "wb") as file:
+        file.write(b"image")
+    modified = time.time() - age.total_seconds()
+    os.utime(path, (modified, modified))
+    return path
+
+
+async def release(session, path: str) -> None:
+    released = datetime.now(timezone.utc) - 2 * GRACE
+    session.add(ReleasedFile(path=path, released=released))
+    await session.commit()
+
+
+async def pending_releases(session) -> list:
+    result = await session.execute(select(ReleasedFile.path))
+    return result.scalars().all()
+
+
+@pytest.mark.anyio
+async def test_deletes_unused_file(session):
+    path = store_file("unused.jpg", 2 * GRACE)
+    await release(session, path)
+
+    assert await sweep_released_files(session, GRACE) == 1
+    assert not os.path.exists(path)
+    assert await pending_releases(session) == []
+
+
+@pytest.mark.anyio
+async def test_keeps_referenced_file(session):
+    path = store_file("used.jpg", 2 * GRACE)
+    session.add(Product(name="A", category="B", calories_per_100g=1, image_url=path))
+    await release(session, path)
+
+    await sweep_released_files(session, GRACE)
+    assert os.path.exists(path)
+    assert await pending_releases(session) == []
+
+
+@pytest.mark.anyio
+async def test_keeps_file_reused_by_pending_upload(session):
+    path = store_file("reused.jpg", 2 * GRACE)
+    await release(session, path)
+    # An upload of the same content touches the file before its product commits
+    os.utime(path)
+
+    await sweep_released_files(session, GRACE)
+    assert os.path.exists(path)
+    assert await pending_releases(session) == [path]
+
+
+@pytest.mark.anyio
+async def test_waits_for_grace_period(session):
+    path = store_file("recent.jpg", 2 * GRACE)
+    session.add(ReleasedFile(path=path))
+    await session.commit()
+
+    assert await sweep_released_files(session, GRACE) == 0
+    assert os.path.exists(path)
+
+
+@pytest.mark.anyio
+async def test_product_delete_releases_image(client, auth_headers, session):
+    path = store_file("product.jpg", 2 * GRACE)
+    product = Product(name="A", category="B", calories_per_100g=1, image_url=path)
+    session.add(product)
+    await session.commit()
+
+    response = await client.delete(
+        f"/api/v1/products/{product.id}", headers=auth_headers
+    )
+    assert response.status_code == 200
+    # The file outlives the delete until the sweep
+    assert os.path.exists(path)
+    assert await pending_releases(session) == [path]
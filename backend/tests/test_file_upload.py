@@ -0,0 +1,95 @@
+import io
+import os
+import pytest
+from PIL import Image
+from controllers.file_controller import sniff_image_extension
+
+
+def encode_image(image_format: str) -> bytes:
+    buffer = io.BytesIO()
+    Image.new("RGB", (8, 8), "red").save(buffer, format=image_format)
+    return buffer.getvalue()
+
+
+def iso_media_header(brand: bytes) -> bytes:
+    return b"\x00\x00\x00\x18ftyp" + brand + b"\x00\x00\x00\x00"
+
+
+@pytest.mark.parametrize(
+    "image_format, extension",
+    [("JPEG", ".jpg"), ("PNG", ".png"), ("GIF", ".gif"), ("BMP", ".bmp")],
+)
+def test_sniffs_image_formats(image_format, extension):
+    assert sniff_image_extension(encode_image(image_format)[:16]) == extension
+
+
+def test_sniffs_webp():
+    assert sniff_image_extension(b"RIFF\x00\x00\x00\x00WEBPVP8 ") == ".webp"
+
+
+@pytest.mark.parametrize(
+    "brand, extension",
+    [(b"avif", ".avif"), (b"heic", ".heic"), (b"heix", ".heic"), (b"mif1", ".heif")],
+)
+def test_sniffs_image_brands(brand, extension):
+    assert sniff_image_extension(iso_media_header(brand)) == extension
+
+
+@pytest.mark.parametrize("brand", [b"isom", b"mp42", b"qt  ", b"M4A "])
+def test_rejects_video_brands(brand):
+    assert sniff_image_extension(iso_media_header(brand)) is None
+
+
+def test_rejects_other_files():
+    assert sniff_image_extension(b"<!DOCTYPE html><html>") is None
+
+
+@pytest.mark.anyio
+async def test_upload_ignores_client_extension(client, auth_headers):
+    # Image bytes followed by markup, named to be served as HTML
+    content = encode_image("JPEG") + b"<script>alert(1)</script>"
+    response = await client.post(
+        "/api/v1/products/",
+        params={"name": "Apple", "category": "Fruit", "calories_per_100g": 52},
+        files={"file": ("x.html", content, "text/html")},
+        headers=auth_headers,
+    )
+    assert response.status_code == 201
+    image_url = response.json()["image_url"]
+    assert image_url.endswith(".jpg")
+
+    response = await client.get(f"/{image_url}")
+    assert response.headers["content-type"] == "image/jpeg"
+
+
+@pytest.mark.anyio
+async def test_upload_rejects_video(client, auth_headers):
+    response = await client.post(
+        "/api/v1/products/",
+        params={"name": "Apple", "category": "Fruit", "calories_per_100g": 52},
+        files={"file": ("x.jpg", iso_media_header(b"isom") + b"\x00" * 64)},
+        headers=auth_headers,
+    )
+    assert response.status_code == 415
+
+
+@pytest.mark.anyio
+async def test_upload_reuses_stored_content(client, auth_headers):
+    content = encode_image("PNG")
+    image_urls = []
+    for name in ("Pear", "Plum"):
+        response = await client.post(
+            "/api/v1/products/",
+            params={"name": name, "category": "Fruit", "calories_per_100g": 50},
+            files={"file": ("x.png", content, "image/png")},
+            headers=auth_headers,
+        )
+        assert response.status_code == 201
+        image_urls.append(response.json()["image_url"])
+        if len(image_urls) == 1:
+            # Age the file, so the reuse is seen touching it
+            os.utime(image_urls[0], (0, 0))
+
+    assert image_urls[0] == image_urls[1]
+    assert os.stat(image_urls[0]).st_mtime > 0
+    assert not [name for name in os.listdir("static") if name.startswith(".upload-")]
@@ -0,0 +1,105 @@
+import os
+import pytest
+from http_cache import etag_matches
+
+CONTENT_ADDRESSED_NAME = "ab" * 32 + ".txt"
+
+
+def write_static_file(name: str, content: bytes) -> None:
+    with open(os.path.join("static", name), "wb") as file:
+        file.write(content)
+
+
+def test_etag_matches_weakly():
+    assert etag_matches('"a"', '"a"')
+    assert etag_matches('W/"a"', '"a"')
+    assert etag_matches('"b", W/"a"', 'W/"a"')
+    assert etag_matches("*", '"a"')
+    assert not etag_matches('"b"', '"a"')
+    assert not etag_matches(None, '"a"')
+
+
+@pytest.mark.anyio
+async def test_content_addressed_files_are_immutable(client):
+    write_static_file(CONTENT_ADDRESSED_NAME, b"content")
+
+    response = await client.get(f"/api/v1/files/image/{CONTENT_ADDRESSED_NAME}")
+    assert response.status_code == 200
+    assert response.headers["etag"] == f'"{CONTENT_ADDRESSED_NAME}"'
+    assert "immutable" in response.headers["cache-control"]
+
+    response = await client.get(
+        f"/api/v1/files/image/{CONTENT_ADDRESSED_NAME}",
+        headers={"If-None-Match": f'"{CONTENT_ADDRESSED_NAME}"'},
+    )
+    assert response.status_code == 304
+    assert response.content == b""
+    assert response.headers["etag"] == f'"{CONTENT_ADDRESSED_NAME}"'
+    assert "immutable" in response.headers["cache-control"]
+
+
+@pytest.mark.anyio
+async def test_static_files_revalidate(client):
+    write_static_file("notes.txt", b"notes")
+
+    response = await client.get("/static/notes.txt")
+    assert response.status_code == 200
+    assert response.headers["cache-control"] == "public, max-age=3600"
+    etag = response.headers["etag"]
+    last_modified = response.headers["last-modified"]
+
+    response = await client.get("/static/notes.txt", headers={"If-None-Match": etag})
+    assert response.status_code == 304
+    response = await client.get(
+        "/static/notes.txt", headers={"If-Modified-Since": last_modified}
+    )
+    assert response.status_code == 304
+    # If-None-Match takes precedence over If-Modified-Since
+    response = await client.get(
+        "/static/notes.txt",
+        headers={"If-None-Match": '"other"', "If-Modified-Since": last_modified},
+    )
+    assert response.status_code == 200
+
+
+@pytest.mark.anyio
+async def test_serves_ranges(client):
+    write_static_file(CONTENT_ADDRESSED_NAME, b"0123456789")
+    etag = f'"{CONTENT_ADDRESSED_NAME}"'
+
+    response = await client.get(
+        f"/api/v1/files/{CONTENT_ADDRESSED_NAME}", headers={"Range": "bytes=2-5"}
+    )
+    assert response.status_code == 206
+    assert response.content == b"2345"
+
+    response = await client.get(
+        f"/api/v1/files/{CONTENT_ADDRESSED_NAME}",
+        headers={"Range": "bytes=2-5", "If-Range": etag},
+    )
+    assert response.status_code == 206
+
+    response = await client.get(
+        f"/api/v1/files/{CONTENT_ADDRESSED_NAME}",
+        headers={"Range": "bytes=2-5", "If-Range": '"changed"'},
+    )
+    assert response.status_code == 200
+    assert response.content == b"0123456789"
+
+
+@pytest.mark.anyio
+async def test_missing_files(client):
+    response = await client.get("/api/v1/files/image/missing.png")
+    assert response.status_code == 404
+
+
+@pytest.mark.anyio
+async def test_directories_are_not_files(client, auth_headers):
+    os.makedirs(os.path.join("static", "variants"), exist_ok=True)
+
+    for path in ("/api/v1/files/image/variants", "/api/v1/files/variants"):
+        response = await client.get(path)
+        assert response.status_code == 404
+    response = await client.delete("/api/v1/files/variants", headers=auth_headers)
+    assert response.status_code == 404
+    assert os.path.isdir(os.path.join("static", "variants"))
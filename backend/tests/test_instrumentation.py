@@ -0,0 +1,128 @@
+import pytest
+from sqlalchemy import insert, select
+from sqlalchemy.orm import joinedload
+from db import AsyncSessionLocal, engine
+from models.product import Product
+from models.record import Record
+from models.record_product import RecordProduct
+from instrumentation import RequestStats, current_request_stats
+
+
+async def run_with_stats(statement, parameters=None) -> RequestStats:
+    stats = RequestStats()
+    token = current_request_stats.set(stats)
+    try:
+        async with engine.begin() as connection:
+            await connection.execute(statement, parameters)
+    finally:
+        current_request_stats.reset(token)
+    return stats
+
+
+@pytest.mark.anyio
+async def test_counts_rows_written(db):
+    products = [
+        {"name": f"Product {i}", "category": "Test", "calories_per_100g": i}
+        for i in range(3)
+    ]
+    stats = await run_with_stats(insert(Product), products)
+
+    assert stats.queries == 1
+    assert stats.rows_written == 3
+
+
+@pytest.mark.anyio
+async def test_queries_write_no_rows(db):
+    stats = await run_with_stats(select(Product))
+
+    assert stats.queries == 1
+    assert stats.rows_written == 0
+
+
+async def add_products(count: int) -> None:
+    async with engine.begin() as connection:
+        await connection.execute(
+            insert(Product),
+            [
+                {"name": f"Product {i}", "category": "Test", "calories_per_100g": i}
+                for i in range(count)
+            ],
+        )
+
+
+@pytest.mark.anyio
+async def test_counts_rows_returned(db):
+    await add_products(3)
+    stats = RequestStats()
+    token = current_request_stats.set(stats)
+    try:
+        async with AsyncSessionLocal() as session:
+            result = await session.execute(select(Product).order_by(Product.id))
+            products = result.scalars().all()
+            names = await session.scalars(select(Product.name).limit(2))
+            assert len(names.all()) == 2
+    finally:
+        current_request_stats.reset(token)
+
+    assert [product.name for product in products] == [
+        "Product 0",
+        "Product 1",
+        "Product 2",
+    ]
+    assert stats.rows_returned == 5
+    assert stats.rows_written == 0
+
+
+@pytest.mark.anyio
+async def test_counted_results_keep_working(user):
+    await add_products(2)
+    async with AsyncSessionLocal() as session:
+        session.add(
+            Record(
+                user_id=user.id,
+                products=[
+                    RecordProduct(product_id=1, weight=10),
+                    RecordProduct(product_id=2, weight=20),
+                ],
+            )
+        )
+        await session.commit()
+
+    stats = RequestStats()
+    token = current_request_stats.set(stats)
+    try:
+        async with AsyncSessionLocal() as session:
+            result = await session.execute(
+                select(Record).options(joinedload(Record.products))
+            )
+            [record] = result.unique().scalars().all()
+            result = await session.stream(select(Product.id))
+            streamed = [row async for row in result]
+    finally:
+        current_request_stats.reset(token)
+
+    assert len(record.products) == 2
+    assert len(streamed) == 2
+    # Streamed results are left alone
+    assert stats.rows_returned == 2
+
+
+@pytest.mark.anyio
+async def test_server_timing_header(client, auth_headers):
+    response = await client.post(
+        "/api/v1/products/",
+        params={"name": "Apple", "category": "Fruit", "calories_per_100g": 52},
+        headers=auth_headers,
+    )
+    assert "rows written" in response.headers["server-timing"]
+
+    # The catalog version is cached by the first listing
+    await client.get("/api/v1/products/")
+    response = await client.get("/api/v1/products/")
+    assert "1 queries, 1 rows returned" in response.headers["server-timing"]
+
+    response = await client.get("/metrics")
+    assert response.status_code == 401
+    response = await client.get("/metrics", headers=auth_headers)
+    assert "http_request_db_rows_returned_total{" in response.text
+    assert "http_request_db_rows_written_total{" in response.text
@@ -0,0 +1,134 @@
+from datetime import timedelta
+import pytest
+from db import AsyncSessionLocal
+from invalidation_bus import (
+    DatabaseInvalidationBus,
+    InvalidationBus,
+    create_invalidation_bus,
+)
+from models.cache_invalidation import CacheInvalidation
+
+
+class Recorder:
+    """Handler that remembers the keys it was called with."""
+
+    def __init__(self):
+        self.keys = []
+
+    async def __call__(self, keys):
+        self.keys.extend(keys)
+
+
+@pytest.fixture
+async def buses(db):
+    """A publishing and a subscribed bus, as in two worker processes."""
+    publisher = DatabaseInvalidationBus(retention=timedelta(0))
+    subscriber = DatabaseInvalidationBus(retention=timedelta(0))
+    recorder = Recorder()
+    subscriber.subscribe("product", recorder)
+    await subscriber.start()
+    yield publisher, subscriber, recorder
+    await subscriber.stop()
+
+
+async def publish(bus, *keys, row_id=None) -> None:
+    async with AsyncSessionLocal() as session:
+        if row_id is None:
+            bus.publish(session, "product", *keys)
+        else:
+            session.add(
+                CacheInvalidation(
+                    id=row_id, topic="product", key=keys[0], origin=bus.origin
+                )
+            )
+        await session.commit()
+
+
+@pytest.mark.anyio
+async def test_dispatches_changes_of_other_workers(buses):
+    publisher, subscriber, recorder = buses
+    await publish(publisher, 1, 2)
+
+    assert await subscriber.poll() == 2
+    assert recorder.keys == ["1", "2"]
+    assert await subscriber.poll() == 0
+
+
+@pytest.mark.anyio
+async def test_ignores_own_changes(buses):
+    publisher, subscriber, recorder = buses
+    await publish(subscriber, 1)
+
+    assert await subscriber.poll() == 0
+    assert recorder.keys == []
+
+
+@pytest.mark.anyio
+async def test_dispatches_changes_after_purge(buses):
+    publisher, subscriber, recorder = buses
+    await publish(publisher, 1, 2, 3)
+    assert await subscriber.poll() == 3
+
+    await subscriber.purge()
+    await publish(publisher, 4)
+
+    assert await subscriber.poll() == 1
+    assert recorder.keys == ["1", "2", "3", "4"]
+
+
+@pytest.mark.anyio
+async def test_purge_keeps_latest_change(buses):
+    publisher, subscriber, recorder = buses
+    await publish(publisher, 1, 2)
+    await subscriber.purge()
+
+    async with AsyncSessionLocal() as session:
+        rows = (await session.execute(CacheInvalidation.__table__.select())).all()
+    assert [row.key for row in rows] == ["2"]
+
+
+@pytest.mark.anyio
+async def test_dispatches_late_commits(buses):
+    publisher, subscriber, recorder = buses
+    await publish(publisher, 1)
+    assert await subscriber.poll() == 1
+    first_id = subscriber.last_id
+
+    # The transaction that got the next number commits after a later one
+    await publish(publisher, "3", row_id=first_id + 2)
+    assert await subscriber.poll() == 1
+    await publish(publisher, "2", row_id=first_id + 1)
+
+    assert await subscriber.poll() == 1
+    assert recorder.keys == ["1", "3", "2"]
+    assert await subscriber.poll() == 0
+
+
+@pytest.mark.anyio
+async def test_gives_up_on_rolled_back_numbers(buses):
+    publisher, subscriber, recorder = buses
+    subscriber.gap_timeout = 0
+    await publish(publisher, "2", row_id=2)
+    await subscriber.poll()
+
+    await publish(publisher, "1", row_id=1)
+    assert await subscriber.poll() == 0
+
+
+@pytest.mark.parametrize(
+    "environ, bus_class",
+    [
+        ({}, InvalidationBus),
+        ({"WEB_CONCURRENCY": "1"}, InvalidationBus),
+        ({"WEB_CONCURRENCY": "4"}, DatabaseInvalidationBus),
+        ({"WEB_CONCURRENCY": "4", "CACHE_INVALIDATION_BUS": "none"}, InvalidationBus),
+        ({"CACHE_INVALIDATION_BUS": "database"}, DatabaseInvalidationBus),
+    ],
+)
+def test_uses_database_bus_for_several_workers(monkeypatch, environ, bus_class):
+    monkeypatch.delenv("WEB_CONCURRENCY", raising=False)
+    monkeypatch.delenv("CACHE_INVALIDATION_BUS", raising=False)
+    for name, value in environ.items():
+        monkeypatch.setenv(name, value)
+
+    assert type(create_invalidation_bus()) is bus_class
@@ -0,0 +1,122 @@
+import numpy as np
+import pytest
+from sqlalchemy import delete
+from models.dish import Dish
+from models.dish_ingredient import DishIngredient
+from models.product import Product
+from nutrition import dish_nutrients, group_totals, nutrient_totals
+from controllers.nutrition_controller import find_rows, recompute_dish_nutrition
+
+
+def test_nutrient_totals():
+    weights = np.array([50.0, 200.0])
+    per_100g = np.array([[100.0, 10.0], [50.0, 1.0]])
+
+    assert nutrient_totals(weights, per_100g).tolist() == [150.0, 7.0]
+
+
+def test_group_totals():
+    groups = np.array([0, 2, 0])
+    weights = np.array([100.0, 50.0, 200.0])
+    per_100g = np.array([[100.0], [40.0], [10.0]])
+
+    assert group_totals(groups, weights, per_100g, 3).tolist() == [
+        [120.0],
+        [0.0],
+        [20.0],
+    ]
+
+
+def test_dish_nutrients_of_nested_dishes():
+    # Rows: flour, butter, dough (dish 0: flour and butter), pie (dish 1: dough)
+    per_100g = np.array([[300.0, 10.0], [700.0, 1.0], [0.0, 0.0], [0.0, 0.0]])
+
+    new_per_100g, totals = dish_nutrients(
+        per_100g,
+        dish_products=np.array([2, 3]),
+        ingredient_dishes=np.array([0, 0, 1]),
+        ingredient_products=np.array([0, 1, 2]),
+        ingredient_weights=np.array([300.0, 100.0, 200.0]),
+    )
+
+    assert new_per_100g[2].tolist() == [400.0, 7.75]
+    assert new_per_100g[3].tolist() == [400.0, 7.75]
+    assert totals.tolist() == [[1600.0, 31.0], [800.0, 15.5]]
+    assert per_100g[2].tolist() == [0.0, 0.0]
+
+
+def test_dish_nutrients_rejects_cycles():
+    with pytest.raises(ValueError):
+        dish_nutrients(
+            np.zeros((2, 1)),
+            dish_products=np.array([0, 1]),
+            ingredient_dishes=np.array([0, 1]),
+            ingredient_products=np.array([1, 0]),
+            ingredient_weights=np.array([100.0, 100.0]),
+        )
+
+
+def test_find_rows():
+    rows, found = find_rows(np.array([2, 5, 9]), [5, 3, 9, 12])
+
+    assert rows[found].tolist() == [1, 2]
+    assert found.tolist() == [True, False, True, False]
+    assert not find_rows(np.array([], dtype=np.int64), [1])[1].any()
+
+
+async def add_dish(session, name: str, ingredients: dict) -> Dish:
+    product = Product(name=name, category="Dish", calories_per_100g=0)
+    session.add(product)
+    await session.flush()
+    dish = Dish(product_id=product.id, total_weight=0, total_calories=0)
+    session.add(dish)
+    await session.flush()
+    for product_id, weight in ingredients.items():
+        session.add(
+            DishIngredient(dish_id=dish.id, product_id=product_id, weight=weight)
+        )
+    await session.commit()
+    return dish
+
+
+@pytest.mark.anyio
+async def test_recompute_dish_nutrition(session):
+    flour = Product(name="Flour", category="Test", calories_per_100g=300)
+    session.add(flour)
+    await session.commit()
+    dish = await add_dish(session, "Bread", {flour.id: 200})
+
+    result = await recompute_dish_nutrition(session)
+
+    assert result == {"dishes": 1, "updated": 1, "skipped": []}
+    product = await session.get(Product, dish.product_id)
+    await session.refresh(product)
+    await session.refresh(dish)
+    assert product.calories_per_100g == 300
+    assert dish.total_calories == 600
+
+
+@pytest.mark.anyio
+async def test_recompute_skips_dishes_with_deleted_products(session):
+    flour = Product(name="Flour", category="Test", calories_per_100g=300)
+    session.add(flour)
+    await session.commit()
+    dish = await add_dish(session, "Bread", {flour.id: 200})
+    # Created after the dish, so its row follows the dish product's
+    cheese = Product(
+        name="Cheese", category="Test", calories_per_100g=400, protein_per_100g=25
+    )
+    session.add(cheese)
+    await session.commit()
+    broken = await add_dish(session, "Toast", {cheese.id: 50, flour.id: 50})
+    # Rows left dangling by deletes from before dishes were protected
+    await session.execute(delete(Product).where(Product.id == dish.product_id))
+    await session.execute(delete(Product).where(Product.id == flour.id))
+    await session.commit()
+
+    result = await recompute_dish_nutrition(session)
+
+    assert result == {"dishes": 2, "updated": 0, "skipped": [dish.id, broken.id]}
+    await session.refresh(cheese)
+    assert cheese.calories_per_100g == 400
+    assert cheese.protein_per_100g == 25
@@ -0,0 +1,77 @@
+import asyncio
+import threading
+import pytest
+from fastapi import HTTPException
+from password_hasher import PasswordHasher
+
+
+class BlockingContext:
+    """Hashing context whose calls wait until released."""
+
+    def __init__(self):
+        self.release = threading.Event()
+
+    def hash(self, password: str) -> str:
+        self.release.wait(5)
+        return f"hashed {password}"
+
+
+@pytest.mark.anyio
+async def test_hash_runs_in_pool():
+    context = BlockingContext()
+    context.release.set()
+    hasher = PasswordHasher(context, max_workers=1)
+
+    assert await hasher.hash("secret") == "hashed secret"
+    assert hasher.stats()["completed"] == 1
+    hasher.shutdown()
+
+
+@pytest.mark.anyio
+async def test_rejects_calls_beyond_queue():
+    context = BlockingContext()
+    hasher = PasswordHasher(context, max_workers=1, max_queue=2)
+    # One call runs, the others wait for the worker
+    tasks = [asyncio.create_task(hasher.hash("secret")) for _ in range(3)]
+    await asyncio.sleep(0.05)
+
+    with pytest.raises(HTTPException) as error:
+        await hasher.hash("secret")
+    assert error.value.status_code == 503
+
+    context.release.set()
+    await asyncio.gather(*tasks)
+    assert hasher.stats()["rejected"] == 1
+    hasher.shutdown()
+
+
+@pytest.mark.anyio
+async def test_cancelled_calls_leave_the_queue():
+    context = BlockingContext()
+    hasher = PasswordHasher(context, max_workers=1, max_queue=4)
+    running = asyncio.create_task(hasher.hash("running"))
+    waiting = [asyncio.create_task(hasher.hash("waiting")) for _ in range(3)]
+    await asyncio.sleep(0.05)
+
+    # Clients that disconnect before a worker is free
+    for task in waiting:
+        task.cancel()
+    await asyncio.gather(*waiting, return_exceptions=True)
+    context.release.set()
+    await running
+
+    stats = hasher.stats()
+    assert stats["queued"] == 0
+    assert stats["completed"] == 1
+    hasher.shutdown()
+
+
+@pytest.mark.anyio
+async def test_stats_need_authentication(client, auth_headers):
+    response = await client.get("/api/v1/auth/password-hashing/stats")
+    assert response.status_code == 401
+
+    response = await client.get(
+        "/api/v1/auth/password-hashing/stats", headers=auth_headers
+    )
+    assert response.status_code == 200
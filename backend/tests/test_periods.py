@@ -0,0 +1,49 @@
+from datetime import date, datetime
+from zoneinfo import ZoneInfo
+import pytest
+from periods import (
+    get_day_bounds,
+    get_local_day,
+    get_offset_segments,
+    get_period_start,
+)
+
+BERLIN = ZoneInfo("Europe/Berlin")
+
+
+def test_day_bounds_are_naive_utc():
+    assert get_day_bounds(date(2024, 1, 15), BERLIN) == (
+        datetime(2024, 1, 14, 23),
+        datetime(2024, 1, 15, 23),
+    )
+
+
+def test_day_bounds_across_daylight_saving_change():
+    start, end = get_day_bounds(date(2024, 3, 31), BERLIN)
+
+    assert (start, end) == (datetime(2024, 3, 30, 23), datetime(2024, 3, 31, 22))
+
+
+def test_local_day_treats_naive_timestamps_as_utc():
+    assert get_local_day(datetime(2024, 1, 14, 23, 30), BERLIN) == date(2024, 1, 15)
+    assert get_local_day(datetime(2024, 1, 14, 23, 30), ZoneInfo("UTC")) == date(
+        2024, 1, 14
+    )
+
+
+def test_offset_segments_split_at_daylight_saving_change():
+    segments = get_offset_segments(datetime(2024, 3, 29), datetime(2024, 4, 2), BERLIN)
+
+    assert segments == [(datetime(2024, 3, 31, 1), 60), (datetime(2024, 4, 2), 120)]
+
+
+@pytest.mark.parametrize(
+    "granularity, start",
+    [
+        ("day", date(2024, 5, 16)),
+        ("week", date(2024, 5, 13)),
+        ("month", date(2024, 5, 1)),
+    ],
+)
+def test_period_start(granularity, start):
+    assert get_period_start(date(2024, 5, 16), granularity) == start
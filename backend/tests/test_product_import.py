@@ -0,0 +1,96 @@
+import io
+import pytest
+from sqlmodel import select
+from models.product import Product
+from controllers.product_import_controller import (
+    import_products,
+    normalize_product,
+    read_rows,
+)
+
+
+def rows_of(content: str, import_format: str) -> list:
+    return list(read_rows(io.BytesIO(content.encode()), import_format))
+
+
+def test_normalizes_like_create_product():
+    product = normalize_product(
+        {
+            "name": "  green   apple ",
+            "category": "fruit",
+            "calories_per_100g": "52.4",
+            "protein_per_100g": 0.256,
+            "fat_per_100g": "",
+        }
+    )
+
+    assert product == {
+        "name": "Green Apple",
+        "category": "Fruit",
+        "calories_per_100g": 52,
+        "protein_per_100g": 0.26,
+    }
+
+
+@pytest.mark.parametrize(
+    "changes, error",
+    [
+        ({"name": " "}, "name is required"),
+        ({"category": None}, "category is required"),
+        ({"calories_per_100g": "many"}, "calories_per_100g must be a number"),
+        ({"calories_per_100g": True}, "calories_per_100g must be a number"),
+        ({"calories_per_100g": "nan"}, "calories_per_100g must be between"),
+        ({"calories_per_100g": 1500}, "calories_per_100g must be between"),
+        ({"fat_per_100g": False}, "fat_per_100g must be a number"),
+        ({"fibre_per_100g": -1}, "fibre_per_100g must be between"),
+    ],
+)
+def test_rejects_invalid_rows(changes, error):
+    row = {"name": "Apple", "category": "Fruit", "calories_per_100g": 52, **changes}
+
+    with pytest.raises(ValueError, match=error):
+        normalize_product(row)
+
+
+def test_reads_csv():
+    rows = rows_of(
+        "\ufeffname,category,calories_per_100g\nApple,Fruit,52\nPear,Fruit,57\n", "csv"
+    )
+
+    assert rows == [
+        (2, {"name": "Apple", "category": "Fruit", "calories_per_100g": "52"}),
+        (3, {"name": "Pear", "category": "Fruit", "calories_per_100g": "57"}),
+    ]
+
+
+def test_reports_jsonl_parse_errors():
+    rows = rows_of('{"name": "Apple"}\n\n{"name": \n[1]\n', "jsonl")
+
+    assert [line for line, _ in rows] == [1, 3, 4]
+    with pytest.raises(ValueError, match="Invalid JSON: "):
+        normalize_product(rows[1][1])
+    with pytest.raises(ValueError, match="Row is not an object"):
+        normalize_product(rows[2][1])
+
+
+@pytest.mark.anyio
+async def test_upserts_by_name(session):
+    rejects = []
+    content = (
+        '{"name": "apple", "category": "fruit", "calories_per_100g": 52}\n'
+        '{"name": "pear", "category": "fruit", "calories_per_100g": true}\n'
+        "not json\n"
+        '{"name": "apple", "category": "fruit", "calories_per_100g": 50}\n'
+    )
+
+    stats = await import_products(
+        session,
+        read_rows(io.BytesIO(content.encode()), "jsonl"),
+        on_reject=lambda line, row, error: rejects.append((line, error)),
+    )
+
+    assert (stats.inserted, stats.duplicates, stats.rejected) == (1, 1, 2)
+    assert [line for line, _ in rejects] == [2, 3]
+    assert rejects[1][1].startswith("Invalid JSON: ")
+    result = await session.execute(select(Product.name, Product.calories_per_100g))
+    assert result.all() == [("Apple", 50)]
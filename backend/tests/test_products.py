@@ -0,0 +1,148 @@
+from datetime import datetime, timezone
+import pytest
+from sqlalchemy import update
+from db import engine
+from models.product import Product
+from controllers.product_controller import reload_products
+
+
+async def create_product(client, auth_headers, name: str) -> int:
+    response = await client.post(
+        "/api/v1/products/",
+        params={"name": name, "category": "Test", "calories_per_100g": 100},
+        headers=auth_headers,
+    )
+    assert response.status_code == 201
+    return response.json()["id"]
+
+
+async def get_etag(client, **params) -> str:
+    response = await client.get("/api/v1/products/", params=params)
+    assert response.status_code == 200
+    return response.headers["etag"]
+
+
+@pytest.mark.anyio
+async def test_not_modified_for_matching_etag(client, auth_headers):
+    await create_product(client, auth_headers, "Apple")
+    etag = await get_etag(client)
+
+    response = await client.get("/api/v1/products/", headers={"If-None-Match": etag})
+    assert response.status_code == 304
+    assert response.headers["etag"] == etag
+
+    response = await client.get(
+        "/api/v1/products/", params={"limit": 1}, headers={"If-None-Match": etag}
+    )
+    assert response.status_code == 200
+
+
+@pytest.mark.anyio
+async def test_etag_changes_with_product_writes(client, auth_headers):
+    product_id = await create_product(client, auth_headers, "Apple")
+    etags = [await get_etag(client)]
+
+    await create_product(client, auth_headers, "Pear")
+    etags.append(await get_etag(client))
+    await client.put(
+        f"/api/v1/products/{product_id}",
+        params={"name": "Apple", "category": "Test", "calories_per_100g": 52},
+        headers=auth_headers,
+    )
+    etags.append(await get_etag(client))
+    await client.delete(f"/api/v1/products/{product_id}", headers=auth_headers)
+    etags.append(await get_etag(client))
+
+    assert len(set(etags)) == len(etags)
+    assert await get_etag(client) == etags[-1]
+
+
+@pytest.mark.anyio
+async def test_etag_changes_with_writes_of_other_workers(client, auth_headers):
+    product_id = await create_product(client, auth_headers, "Apple")
+    etag = await get_etag(client)
+
+    # Another worker updates the product and announces it on the bus
+    async with engine.begin() as connection:
+        await connection.execute(
+            update(Product)
+            .where(Product.id == product_id)
+            .values(calories_per_100g=52, updated=datetime.now(timezone.utc))
+        )
+    assert await get_etag(client) == etag
+    await reload_products([str(product_id)])
+
+    assert await get_etag(client) != etag
+
+
+@pytest.mark.anyio
+async def test_pages_by_cursor(client, auth_headers):
+    product_ids = [
+        await create_product(client, auth_headers, name)
+        for name in ("Apple", "Pear", "Plum")
+    ]
+
+    response = await client.get("/api/v1/products/", params={"limit": 2})
+    assert [product["id"] for product in response.json()] == product_ids[:2]
+    cursor = response.headers["x-next-cursor"]
+    assert cursor == str(product_ids[1])
+
+    response = await client.get(
+        "/api/v1/products/", params={"limit": 2, "cursor": cursor}
+    )
+    assert [product["id"] for product in response.json()] == product_ids[2:]
+    assert "x-next-cursor" not in response.headers
+
+
+@pytest.mark.anyio
+async def test_full_last_page_ends_with_empty_page(client, auth_headers):
+    product_ids = [
+        await create_product(client, auth_headers, name) for name in ("Apple", "Pear")
+    ]
+
+    response = await client.get("/api/v1/products/", params={"limit": 2})
+    cursor = response.headers["x-next-cursor"]
+    response = await client.get(
+        "/api/v1/products/", params={"limit": 2, "cursor": cursor}
+    )
+
+    assert cursor == str(product_ids[-1])
+    assert response.json() == []
+    assert "x-next-cursor" not in response.headers
+
+
+@pytest.mark.anyio
+async def test_filters_and_projects(client, auth_headers):
+    await create_product(client, auth_headers, "Apple")
+    await create_product(client, auth_headers, "Apricot")
+    await create_product(client, auth_headers, "Pear")
+
+    response = await client.get(
+        "/api/v1/products/", params={"name": "ap", "fields": "name"}
+    )
+
+    assert [set(product) for product in response.json()] == [{"id", "name"}] * 2
+    assert [product["name"] for product in response.json()] == ["Apple", "Apricot"]
+
+
+@pytest.mark.anyio
+async def test_rejects_deleting_logged_products(client, auth_headers):
+    product_id = await create_product(client, auth_headers, "Apple")
+    response = await client.post(
+        "/api/v1/records/",
+        json={"product_id": product_id, "weight": 150},
+        headers=auth_headers,
+    )
+    record_id = response.json()["id"]
+
+    response = await client.delete(
+        f"/api/v1/products/{product_id}", headers=auth_headers
+    )
+    assert response.status_code == 409
+    assert (await client.get(f"/api/v1/products/{product_id}")).status_code == 200
+
+    await client.delete(f"/api/v1/records/{record_id}", headers=auth_headers)
+    response = await client.delete(
+        f"/api/v1/products/{product_id}", headers=auth_headers
+    )
+    assert response.status_code == 200
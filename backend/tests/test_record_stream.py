@@ -0,0 +1,120 @@
+import asyncio
+from urllib.parse import urlencode
+import orjson
+import pytest
+from controllers.user_controller import create_stream_token
+from main import app as application
+
+
+class Stream:
+    """Event stream request driven directly through the ASGI interface."""
+
+    def __init__(self, query: dict, headers: dict = None):
+        self.scope = {
+            "type": "http",
+            "asgi": {"version": "3.0"},
+            "http_version": "1.1",
+            "method": "GET",
+            "scheme": "http",
+            "path": "/api/v1/records/stream",
+            "raw_path": b"/api/v1/records/stream",
+            "query_string": urlencode(query).encode(),
+            "root_path": "",
+            "headers": [(b"host", b"test")]
+            + [
+                (name.lower().encode(), value.encode())
+                for name, value in (headers or {}).items()
+            ],
+            "client": ("test", 1),
+            "server": ("test", 80),
+        }
+        self.messages: asyncio.Queue = asyncio.Queue()
+        self.disconnected = asyncio.Event()
+
+    async def receive(self) -> dict:
+        await self.disconnected.wait()
+        return {"type": "http.disconnect"}
+
+    async def __aenter__(self):
+        self.task = asyncio.create_task(
+            application(self.scope, self.receive, self.messages.put)
+        )
+        start = await self.next_message()
+        self.status = start.get("status")
+        return self
+
+    async def __aexit__(self, *exc_info):
+        self.disconnected.set()
+        await asyncio.wait_for(self.task, 5)
+
+    async def next_message(self) -> dict:
+        return await asyncio.wait_for(self.messages.get(), 5)
+
+    async def next_event(self) -> tuple:
+        while True:
+            body = (await self.next_message())["body"].decode()
+            if body.startswith("event: "):
+                name, data = body.strip().split("\n")
+                return name[len("event: ") :], orjson.loads(data[len("data: ") :])
+
+
+@pytest.mark.anyio
+async def test_token_endpoint_requires_access_token(client, auth_headers):
+    response = await client.post("/api/v1/records/stream/token")
+    assert response.status_code == 401
+
+    response = await client.post("/api/v1/records/stream/token", headers=auth_headers)
+    assert response.status_code == 200
+    assert response.json()["expires_in"] == 60
+
+
+@pytest.mark.anyio
+async def test_stream_tokens_only_open_streams(client, user):
+    token = create_stream_token(user)
+
+    response = await client.get(
+        "/api/v1/records/", headers={"Authorization": f"Bearer {token}"}
+    )
+    assert response.status_code == 401
+
+
+@pytest.mark.anyio
+async def test_rejects_streams_without_stream_token(client, auth_headers):
+    access_token = auth_headers["Authorization"].split()[1]
+    async with Stream({"token": access_token}) as stream:
+        assert stream.status == 401
+    async with Stream({}) as stream:
+        assert stream.status == 401
+
+
+@pytest.mark.anyio
+async def test_streams_writes_of_other_sessions(client, auth_headers):
+    response = await client.post("/api/v1/records/stream/token", headers=auth_headers)
+    token = response.json()["token"]
+    response = await client.post(
+        "/api/v1/products/",
+        params={"name": "Apple", "category": "Test", "calories_per_100g": 50},
+        headers=auth_headers,
+    )
+    product_id = response.json()["id"]
+
+    async with Stream({"token": token}) as stream:
+        assert stream.status == 200
+        assert (await stream.next_message())["body"].startswith(b"retry:")
+
+        response = await client.post(
+            "/api/v1/records/",
+            json={"product_id": product_id, "weight": 200},
+            headers=auth_headers,
+        )
+        name, event = await stream.next_event()
+
+    assert name == "created"
+    assert event["record_id"] == response.json()["id"]
+    assert event["day_total"] == {"calories": 100, "grams": 200, "entries": 1}
+
+
+@pytest.mark.anyio
+async def test_streams_with_access_token_header(client, auth_headers):
+    async with Stream({}, auth_headers) as stream:
+        assert stream.status == 200
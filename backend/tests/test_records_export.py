@@ -0,0 +1,96 @@
+import csv
+import io
+from datetime import datetime
+import orjson
+import pytest
+from sqlalchemy import update
+from db import AsyncSessionLocal
+from models.record import Record
+
+
+async def log_product(client, auth_headers, name: str, weight: int) -> int:
+    response = await client.post(
+        "/api/v1/products/",
+        params={"name": name, "category": "Test", "calories_per_100g": 250},
+        headers=auth_headers,
+    )
+    product_id = response.json()["id"]
+    response = await client.post(
+        "/api/v1/records/",
+        json={"product_id": product_id, "weight": weight},
+        headers=auth_headers,
+    )
+    return response.json()["id"]
+
+
+async def move_record(record_id: int, created: datetime) -> None:
+    async with AsyncSessionLocal() as session:
+        await session.execute(
+            update(Record).where(Record.id == record_id).values(created=created)
+        )
+        await session.commit()
+
+
+@pytest.mark.anyio
+async def test_exports_csv(client, auth_headers):
+    record_id = await log_product(client, auth_headers, 'Cheese, "Aged"', 40)
+    await move_record(record_id, datetime(2024, 5, 1, 12, 30))
+
+    response = await client.get("/api/v1/records/export", headers=auth_headers)
+
+    assert response.status_code == 200
+    assert response.headers["content-type"].startswith("text/csv")
+    assert 'filename="food-diary.csv"' in response.headers["content-disposition"]
+    lines = response.text.splitlines()
+    assert lines[0] == (
+        "date,time,record_id,product_id,product,category,weight,"
+        "calories_per_100g,calories"
+    )
+    assert '"Cheese, ""Aged"""' in lines[1]
+    rows = list(csv.DictReader(io.StringIO(response.text)))
+    assert rows == [
+        {
+            "date": "2024-05-01",
+            "time": "12:30:00",
+            "record_id": str(record_id),
+            "product_id": rows[0]["product_id"],
+            "product": 'Cheese, "Aged"',
+            "category": "Test",
+            "weight": "40",
+            "calories_per_100g": "250",
+            "calories": "100.0",
+        }
+    ]
+
+
+@pytest.mark.anyio
+async def test_exports_only_the_requested_days(client, auth_headers):
+    before = await log_product(client, auth_headers, "Bread", 100)
+    inside = await log_product(client, auth_headers, "Butter", 10)
+    after = await log_product(client, auth_headers, "Jam", 20)
+    await move_record(before, datetime(2024, 4, 30, 23, 59))
+    await move_record(inside, datetime(2024, 5, 1, 0, 0))
+    await move_record(after, datetime(2024, 5, 3, 0, 0))
+
+    response = await client.get(
+        "/api/v1/records/export",
+        params={"format": "ndjson", "from": "2024-05-01", "to": "2024-05-02"},
+        headers=auth_headers,
+    )
+
+    assert response.status_code == 200
+    assert response.headers["content-type"].startswith("application/x-ndjson")
+    rows = [orjson.loads(line) for line in response.text.splitlines()]
+    assert [row["record_id"] for row in rows] == [inside]
+    assert rows[0]["product"] == "Butter"
+    assert rows[0]["calories"] == 25.0
+
+
+@pytest.mark.anyio
+async def test_rejects_inverted_range(client, auth_headers):
+    response = await client.get(
+        "/api/v1/records/export",
+        params={"from": "2024-05-02", "to": "2024-05-01"},
+        headers=auth_headers,
+    )
+    assert response.status_code == 400
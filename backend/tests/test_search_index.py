@@ -0,0 +1,57 @@
+from search_index import ProductSearchIndex, normalize, trigrams
+
+
+def make_index(*names: str) -> ProductSearchIndex:
+    index = ProductSearchIndex()
+    index.add_many({"id": id, "name": name} for id, name in enumerate(names, 1))
+    return index
+
+
+def names(results) -> list:
+    return [document["name"] for document in results]
+
+
+def test_normalize_transliterates():
+    assert normalize("Манго, спелое!") == "mango speloe"
+    assert trigrams("ab") == {"  a", " ab", "ab "}
+
+
+def test_ranks_exact_and_prefix_matches_first():
+    index = make_index("Apple pie", "Pineapple", "Apple", "Applesauce")
+
+    assert names(index.search("apple", limit=3)) == [
+        "Apple",
+        "Apple pie",
+        "Applesauce",
+    ]
+
+
+def test_matches_all_query_words():
+    index = make_index("Green apple", "Green tea", "Red apple")
+
+    assert names(index.search("green app", limit=1)) == ["Green apple"]
+
+
+def test_finds_misspellings():
+    index = make_index("Banana", "Bread")
+
+    assert names(index.search("bananna")) == ["Banana"]
+
+
+def test_matches_across_alphabets():
+    index = make_index("Манго")
+
+    assert names(index.search("mango")) == ["Манго"]
+
+
+def test_add_replaces_and_remove_forgets():
+    index = make_index("Apple")
+    index.add({"id": 1, "name": "Pear"})
+
+    assert index.search("apple") == []
+    assert names(index.search("pear")) == ["Pear"]
+
+    index.remove(1)
+    index.remove(1)
+    assert len(index) == 0
+    assert index.search("pear") == []
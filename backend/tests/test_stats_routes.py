@@ -0,0 +1,17 @@
+import pytest
+
+STATS_PATHS = [
+    "/api/v1/stats/db-pool",
+    "/api/v1/stats/uploads",
+    "/api/v1/stats/record-streams",
+]
+
+
+@pytest.mark.anyio
+@pytest.mark.parametrize("path", STATS_PATHS)
+async def test_stats_need_authentication(client, auth_headers, path):
+    response = await client.get(path)
+    assert response.status_code == 401
+
+    response = await client.get(path, headers=auth_headers)
+    assert response.status_code == 200
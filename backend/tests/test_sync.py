@@ -0,0 +1,210 @@
+import base64
+from datetime import datetime, timedelta, timezone
+import orjson
+import pytest
+from fastapi import HTTPException
+from sqlalchemy import update
+from db import engine, init_db
+from models.product import Product
+from controllers.sync_controller import (
+    TOMBSTONE_RETENTION,
+    decode_cursor,
+    encode_cursor,
+)
+
+
+def raw_cursor(data) -> str:
+    return base64.urlsafe_b64encode(orjson.dumps(data)).decode()
+
+
+def test_cursor_round_trip():
+    positions = {
+        "records": (datetime(2024, 5, 1, 12, 30), 7),
+        "products": (datetime(2024, 5, 2), 0),
+        "deleted": (datetime(2024, 5, 3, 8), 3),
+    }
+
+    assert decode_cursor(encode_cursor(positions)) == positions
+
+
+def test_no_cursor_is_a_full_sync():
+    assert decode_cursor(None) == {}
+    assert decode_cursor("") == {}
+
+
+@pytest.mark.parametrize(
+    "cursor",
+    [
+        "not base64!",
+        base64.urlsafe_b64encode(b"not json").decode(),
+        raw_cursor([1, 2]),
+        raw_cursor(42),
+        raw_cursor({"records": "ab"}),
+        raw_cursor({"records": [1, 2]}),
+        raw_cursor({"records": ["2024-05-01", "x"]}),
+        raw_cursor({"records": ["2024-05-01", 1, 2]}),
+    ],
+)
+def test_rejects_malformed_cursors(cursor):
+    with pytest.raises(HTTPException) as error:
+        decode_cursor(cursor)
+    assert error.value.status_code == 400
+
+
+def test_converts_aware_timestamps_to_utc():
+    cursor = raw_cursor({"records": ["2024-05-01T14:00:00+02:00", 1]})
+
+    assert decode_cursor(cursor) == {"records": (datetime(2024, 5, 1, 12), 1)}
+
+
+async def create_product(client, auth_headers, name: str) -> int:
+    response = await client.post(
+        "/api/v1/products/",
+        params={"name": name, "category": "Test", "calories_per_100g": 100},
+        headers=auth_headers,
+    )
+    return response.json()["id"]
+
+
+@pytest.mark.anyio
+async def test_sends_changes_and_deletions(client, auth_headers):
+    product_id = await create_product(client, auth_headers, "Apple")
+    response = await client.post(
+        "/api/v1/records/",
+        json={"product_id": product_id, "weight": 150},
+        headers=auth_headers,
+    )
+    record_id = response.json()["id"]
+
+    response = await client.get("/api/v1/sync", headers=auth_headers)
+    assert response.status_code == 200
+    changes = response.json()
+    assert [record["id"] for record in changes["records"]] == [record_id]
+    assert [product["id"] for product in changes["products"]] == [product_id]
+    assert changes["deleted"] == {"records": [], "products": []}
+
+    await client.delete(f"/api/v1/records/{record_id}", headers=auth_headers)
+    response = await client.get(
+        "/api/v1/sync", params={"since": changes["cursor"]}, headers=auth_headers
+    )
+    assert response.json()["deleted"]["records"] == [record_id]
+
+
+@pytest.mark.anyio
+async def test_pages_products_in_update_order(client, auth_headers):
+    product_ids = [
+        await create_product(client, auth_headers, name)
+        for name in ("Apple", "Pear", "Plum")
+    ]
+
+    seen, cursor = [], None
+    for _ in range(3):
+        response = await client.get(
+            "/api/v1/sync",
+            params={"limit": 1, **({"since": cursor} if cursor else {})},
+            headers=auth_headers,
+        )
+        changes = response.json()
+        seen += [product["id"] for product in changes["products"]]
+        cursor = changes["cursor"]
+    assert seen == product_ids
+    assert not changes["has_more"]
+
+
+@pytest.mark.anyio
+async def test_rejects_malformed_cursor(client, auth_headers):
+    response = await client.get(
+        "/api/v1/sync", params={"since": raw_cursor([1, 2])}, headers=auth_headers
+    )
+    assert response.status_code == 400
+
+
+@pytest.mark.anyio
+async def test_expired_cursor_needs_full_sync(client, auth_headers):
+    expired = datetime.now(timezone.utc) - TOMBSTONE_RETENTION - timedelta(days=1)
+    cursor = encode_cursor({"deleted": (expired.replace(tzinfo=None), 0)})
+
+    response = await client.get(
+        "/api/v1/sync", params={"since": cursor}, headers=auth_headers
+    )
+    assert response.status_code == 410
+
+
+@pytest.mark.anyio
+async def test_backfills_product_update_times(session):
+    # A product from before update times were tracked
+    product = Product(name="Old", category="Test", calories_per_100g=1)
+    session.add(product)
+    await session.commit()
+    async with engine.begin() as connection:
+        await connection.execute(update(Product).values(updated=None))
+
+    await init_db()
+    await session.refresh(product)
+    assert product.updated == datetime(1970, 1, 1)
+
+
+@pytest.mark.anyio
+async def test_applies_queued_writes_by_client_id(client, auth_headers):
+    product_id = await create_product(client, auth_headers, "Apple")
+    operations = [
+        {
+            "op": "create_record",
+            "client_id": "a",
+            "product_id": product_id,
+            "weight": 100,
+        },
+        {
+            "op": "create_record",
+            "client_id": "b",
+            "product_id": product_id,
+            "weight": 50,
+        },
+        {
+            "op": "update_record",
+            "client_id": "a",
+            "product_id": product_id,
+            "weight": 120,
+        },
+        {"op": "delete_record", "client_id": "b"},
+    ]
+
+    response = await client.post(
+        "/api/v1/sync", json={"operations": operations}, headers=auth_headers
+    )
+
+    results = response.json()["results"]
+    assert [result["status"] for result in results] == [201, 201, 200, 200]
+    assert results[2]["record"]["id"] == results[0]["record"]["id"]
+    assert results[2]["record"]["products"][0]["weight"] == 120
+    response = await client.get("/api/v1/records/", headers=auth_headers)
+    assert [record["client_id"] for record in response.json()] == ["a"]
+
+
+@pytest.mark.anyio
+async def test_client_id_of_an_earlier_sync(client, auth_headers):
+    product_id = await create_product(client, auth_headers, "Apple")
+    create = {
+        "op": "create_record",
+        "client_id": "a",
+        "product_id": product_id,
+        "weight": 100,
+    }
+    await client.post(
+        "/api/v1/sync", json={"operations": [create]}, headers=auth_headers
+    )
+
+    response = await client.post(
+        "/api/v1/sync",
+        json={
+            "operations": [
+                {"op": "delete_record", "client_id": "a"},
+                {"op": "delete_record", "client_id": "unknown"},
+                {"op": "delete_record"},
+            ]
+        },
+        headers=auth_headers,
+    )
+
+    statuses = [result["status"] for result in response.json()["results"]]
+    assert statuses == [200, 404, 422]
@@ -0,0 +1,61 @@
+import pytest
+from controllers.user_controller import create_access_token, user_cache
+
+
+def bearer(token: str) -> dict:
+    return {"Authorization": f"Bearer {token}"}
+
+
+async def whoami(client, token: str):
+    return await client.get("/api/v1/auth/read_current_user", headers=bearer(token))
+
+
+@pytest.mark.anyio
+async def test_caches_authenticated_users(client, user):
+    token = create_access_token({"sub": user.username, "uid": user.id})
+
+    assert (await whoami(client, token)).json()["username"] == "tester"
+    assert user_cache.get(("uid", user.id)).username == "tester"
+    assert (await whoami(client, token)).status_code == 200
+
+
+@pytest.mark.anyio
+async def test_resolves_tokens_without_user_id(client, user):
+    token = create_access_token({"sub": user.username})
+
+    assert (await whoami(client, token)).json()["id"] == user.id
+
+
+@pytest.mark.anyio
+async def test_rejects_old_tokens_after_rename(client, user):
+    old_token = create_access_token({"sub": user.username, "uid": user.id})
+    response = await client.put(
+        "/api/v1/auth/update",
+        json={
+            "username": "renamed",
+            "email": user.email,
+            "weight": user.weight,
+            "height": user.height,
+            "target_weight": user.target_weight,
+            "time_frame": 30,
+        },
+        headers=bearer(old_token),
+    )
+    assert response.status_code == 200
+    assert (await whoami(client, old_token)).status_code == 401
+
+    # The new token puts the renamed user into the cache
+    new_token = create_access_token({"sub": "renamed", "uid": user.id})
+    assert (await whoami(client, new_token)).status_code == 200
+
+    assert (await whoami(client, old_token)).status_code == 401
+
+
+@pytest.mark.anyio
+async def test_rejects_tokens_of_deleted_users(client, user):
+    token = create_access_token({"sub": user.username, "uid": user.id})
+    assert (await whoami(client, token)).status_code == 200
+
+    await client.delete("/api/v1/auth/delete", headers=bearer(token))
+
+    assert (await whoami(client, token)).status_code == 401
@@ -41,7 +41,8 @@ const CreateDish = () => {
   };
 
   const handleAddIngredient = () => {
-    if (!selectedIngredient || !amount || amount <= 0) {
+    // Weights are sent in whole grams, so they must round to at least 1 g
+    if (!selectedIngredient || !amount || Math.round(parseFloat(amount)) < 1) {
       alert("Please select an ingredient and enter a valid amount.");
       return;
     }
@@ -87,18 +88,33 @@ const CreateDish = () => {
       return;
     }
 
-    const url = `products/?name=${encodeURIComponent(
+    if (
+      ingredients.length === 0 ||
+      ingredients.some((ing) => Math.round(ing.amount) < 1)
+    ) {
+      setError("Add ingredients weighing at least 1 g each.");
+      return;
+    }
+
+    // Calories per 100g are computed by the server from the ingredients
+    const url = `dishes/?name=${encodeURIComponent(
       name
-    )}&category=${encodeURIComponent(
-      category
-    )}&calories_per_100g=${dishCalories}`;
+    )}&category=${encodeURIComponent(category)}`;
 
     const formData = new FormData();
     if (image) {
       formData.append("file", image);
     }
 
-    formData.append("ingredients", JSON.stringify(ingredients));
+    formData.append(
+      "ingredients",
+      JSON.stringify(
+        ingredients.map((ing) => ({
+          product_id: ing.ingredient.id,
+          weight: Math.round(ing.amount),
+        }))
+      )
+    );
 
     try {
       await axios.post(url, formData, {
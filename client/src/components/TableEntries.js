@@ -1,6 +1,7 @@
 import React, { useState, useEffect, useCallback } from "react";
 import axios from "../api/axios";
 import { axiosPrivate } from "../api/axios";
+import useRecordStream from "../hooks/useRecordStream";
 
 const TableEntries = ({ date, auth, reload, dailyCalories }) => {
   const [records, setRecords] = useState([]);
@@ -36,6 +37,9 @@ const TableEntries = ({ date, auth, reload, dailyCalories }) => {
     fetchRecords();
   }, [fetchRecords, reload]); // Fetch records when reload changes
 
+  // Records changed in other tabs and on other devices are fetched again
+  useRecordStream(auth.accessToken, fetchRecords);
+
   // Function to handle weight update for a specific record
   const handleUpdateWeight = async (recordId) => {
     try {
@@ -109,7 +113,7 @@ const TableEntries = ({ date, auth, reload, dailyCalories }) => {
                 <td>
                   {record.image ? (
                     <img
-                      src={`${img_path}${record.image.split("/").pop()}`}
+                      src={`${img_path}${record.image.split("/").pop()}?w=160`}
                       alt={record.name}
                       style={{
                         width: "80px",
@@ -0,0 +1,76 @@
+import { useEffect, useRef } from "react";
+import axios from "../api/axios";
+
+const BASE_URL = process.env.REACT_APP_API_URL;
+
+// Record change events sent by the server
+const EVENT_TYPES = ["created", "updated", "deleted", "resync"];
+
+// Delay before reconnecting after the stream failed
+const RETRY_DELAY_MS = 5000;
+
+// Subscribes to the user's record changes from other tabs and devices.
+// EventSource can't send the Authorization header, so each connection is
+// opened with a short-lived stream token in the URL. The browser would
+// reconnect with the expired token, so the hook reconnects itself with a new
+// one and reports a "resync", as events may have been missed meanwhile.
+const useRecordStream = (accessToken, onEvent) => {
+  const handler = useRef(onEvent);
+
+  useEffect(() => {
+    handler.current = onEvent;
+  }, [onEvent]);
+
+  useEffect(() => {
+    if (!accessToken) return undefined;
+
+    let source = null;
+    let retry = null;
+    let closed = false;
+    let reconnecting = false;
+
+    const scheduleReconnect = () => {
+      if (closed) return;
+      reconnecting = true;
+      retry = setTimeout(connect, RETRY_DELAY_MS);
+    };
+
+    const connect = async () => {
+      try {
+        const response = await axios.post("records/stream/token", null, {
+          headers: { Authorization: `Bearer ${accessToken}` },
+        });
+        if (closed) return;
+
+        const url = new URL("records/stream", BASE_URL.replace(/\/?$/, "/"));
+        url.searchParams.set("token", response.data.token);
+        source = new EventSource(url);
+        source.onopen = () => {
+          if (reconnecting) handler.current({ type: "resync" });
+          reconnecting = false;
+        };
+        EVENT_TYPES.forEach((type) =>
+          source.addEventListener(type, (event) =>
+            handler.current(JSON.parse(event.data))
+          )
+        );
+        source.onerror = () => {
+          source.close();
+          scheduleReconnect();
+        };
+      } catch (error) {
+        console.error("Error opening the record stream:", error);
+        scheduleReconnect();
+      }
+    };
+
+    connect();
+    return () => {
+      closed = true;
+      clearTimeout(retry);
+      if (source) source.close();
+    };
+  }, [accessToken]);
+};
+
+export default useRecordStream;